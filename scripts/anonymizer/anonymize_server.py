@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Long-running anonymization service with warm Presidio/spaCy models.
+
+The analyzer is set up once at startup. Concurrent requests are queued and
+coalesced into micro-batches (up to --max-batch texts, waiting at most
+--max-wait-ms for more to arrive), which go through the NLP pipeline in one
+pass (presidio.anonymize_texts). Same tags and operators as presidio.py
+Phase 1; no Phase 2 filters, no AI.
+
+With --pseudonyms, the texts of one request are treated as the text columns
+of one case, in order (Subject, Description, ...): they get the same
+surrogate tags as the batch pipeline with the same scope. With --span-store,
+analyzer spans are read from and saved to the store shared with presidio.py.
+
+Endpoints:
+  POST /anonymize  {"text": "..."}            -> {"text", "entities", "words"}
+                   {"texts": ["...", "..."]}  -> {"results": [{"text", "entities", "words"}, ...]}
+  GET  /health     status, NLP models, uptime, queue depth
+  GET  /stats      request latency percentiles and batch sizes
+
+Usage:
+  python anonymize_server.py --port 8090
+  python anonymize_server.py --pseudonyms case --span-store
+  python anonymize_server.py --socket /tmp/anonymizer.sock --max-batch 64 --max-wait-ms 10
+
+  curl -s localhost:8090/anonymize -d '{"text": "Sono Mario Rossi, tel. 333 1234567"}'
+  curl -s --unix-socket /tmp/anonymizer.sock http://localhost/stats
+"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import signal
+import socketserver
+import sys
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+import presidio
+from pseudonyms import PSEUDONYM_SCOPES, PseudonymVault, hmac_key_from_env
+from span_store import SpanStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8090
+DEFAULT_MAX_BATCH = 32
+DEFAULT_MAX_WAIT_MS = 5.0
+# Latencies kept for the percentiles (most recent requests)
+LATENCY_WINDOW = 10000
+# Largest accepted request body
+MAX_BODY_BYTES = 4 << 20
+
+
+class LatencyWindow:
+    """Thread-safe sliding window of durations with percentile summaries."""
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self.durations: deque = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self.lock:
+            self.durations.append(seconds)
+
+    def summary(self) -> dict:
+        with self.lock:
+            ordered = sorted(self.durations)
+        if not ordered:
+            return {"count": 0}
+
+        def pct(p: float) -> float:
+            return round(ordered[min(int(len(ordered) * p), len(ordered) - 1)] * 1000, 3)
+
+        return {
+            "count": len(ordered),
+            "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+            "p50_ms": pct(0.50),
+            "p90_ms": pct(0.90),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+            "max_ms": round(ordered[-1] * 1000, 3),
+        }
+
+
+class PendingRequest:
+    """Texts of one HTTP request waiting for the batch worker."""
+
+    __slots__ = ("texts", "results", "error", "done")
+
+    def __init__(self, texts: list[str]):
+        self.texts = texts
+        self.results: Optional[list[tuple[str, int, int]]] = None
+        self.error: Optional[Exception] = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """Single worker thread that runs queued requests through the NLP in batches."""
+
+    def __init__(
+        self,
+        analyzer,
+        anonymizer,
+        profile,
+        max_batch: int,
+        max_wait: float,
+        span_store: Optional[SpanStore] = None,
+        vault: Optional[PseudonymVault] = None,
+    ):
+        self.analyzer = analyzer
+        self.anonymizer = anonymizer
+        self.profile = profile
+        self.span_store = span_store
+        self.vault = vault
+        self.requests = 0  # numbers the cases of the vault (one per request)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue: queue.Queue = queue.Queue()
+        self.batch_sizes: Counter = Counter()
+        self.batch_latency = LatencyWindow()
+        self.worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self.worker.start()
+
+    def anonymize(self, texts: list[str]) -> list[tuple[str, int, int]]:
+        """Queue texts and wait for their (anonymized_text, num_tags, word_count)."""
+        pending = PendingRequest(texts)
+        self.queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.results
+
+    def _collect(self) -> list[PendingRequest]:
+        """Block for one request, then take more until the batch is full or max_wait expires."""
+        batch = [self.queue.get()]
+        size = len(batch[0].texts)
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                pending = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(pending)
+            size += len(pending.texts)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            texts = [text for pending in batch for text in pending.texts]
+            case_ids = []
+            for pending in batch:
+                self.requests += 1
+                case_ids.extend([f"request{self.requests}"] * len(pending.texts))
+            t0 = time.perf_counter()
+            try:
+                results = presidio.anonymize_texts(
+                    texts, self.analyzer, self.anonymizer, self.profile, self.span_store, self.vault, case_ids
+                )
+            except Exception as e:
+                logger.exception(f"Batch of {len(texts)} texts failed")
+                for pending in batch:
+                    pending.error = e
+                    pending.done.set()
+                continue
+            finally:
+                if self.vault is not None:
+                    for case_id in set(case_ids):
+                        self.vault.release(case_id)
+                if self.span_store is not None:
+                    self.span_store.flush()
+            self.batch_latency.add(time.perf_counter() - t0)
+            self.batch_sizes[len(texts)] += 1
+            start = 0
+            for pending in batch:
+                pending.results = results[start:start + len(pending.texts)]
+                start += len(pending.texts)
+                pending.done.set()
+
+
+class AnonymizeHandler(BaseHTTPRequestHandler):
+    """HTTP handler of the anonymization service."""
+
+    server_version = "Anonymizer/1.0"
+    batcher: MicroBatcher
+    latency: LatencyWindow
+    started: float
+    nlp_model: str
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def address_string(self) -> str:
+        # Unix socket clients have no (host, port) address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str) -> None:
+        self._send_json(status, {"error": message})
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path == "/health":
+            self._send_json(200, {
+                "status": "ok",
+                "models": [model["model_name"] for model in presidio.nlp_models(self.nlp_model)],
+                "profile_version": self.batcher.profile.version,
+                "pseudonyms": self.batcher.profile.pseudonyms,
+                "uptime_s": round(time.time() - self.started, 1),
+                "queue": self.batcher.queue.qsize(),
+            })
+        elif path == "/stats":
+            batch_sizes = self.batcher.batch_sizes.copy()
+            batches = sum(batch_sizes.values())
+            self._send_json(200, {
+                "requests": self.latency.summary(),
+                "batches": {
+                    "count": batches,
+                    "texts": sum(size * n for size, n in batch_sizes.items()),
+                    "mean_size": round(sum(size * n for size, n in batch_sizes.items()) / batches, 2)
+                    if batches else None,
+                    "max_size": max(batch_sizes, default=None),
+                    "nlp": self.batcher.batch_latency.summary(),
+                },
+            })
+        else:
+            self._send_error(404, f"Unknown path {self.path}")
+
+    def do_POST(self):
+        t0 = time.perf_counter()
+        if self.path.rstrip("/") != "/anonymize":
+            self._send_error(404, f"Unknown path {self.path}")
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        if length > MAX_BODY_BYTES:
+            self._send_error(413, f"Body larger than {MAX_BODY_BYTES} bytes")
+            return
+        try:
+            request = json.loads(self.rfile.read(length))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            self._send_error(400, "Invalid JSON body")
+            return
+
+        single = isinstance(request, dict) and isinstance(request.get("text"), str)
+        texts = [request["text"]] if single else request.get("texts") if isinstance(request, dict) else None
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            self._send_error(400, 'Expected {"text": str} or {"texts": [str, ...]}')
+            return
+
+        try:
+            results = self.batcher.anonymize(texts) if texts else []
+        except Exception as e:
+            self._send_error(500, f"Anonymization failed: {e}")
+            return
+        payload = [{"text": text, "entities": entities, "words": words} for text, entities, words in results]
+        self._send_json(200, payload[0] if single else {"results": payload})
+        self.latency.add(time.perf_counter() - t0)
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    """HTTP over a Unix socket (one thread per connection)."""
+
+    daemon_threads = True
+
+    def server_bind(self):
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def make_server(
+    args: argparse.Namespace,
+    analyzer,
+    anonymizer,
+    profile,
+    span_store: Optional[SpanStore] = None,
+    vault: Optional[PseudonymVault] = None,
+):
+    """Create (but do not start) the service; the batch worker starts immediately."""
+    batcher = MicroBatcher(
+        analyzer, anonymizer, profile, args.max_batch, args.max_wait_ms / 1000, span_store, vault
+    )
+    attrs = {
+        "batcher": batcher,
+        "latency": LatencyWindow(),
+        "started": time.time(),
+        "nlp_model": args.nlp_model,
+    }
+    handler = type("ConfiguredAnonymizeHandler", (AnonymizeHandler,), attrs)
+    if args.socket:
+        if args.socket.exists():
+            args.socket.unlink()
+        return ThreadingUnixHTTPServer(str(args.socket), handler)
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Anonymization service with warm NLP models and micro-batching",
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Bind address (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port (default: {DEFAULT_PORT})")
+    parser.add_argument("--socket", type=Path, help="Listen on this Unix socket instead of host:port")
+    parser.add_argument("--nlp-model", default=presidio.NLP_MODEL,
+                        help=f"Italian spaCy model (default: {presidio.NLP_MODEL}, env PRESIDIO_NLP_MODEL)")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH,
+                        help=f"Texts per NLP batch (default: {DEFAULT_MAX_BATCH})")
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS,
+                        help="How long the first queued request waits for others to join its batch "
+                             f"(default: {DEFAULT_MAX_WAIT_MS})")
+    parser.add_argument("--pseudonyms", choices=PSEUDONYM_SCOPES,
+                        help="Per-value surrogate tags as presidio.py --pseudonyms "
+                             "(one request = the text columns of one case)")
+    parser.add_argument("--span-store", type=Path, nargs="?", const=presidio.SPAN_STORE_FILE, default=None,
+                        help=f"Reuse and save analyzer spans in this store (default when given: "
+                             f"{presidio.SPAN_STORE_FILE})")
+    return parser.parse_args(argv)
+
+
+def main() -> int:
+    """Main entry point."""
+    args = parse_args()
+    if args.max_batch < 1 or args.max_wait_ms < 0:
+        logger.error("--max-batch must be >= 1 and --max-wait-ms >= 0")
+        return 1
+
+    vault = None
+    if args.pseudonyms:
+        try:
+            vault = PseudonymVault(presidio.TAG_MAPPING, args.pseudonyms, hmac_key_from_env())
+        except ValueError as e:
+            logger.error(str(e))
+            return 1
+
+    t0 = time.perf_counter()
+    profile = presidio.build_anonymization_profile(
+        nlp_model=args.nlp_model,
+        pseudonyms=args.pseudonyms,
+        pseudonym_key_id=vault.key_id if vault else "",
+    )
+    analyzer = presidio.setup_analyzer(args.nlp_model)
+    anonymizer = presidio.setup_anonymizer()
+    # Warm-up: the first call loads lazy spaCy components
+    presidio.anonymize_texts(["Mario Rossi"], analyzer, anonymizer, profile)
+    logger.info(f"Models ready in {time.perf_counter() - t0:.1f}s (profile {profile.version})")
+
+    span_store = SpanStore(args.span_store, profile.analysis_version) if args.span_store else None
+    server = make_server(args, analyzer, anonymizer, profile, span_store, vault)
+    # SIGTERM (systemd, docker stop) shuts down like Ctrl-C, removing the socket
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    if args.socket:
+        logger.info(f"Anonymization service listening on unix socket {args.socket}")
+    else:
+        logger.info(f"Anonymization service listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if span_store is not None:
+            span_store.close()
+        if args.socket and args.socket.exists():
+            os.unlink(args.socket)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
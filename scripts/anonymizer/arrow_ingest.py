@@ -0,0 +1,126 @@
+"""
+Arrow-backed ingest of case.csv (optional, requires pyarrow).
+
+The CSV is parsed by pyarrow.csv (multi-threaded, multi-line quoted fields)
+into string columns. The row limit (streaming stops once it is reached) and
+the shard filter (hash of Id) run on the Arrow table, and only the projected
+columns of the selected rows become Python strings: process_csv asks for
+the text columns that go through NLP and the key columns (Id, CaseNumber).
+The other columns stay in Arrow (ArrowPassthrough) and are filled in only
+for the rows written to the output.
+"""
+
+import csv
+import logging
+from itertools import repeat
+from pathlib import Path
+from typing import Iterable, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:  # optional dependency
+    pa = None
+
+from sharding import shard_of
+
+logger = logging.getLogger(__name__)
+
+# Bytes parsed per Arrow batch (bounds peak memory while streaming)
+BLOCK_SIZE = 8 << 20
+
+
+def arrow_available() -> bool:
+    return pa is not None
+
+
+def read_header(input_path: Path) -> list[str]:
+    """Column names of the CSV (the header has no multi-line fields)."""
+    with open(input_path, "r", encoding="utf-8", newline="") as f:
+        return next(csv.reader(f), [])
+
+
+def read_case_table(input_path: Path, limit: Optional[int] = None):
+    """
+    Read the CSV as a pyarrow.Table of string columns (empty cells are "").
+    With a limit, stop streaming once `limit` rows have been read.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed (pip install pyarrow)")
+    fieldnames = read_header(input_path)
+    reader = pacsv.open_csv(
+        input_path,
+        read_options=pacsv.ReadOptions(block_size=BLOCK_SIZE, use_threads=True),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            column_types={name: pa.string() for name in fieldnames},
+            strings_can_be_null=False,
+            quoted_strings_can_be_null=False,
+        ),
+    )
+    batches = []
+    num_rows = 0
+    for batch in reader:
+        batches.append(batch)
+        num_rows += batch.num_rows
+        if limit is not None and num_rows >= limit:
+            break
+    table = pa.Table.from_batches(batches, schema=reader.schema)
+    return table.slice(0, limit) if limit is not None else table
+
+
+def select_rows(table, shard: Optional[tuple[int, int]] = None):
+    """Keep only the rows of a shard (the Id column is the only one materialized)."""
+    if shard is None:
+        return table
+    mask = [shard_of(case_id, shard[1]) == shard[0] for case_id in table.column("Id").to_pylist()]
+    return table.filter(pa.array(mask, type=pa.bool_()))
+
+
+class ArrowPassthrough:
+    """Columns of the selected rows kept in Arrow until the output is written."""
+
+    def __init__(self, table, positions: dict[str, int]):
+        self.table = table
+        self.positions = positions  # column name -> position in the row cells
+
+    def fill(self, records: Iterable) -> None:
+        """
+        Set the passthrough cells of CaseRecords (selected row i has
+        source_index i + 1), materializing only these rows.
+        """
+        records = list(records)
+        if not records or not self.positions:
+            return
+        taken = self.table.take(pa.array([record.source_index - 1 for record in records], type=pa.int64()))
+        for name, pos in self.positions.items():
+            for record, value in zip(records, taken.column(name).to_pylist()):
+                record.values[pos] = value
+
+
+def read_case_values(
+    input_path: Path,
+    columns: Optional[list[str]] = None,
+    limit: Optional[int] = None,
+    shard: Optional[tuple[int, int]] = None,
+) -> tuple[list[str], list[tuple], int, ArrowPassthrough]:
+    """
+    Read, select and materialize the rows of case.csv.
+    Returns (fieldnames, rows, rows_read, passthrough) with rows as tuples of
+    cells in fieldnames order. With `columns`, the cells of the other columns
+    are None in rows and are kept in passthrough (default: all materialized).
+    """
+    table = read_case_table(input_path, limit)
+    rows_read = table.num_rows
+    table = select_rows(table, shard)
+    fieldnames = table.column_names
+    if columns is None:
+        columns = fieldnames
+    values = [table.column(name).to_pylist() if name in columns else repeat(None) for name in fieldnames]
+    # range() bounds the zip when every column is deferred (repeat is endless)
+    rows = [tuple(cells) for _, *cells in zip(range(table.num_rows), *values)]
+    deferred = [name for name in fieldnames if name not in columns]
+    passthrough = ArrowPassthrough(
+        table.select(deferred), {name: fieldnames.index(name) for name in deferred}
+    )
+    return fieldnames, rows, rows_read, passthrough
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the anonymization pipeline in presidio.py.
+
+Generates synthetic cases (see synthetic_cases.py) and times:
+  - anonymize_text on a sample of text cells
+  - the Phase 2 filters (tag percentage + denylist)
+  - the whole process_csv, with a stubbed in-process LLM client (a seeded
+    fraction of its answers carries corrections, so the AI replacement path
+    is timed too)
+  - the memory held by the parsed rows (dicts + copy vs CaseRecord)
+
+Results are written to a JSON file tagged with the current git commit, so runs
+from different commits can be compared with --compare.
+
+Usage:
+  python benchmark.py                              # 1k/10k/100k rows
+  python benchmark.py --sizes 1000 --sample 200    # Quick run
+  python benchmark.py --compare benchmarks/bench_abc1234.json
+"""
+
+import argparse
+import csv
+import json
+import logging
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Optional
+
+import presidio
+from case_index import CaseCsvReader
+from case_record import CaseSchema
+from stub_llm_server import build_reply, estimate_tokens
+from synthetic_cases import SyntheticCaseGenerator, write_case_csv
+
+logger = logging.getLogger("benchmark")
+
+SCRIPT_DIR = Path(__file__).parent
+DEFAULT_OUTPUT_DIR = SCRIPT_DIR / "benchmarks"
+DEFAULT_SIZES = [1000, 10000, 100000]
+# Share of rows the stubbed LLM answers with a correction in the process_csv benchmark
+BENCH_CORRECTION_RATE = 0.1
+
+
+class StubAIClient:
+    """
+    In-process stand-in for the OpenAI client used by presidio.py.
+    Replies like stub_llm_server.py (MANTIENI: SI / TESTO: INVARIATO by default,
+    a correction_rate fraction of rows with a correction).
+    """
+
+    def __init__(self, latency: float = 0.0, seed: int = 0, correction_rate: float = 0.0):
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.correction_rate = correction_rate
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model: str, messages: list[dict], **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        json_mode = (kwargs.get("response_format") or {}).get("type") == "json_object"
+        content = build_reply(messages, self.rng, json_mode=json_mode, correction_rate=self.correction_rate)
+        usage = SimpleNamespace(
+            prompt_tokens=sum(estimate_tokens(m.get("content", "")) for m in messages),
+            completion_tokens=estimate_tokens(content),
+        )
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+def git_commit() -> str:
+    """Return the short hash of HEAD, or 'unknown' outside a git checkout."""
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=SCRIPT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _timing_summary(durations: list[float]) -> dict:
+    """Summarize per-call durations (seconds) in milliseconds."""
+    if not durations:
+        return {"calls": 0}
+    ordered = sorted(durations)
+    total = sum(ordered)
+    return {
+        "calls": len(ordered),
+        "total_s": round(total, 4),
+        "mean_ms": round(total / len(ordered) * 1000, 4),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 4),
+        "p95_ms": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4),
+        "per_s": round(len(ordered) / total, 2) if total else None,
+    }
+
+
+def bench_anonymize_text(analyzer, anonymizer, texts: list[str]) -> dict:
+    """Time anonymize_text on each text."""
+    durations = []
+    for text in texts:
+        t0 = time.perf_counter()
+        presidio.anonymize_text(text, analyzer, anonymizer)
+        durations.append(time.perf_counter() - t0)
+    return _timing_summary(durations)
+
+
+def bench_phase2(rows: list[dict]) -> dict:
+    """Time the Phase 2 filters (tag % on Description, denylist on Risoluzione__c)."""
+    durations = []
+    for row in rows:
+        t0 = time.perf_counter()
+        tag_percentage = presidio.calculate_tag_percentage(row.get("Description", ""))
+        if tag_percentage < presidio.TAG_THRESHOLD:
+            presidio.contains_denylist_phrase(row.get("Risoluzione__c", ""))
+        durations.append(time.perf_counter() - t0)
+    return _timing_summary(durations)
+
+
+def _traced(load) -> tuple[object, int, int]:
+    """Run load() under tracemalloc. Returns (result, bytes still held, peak bytes)."""
+    tracemalloc.start()
+    try:
+        result = load()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current, peak
+
+
+def bench_row_memory(input_path: Path) -> dict:
+    """
+    Memory held by the parsed input: csv.DictReader rows plus the Phase 1
+    row.copy() (previous representation) against CaseRecords.
+    """
+    def dict_rows():
+        with open(input_path, "r", encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+        return rows, [row.copy() for row in rows]
+
+    def case_records():
+        with CaseCsvReader(input_path, input_path.with_name(input_path.name + ".idx")) as reader:
+            schema = CaseSchema(list(reader.fieldnames) + ["url"])
+            return [schema.record(i, cells) for i, cells in enumerate(reader.value_rows(), start=1)]
+
+    results = {}
+    for name, load in (("dict_rows", dict_rows), ("case_records", case_records)):
+        t0 = time.perf_counter()
+        loaded, current, peak = _traced(load)
+        elapsed = time.perf_counter() - t0
+        del loaded
+        results[name] = {
+            "held_mb": round(current / 1e6, 2),
+            "peak_mb": round(peak / 1e6, 2),
+            "load_s": round(elapsed, 3),
+        }
+    results["held_ratio"] = round(
+        results["case_records"]["held_mb"] / results["dict_rows"]["held_mb"], 3
+    ) if results["dict_rows"]["held_mb"] else None
+    return results
+
+
+def bench_process_csv(analyzer, anonymizer, input_path: Path, rows: int, workdir: Path) -> dict:
+    """Time process_csv end to end on a synthetic input of the given size."""
+    output_path = workdir / f"case_anonymized_{rows}.csv"
+    client = StubAIClient(correction_rate=BENCH_CORRECTION_RATE)
+
+    t0 = time.perf_counter()
+    stats = presidio.process_csv(
+        input_path,
+        output_path,
+        analyzer,
+        anonymizer,
+        client,
+        skip_master_append=True,
+    )
+    elapsed = time.perf_counter() - t0
+    return {
+        "rows": rows,
+        "wall_s": round(elapsed, 3),
+        "rows_per_s": round(rows / elapsed, 2) if elapsed else None,
+        "ai_calls": client.calls,
+        "stats": stats,
+    }
+
+
+def run_benchmarks(sizes: list[int], sample: int, seed: int) -> dict:
+    """Run all benchmarks and return the results document."""
+    logger.info("Loading Presidio analyzer/anonymizer...")
+    t0 = time.perf_counter()
+    analyzer = presidio.setup_analyzer()
+    anonymizer = presidio.setup_anonymizer()
+    setup_s = time.perf_counter() - t0
+
+    generator = SyntheticCaseGenerator(seed)
+    sample_rows = list(generator.cases(sample))
+    sample_texts = [
+        row[col]
+        for row in sample_rows
+        for col in ("Description", "Risoluzione__c")
+        if row[col]
+    ]
+
+    logger.info(f"Timing anonymize_text on {len(sample_texts)} cells...")
+    results = {
+        "setup_s": round(setup_s, 3),
+        "anonymize_text": bench_anonymize_text(analyzer, anonymizer, sample_texts),
+        "phase2_filters": {},
+        "process_csv": {},
+        "row_memory": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="presidio-bench-") as tmp:
+        workdir = Path(tmp)
+        for rows in sizes:
+            logger.info(f"Timing Phase 2 filters on {rows} rows...")
+            anonymized_rows = []
+            for row in SyntheticCaseGenerator(seed).cases(rows):
+                # Phase 2 runs on anonymized text: reuse tags without running NLP
+                row["Description"] = re.sub(r"\b[A-Z][a-z]+ [A-Z][a-z]+\b", "[FAKE_PERSON]", row["Description"])
+                anonymized_rows.append(row)
+            results["phase2_filters"][str(rows)] = bench_phase2(anonymized_rows)
+
+            input_path = write_case_csv(workdir / f"case_{rows}.csv", rows, seed)
+            logger.info(f"Measuring row memory on {rows} rows...")
+            results["row_memory"][str(rows)] = bench_row_memory(input_path)
+            logger.info(
+                f"  {rows} rows: dicts {results['row_memory'][str(rows)]['dict_rows']['held_mb']} MB, "
+                f"records {results['row_memory'][str(rows)]['case_records']['held_mb']} MB"
+            )
+
+            logger.info(f"Timing process_csv on {rows} rows...")
+            results["process_csv"][str(rows)] = bench_process_csv(
+                analyzer, anonymizer, input_path, rows, workdir
+            )
+            logger.info(
+                f"  {rows} rows: {results['process_csv'][str(rows)]['wall_s']}s "
+                f"({results['process_csv'][str(rows)]['rows_per_s']} rows/s)"
+            )
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seed": seed,
+        "results": results,
+    }
+
+
+def _metric_pairs(current: dict, baseline: dict, prefix: str = "") -> list[tuple[str, float, float]]:
+    """Flatten matching timing metrics of two results documents."""
+    pairs = []
+    for key, value in current.items():
+        other = baseline.get(key) if isinstance(baseline, dict) else None
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            pairs.extend(_metric_pairs(value, other or {}, f"{name}."))
+        elif (
+            isinstance(value, (int, float))
+            and isinstance(other, (int, float))
+            and (key.endswith("_s") or key.endswith("_ms"))
+        ):
+            pairs.append((name, other, value))
+    return pairs
+
+
+def compare(current: dict, baseline: dict) -> None:
+    """Print timing changes between a baseline and the current results."""
+    print(f"Comparing {baseline.get('commit')} -> {current.get('commit')}")
+    for name, before, after in _metric_pairs(current["results"], baseline.get("results", {})):
+        if "stats" in name:
+            continue
+        ratio = after / before if before else float("nan")
+        print(f"  {name:<45} {before:>12.4f} -> {after:>12.4f}  ({ratio:.2f}x)")
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark presidio.py on synthetic cases",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+        metavar="N",
+        help="Row counts for the Phase 2 and process_csv benchmarks (default: 1000 10000 100000)",
+    )
+    parser.add_argument(
+        "--sample",
+        type=int,
+        default=500,
+        help="Cases sampled for the anonymize_text benchmark (default: 500)",
+    )
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=Path,
+        default=None,
+        help=f"Results JSON (default: {DEFAULT_OUTPUT_DIR}/bench_<commit>.json)",
+    )
+    parser.add_argument(
+        "--compare",
+        type=Path,
+        default=None,
+        metavar="BASELINE.json",
+        help="Print the change against a previous results file",
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    """Main entry point."""
+    args = parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    # Per-row pipeline logging would dominate the timings
+    logging.getLogger("presidio").setLevel(logging.WARNING)
+    logging.getLogger("presidio-analyzer").setLevel(logging.ERROR)
+
+    document = run_benchmarks(args.sizes, args.sample, args.seed)
+
+    output_path: Optional[Path] = args.output
+    if output_path is None:
+        output_path = DEFAULT_OUTPUT_DIR / f"bench_{document['commit']}.json"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    logger.info(f"Results written to {output_path}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(document, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""
+Byte-offset index and memory-mapped reader for case.csv.
+
+case.csv has quoted multi-line fields, so a row can only be found by parsing
+everything before it. One indexing pass records the byte offset where each
+logical record starts (a line ends a record when it does not end inside a
+quoted field, following the quoting rules of csv.reader) and stores them in
+a sidecar file. The reader memory-maps the CSV
+and parses only the byte range of the requested rows, so `--test N` reads N
+rows. A quoted field still open at the end of the file ends the last record
+there, as csv.reader does.
+
+The index is rebuilt when the size or mtime of the CSV changes.
+"""
+
+import csv
+import io
+import json
+import logging
+import mmap
+from array import array
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bumped when the sidecar layout or the record boundaries change
+INDEX_VERSION = 3
+
+# Records decoded and parsed at a time (bounds the text held in memory)
+CHUNK_RECORDS = 1024
+
+
+def ends_in_quoted_field(line: bytes, in_quotes: bool = False) -> bool:
+    """
+    Whether a line ends inside a quoted field, given whether it starts inside
+    one. As in csv.reader, a quote opens a quoted field only at the start of a
+    field, and "" inside a quoted field is an escaped quote; other quotes are
+    literal characters.
+    """
+    i = 0
+    if not in_quotes and line.startswith(b'"'):
+        in_quotes, i = True, 1
+    while True:
+        if in_quotes:
+            j = line.find(b'"', i)
+            if j < 0:
+                return True
+            if line.startswith(b'"', j + 1):
+                i = j + 2  # escaped quote
+                continue
+            in_quotes, i = False, j + 1
+        else:
+            j = line.find(b',"', i)
+            if j < 0:
+                return False
+            in_quotes, i = True, j + 2
+
+
+def build_offsets(lines: Iterable[bytes]) -> tuple[int, array]:
+    """
+    Scan the lines of a CSV file opened in binary mode.
+    Returns (end of the header record, offsets) where offsets holds the start
+    of every data record followed by the end of the last one.
+    """
+    offsets = array("Q")
+    header_end = None
+    pos = 0
+    record_start = 0
+    in_quotes = False
+    for line in lines:
+        pos += len(line)
+        if in_quotes or b'"' in line:
+            in_quotes = ends_in_quoted_field(line, in_quotes)
+            if in_quotes:
+                continue  # newline inside a quoted field
+        if header_end is None:
+            header_end = pos
+        elif pos - record_start > 2 or line.strip():
+            # Blank lines are not records (csv skips them)
+            offsets.append(record_start)
+        record_start = pos
+    if in_quotes:
+        # Unterminated quoted field: csv.reader returns it as the last record
+        if header_end is None:
+            header_end = pos
+        else:
+            offsets.append(record_start)
+    offsets.append(pos)
+    return header_end or 0, offsets
+
+
+class CaseIndex:
+    """Record offsets of a CSV file, persisted in a sidecar file."""
+
+    def __init__(self, csv_path: Path, header_end: int, offsets: array, size: int, mtime_ns: int):
+        self.csv_path = csv_path
+        self.header_end = header_end
+        self.offsets = offsets
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def is_current(self) -> bool:
+        st = self.csv_path.stat()
+        return st.st_size == self.size and st.st_mtime_ns == self.mtime_ns
+
+    @classmethod
+    def build(cls, csv_path: Path) -> "CaseIndex":
+        st = csv_path.stat()
+        with open(csv_path, "rb") as f:
+            header_end, offsets = build_offsets(f)
+        return cls(csv_path, header_end, offsets, st.st_size, st.st_mtime_ns)
+
+    def save(self, index_path: Path) -> None:
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {
+            "version": INDEX_VERSION,
+            "csv": str(self.csv_path.resolve()),
+            "size": self.size,
+            "mtime_ns": self.mtime_ns,
+            "header_end": self.header_end,
+            "rows": len(self),
+        }
+        tmp_path = index_path.with_suffix(index_path.suffix + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps(meta).encode("utf-8") + b"\n")
+            self.offsets.tofile(f)
+        tmp_path.replace(index_path)
+
+    @classmethod
+    def load(cls, csv_path: Path, index_path: Path) -> Optional["CaseIndex"]:
+        """Load the sidecar index, or None if missing, unreadable or stale."""
+        try:
+            with open(index_path, "rb") as f:
+                meta = json.loads(f.readline())
+                offsets = array("Q")
+                offsets.frombytes(f.read())
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != INDEX_VERSION or len(offsets) != meta.get("rows", -1) + 1:
+            return None
+        index = cls(csv_path, meta["header_end"], offsets, meta["size"], meta["mtime_ns"])
+        return index if index.is_current() else None
+
+    @classmethod
+    def open(cls, csv_path: Path, index_path: Optional[Path] = None) -> "CaseIndex":
+        """Load the index of csv_path, (re)building it if missing or stale."""
+        index_path = index_path or default_index_path(csv_path)
+        index = cls.load(csv_path, index_path)
+        if index is None:
+            index = cls.build(csv_path)
+            index.save(index_path)
+            logger.info(f"Indexed {len(index)} records of {csv_path} into {index_path}")
+        return index
+
+
+def default_index_path(csv_path: Path) -> Path:
+    return csv_path.with_name(csv_path.name + ".idx")
+
+
+class CaseCsvReader:
+    """Memory-mapped CSV reader that parses only the requested row range."""
+
+    def __init__(self, csv_path: Path, index_path: Optional[Path] = None, encoding: str = "utf-8"):
+        self.csv_path = csv_path
+        self.encoding = encoding
+        self.index = CaseIndex.open(csv_path, index_path)
+        self._file = open(csv_path, "rb")
+        self._mm = (
+            mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self.index.size else b""
+        )
+        header = self._mm[: self.index.header_end].decode(encoding)
+        self.fieldnames = next(csv.reader(io.StringIO(header)), [])
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __enter__(self) -> "CaseCsvReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def value_rows(self, start: int = 0, stop: Optional[int] = None) -> Iterator[list[str]]:
+        """Yield rows [start, stop) as lists of cells (same as csv.reader)."""
+        count = len(self)
+        stop = count if stop is None else min(stop, count)
+        start = max(0, start)
+        if start >= stop:
+            return
+        offsets = self.index.offsets
+        for chunk_start in range(start, stop, CHUNK_RECORDS):
+            chunk_stop = min(chunk_start + CHUNK_RECORDS, stop)
+            text = self._mm[offsets[chunk_start]: offsets[chunk_stop]].decode(self.encoding)
+            for cells in csv.reader(io.StringIO(text, newline="")):
+                if cells:
+                    yield cells
+
+    def close(self) -> None:
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
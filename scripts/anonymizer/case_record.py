@@ -0,0 +1,77 @@
+"""
+Compact row representation for process_csv.
+
+A CaseRecord keeps the cell values in a list whose positions are given by a
+CaseSchema shared by all rows (the input columns plus "url"), instead of one
+dict per row. Per-stage results live in their own slots (entity count,
+Phase 2 verdict, AI columns), so no scratch keys are pushed into the row and
+stages pass the same object along without copying it.
+
+CaseRecord is a read/write Mapping on column names, so code written for
+csv.DictReader rows (row.get("Id"), row[col] = ..., csv.DictWriter) keeps
+working.
+"""
+
+from collections.abc import Mapping
+from typing import Iterable, Iterator, Optional
+
+
+class CaseSchema:
+    """Column names and their positions, shared by all records of a file."""
+
+    __slots__ = ("fieldnames", "positions")
+
+    def __init__(self, fieldnames: Iterable[str]):
+        self.fieldnames = list(fieldnames)
+        self.positions = {name: pos for pos, name in enumerate(self.fieldnames)}
+
+    def __len__(self) -> int:
+        return len(self.fieldnames)
+
+    def record(self, index: int, values: Iterable[str]) -> "CaseRecord":
+        """Build a record from cell values in schema order (padded/truncated to the schema)."""
+        values = list(values)
+        width = len(self.fieldnames)
+        if len(values) < width:
+            values.extend([""] * (width - len(values)))
+        elif len(values) > width:
+            del values[width:]
+        return CaseRecord(self, index, values)
+
+    def from_dict(self, index: int, row: Mapping) -> "CaseRecord":
+        """Build a record from a dict row (missing columns are empty)."""
+        return self.record(index, (row.get(name, "") for name in self.fieldnames))
+
+
+class CaseRecord(Mapping):
+    """One case row: values by schema position plus per-stage annotations."""
+
+    __slots__ = ("schema", "index", "source_index", "values", "num_entities", "verdict", "ai_columns", "ai_keep")
+
+    def __init__(self, schema: CaseSchema, index: int, values: list[str]):
+        self.schema = schema
+        self.index = index  # 1-based position among the rows being processed
+        self.source_index = index  # same, but never renumbered (Phase 3 renumbers index)
+        self.values = values
+        self.num_entities = 0  # Phase 1: PII entities anonymized
+        self.verdict: Optional[str] = None  # Phase 2: 'keep', 'tags' or 'denylist'
+        self.ai_columns: Optional[dict[str, str]] = None  # Phase 3: columns sent to the AI
+        self.ai_keep: Optional[bool] = None  # Phase 3: KEEP/REMOVE (LLM or local classifier)
+
+    def __getitem__(self, name: str) -> str:
+        return self.values[self.schema.positions[name]]
+
+    def __setitem__(self, name: str, value: str) -> None:
+        self.values[self.schema.positions[name]] = value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.schema.fieldnames)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __repr__(self) -> str:
+        return f"CaseRecord({self.index}, {dict(self)!r})"
+
+    def as_dict(self) -> dict[str, str]:
+        return dict(zip(self.schema.fieldnames, self.values))
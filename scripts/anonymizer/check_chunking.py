@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Equivalence check of the windowed analysis of long cells (text_chunks.py).
+
+Builds long synthetic email threads (see synthetic_cases.py) joined with the
+separators found in real exports, and analyzes each one both with
+analyze_chunked and as a single doc with AnalyzerEngine.analyze. A thread
+fails when the anonymized text differs; differences in the span lists that
+do not change the output are reported but allowed.
+
+Small windows put many more entities near a cut, so the default run also
+checks 500 and 300 character windows.
+
+Usage:
+  python check_chunking.py                         # 120 threads, windows of 2000/500/300 chars
+  python check_chunking.py --threads 30 --max-chars 2000
+"""
+
+import argparse
+import logging
+import random
+import sys
+import time
+
+from presidio_analyzer import EntityRecognizer
+
+import presidio
+from synthetic_cases import SyntheticCaseGenerator
+from text_chunks import CHUNK_MAX_CHARS, CHUNK_OVERLAP_CHARS, analyze_chunked
+
+logger = logging.getLogger("check_chunking")
+
+DEFAULT_THREADS = 120
+DEFAULT_WINDOWS = [CHUNK_MAX_CHARS, 500, 300]
+# Messages per thread: 0.5k to ~13k characters
+THREAD_MESSAGES = (4, 60)
+SEPARATORS = [
+    "\n\n",
+    "\n",
+    " ",
+    "\n> ",
+    "\n\n-----Messaggio originale-----\n",
+    "\n\nIl giorno lun 3 mar 2025 alle ore 10:12 ha scritto:\n> ",
+]
+
+
+def synthetic_threads(n: int, seed: int) -> list[str]:
+    """Long Description-like texts made of several synthetic messages."""
+    generator = SyntheticCaseGenerator(seed)
+    rng = random.Random(seed)
+    threads = []
+    for _ in range(n):
+        messages = [generator.labelled_text()[0] for _ in range(rng.randint(*THREAD_MESSAGES))]
+        thread = messages[0]
+        for message in messages[1:]:
+            thread += rng.choice(SEPARATORS) + message
+        threads.append(thread)
+    return threads
+
+
+def _spans(results: list) -> set[tuple[str, int, int]]:
+    return {(r.entity_type, r.start, r.end) for r in EntityRecognizer.remove_duplicates(results)}
+
+
+def check(analyzer, anonymizer, threads: list[str], max_chars: int) -> tuple[int, int]:
+    """Compare windowed and single-doc analysis. Returns (output mismatches, span mismatches)."""
+    profile = presidio.DEFAULT_PROFILE
+    entities = list(profile.entity_types)
+    overlap = min(CHUNK_OVERLAP_CHARS, max_chars // 3)
+    output_mismatches = span_mismatches = 0
+    for i, text in enumerate(threads):
+        single = analyzer.analyze(text=text, entities=entities, language="it")
+        chunked = analyze_chunked(text, analyzer, entities, "it", max_chars, overlap)
+        if _spans(single) != _spans(chunked):
+            span_mismatches += 1
+        expected = anonymizer.anonymize(text=text, analyzer_results=single, operators=profile.operators).text
+        got = anonymizer.anonymize(text=text, analyzer_results=chunked, operators=profile.operators).text
+        if got != expected:
+            output_mismatches += 1
+            only_single = sorted(_spans(single) - _spans(chunked))
+            only_chunked = sorted(_spans(chunked) - _spans(single))
+            logger.error(
+                f"  Thread {i} ({len(text)} chars): output differs; "
+                f"single-doc only {only_single[:5]}, windowed only {only_chunked[:5]}"
+            )
+    return output_mismatches, span_mismatches
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Check that windowed analysis of long cells anonymizes like single-doc analysis",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=DEFAULT_THREADS,
+        help=f"Synthetic threads to check (default: {DEFAULT_THREADS})",
+    )
+    parser.add_argument(
+        "--max-chars",
+        type=int,
+        nargs="+",
+        default=DEFAULT_WINDOWS,
+        metavar="N",
+        help=f"Window lengths to check (default: {' '.join(map(str, DEFAULT_WINDOWS))})",
+    )
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    return parser.parse_args()
+
+
+def main() -> int:
+    """Main entry point."""
+    args = parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    logging.getLogger("presidio-analyzer").setLevel(logging.ERROR)
+
+    analyzer = presidio.setup_analyzer()
+    anonymizer = presidio.setup_anonymizer()
+    threads = synthetic_threads(args.threads, args.seed)
+    lengths = sorted(len(text) for text in threads)
+    logger.info(f"{len(threads)} threads of {lengths[0]}-{lengths[-1]} chars")
+
+    failed = False
+    for max_chars in args.max_chars:
+        t0 = time.perf_counter()
+        output_mismatches, span_mismatches = check(analyzer, anonymizer, threads, max_chars)
+        logger.info(
+            f"Windows of {max_chars} chars: {output_mismatches} outputs differ, "
+            f"{span_mismatches} span lists differ ({time.perf_counter() - t0:.1f}s)"
+        )
+        failed = failed or output_mismatches > 0
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+SQLite checkpoint store for resumable process_csv runs.
+
+Records, per input file, the Phase 1 anonymized rows, the Phase 2 filter
+verdicts and the Phase 3 AI batches that completed. A run started with
+--resume reuses everything already stored and only does the remaining work.
+Filter verdicts are keyed by input row number, and an AI batch is reused
+only if it holds the same rows (a --time-budget run may stop Phase 1 early,
+so a resumed run can form different batches).
+The checkpoint is discarded when the input file (size/mtime), the row limit,
+the shard or the anonymization profile version changes.
+"""
+
+import json
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Rows written between two SQLite commits in Phase 1
+COMMIT_EVERY = 50
+
+# Bumped when the stored layout changes (2: AI results are {column: text},
+# 3: AI batches keyed by their rows, filter verdicts by input row number)
+CHECKPOINT_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS anonymized_rows (
+    idx INTEGER PRIMARY KEY,
+    row_json TEXT NOT NULL,
+    num_entities INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS filter_verdicts (
+    idx INTEGER PRIMARY KEY,
+    verdict TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ai_batches (
+    batch_num INTEGER PRIMARY KEY,
+    results_json TEXT NOT NULL
+);
+"""
+
+
+def input_signature(
+    input_path: Path,
+    limit: Optional[int],
+    profile_version: str,
+    shard: Optional[tuple[int, int]] = None,
+    routing: Optional[str] = None,
+) -> str:
+    """
+    Identify the work a checkpoint belongs to. `routing` identifies the local
+    classifier and threshold, which decide the rows sent in each AI batch.
+    """
+    st = input_path.stat()
+    return json.dumps(
+        {
+            "input": str(input_path.resolve()),
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "limit": limit,
+            "shard": list(shard) if shard else None,
+            "routing": routing,
+            "profile_version": profile_version,
+            "checkpoint_version": CHECKPOINT_VERSION,
+        },
+        sort_keys=True,
+    )
+
+
+class RunCheckpoint:
+    """Phase- and batch-level checkpoint of a process_csv run."""
+
+    def __init__(self, path: Path, signature: str, resume: bool):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._pending = 0
+
+        stored = self.conn.execute(
+            "SELECT value FROM meta WHERE key = 'signature'"
+        ).fetchone()
+        if resume and stored and stored[0] == signature:
+            logger.info(
+                f"Resuming from checkpoint {path}: "
+                f"{self.count('anonymized_rows')} anonymized rows, "
+                f"{self.count('filter_verdicts')} filter verdicts, "
+                f"{self.count('ai_batches')} AI batches"
+            )
+        else:
+            if resume and stored:
+                logger.warning(
+                    f"Checkpoint {path} belongs to a different input/configuration, starting over"
+                )
+            elif resume:
+                logger.info(f"No checkpoint found at {path}, starting from row 1")
+            self.reset(signature)
+
+    def reset(self, signature: str) -> None:
+        """Drop all stored progress and bind the checkpoint to a new signature."""
+        with self.conn:
+            for table in ("anonymized_rows", "filter_verdicts", "ai_batches", "meta"):
+                self.conn.execute(f"DELETE FROM {table}")
+            self.conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('signature', ?)", (signature,)
+            )
+
+    def count(self, table: str) -> int:
+        return self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    # Phase 1 ---------------------------------------------------------------
+
+    def anonymized_rows(self) -> dict[int, tuple[dict, int]]:
+        """Return {idx: (anonymized_row, num_entities)} for completed rows."""
+        return {
+            idx: (json.loads(row_json), num_entities)
+            for idx, row_json, num_entities in self.conn.execute(
+                "SELECT idx, row_json, num_entities FROM anonymized_rows"
+            )
+        }
+
+    def save_anonymized_row(self, idx: int, row: dict, num_entities: int) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO anonymized_rows (idx, row_json, num_entities) VALUES (?, ?, ?)",
+            (idx, json.dumps(row, ensure_ascii=False), num_entities),
+        )
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.flush()
+
+    # Phase 2 ---------------------------------------------------------------
+
+    def filter_verdicts(self) -> dict[int, str]:
+        """Return {idx: verdict} ('keep', 'tags' or 'denylist')."""
+        return dict(self.conn.execute("SELECT idx, verdict FROM filter_verdicts"))
+
+    def save_filter_verdicts(self, verdicts: dict[int, str]) -> None:
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO filter_verdicts (idx, verdict) VALUES (?, ?)",
+                verdicts.items(),
+            )
+
+    # Phase 3 ---------------------------------------------------------------
+
+    def ai_batch(
+        self, batch_num: int, rows_key: str = ""
+    ) -> Optional[dict[int, tuple[Optional[dict[str, str]], bool]]]:
+        """Return the stored results of a completed AI batch of the same rows, if any."""
+        found = self.conn.execute(
+            "SELECT results_json FROM ai_batches WHERE batch_num = ?", (batch_num,)
+        ).fetchone()
+        if not found:
+            return None
+        stored = json.loads(found[0])
+        if stored["rows_key"] != rows_key:
+            return None
+        return {
+            int(idx): (corrections, useful)
+            for idx, (corrections, useful) in stored["results"].items()
+        }
+
+    def save_ai_batch(
+        self,
+        batch_num: int,
+        results: dict[int, tuple[Optional[dict[str, str]], bool]],
+        rows_key: str = "",
+    ) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO ai_batches (batch_num, results_json) VALUES (?, ?)",
+                (batch_num, json.dumps({"rows_key": rows_key, "results": results}, ensure_ascii=False)),
+            )
+
+    # -----------------------------------------------------------------------
+
+    def flush(self) -> None:
+        self.conn.commit()
+        self._pending = 0
+
+    def close(self) -> None:
+        self.flush()
+        self.conn.close()
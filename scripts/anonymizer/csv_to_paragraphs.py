@@ -10,22 +10,39 @@ Each row becomes a paragraph:
 
 Rows with any empty/undefined cell are skipped.
 
+--input also takes several files, directories (their daily
+case_anonymized_YYYY_MM_DD.csv files) or glob patterns. Files are parsed in
+parallel and cases are deduplicated on Id: the version in the latest file
+(input order, directories and globs sorted by name, i.e. by date) wins, at
+the position where the case first appeared. Daily files deleted by
+snapshot_store.py convert --remove-originals are read back from the store.
+
+A sidecar index (<output>.idx, Id -> byte range) is rebuilt next to the
+output for paragraph_index.ParagraphReader.
+
 Usage:
-  python csv_to_paragraphs.py [--input FILE] [--output FILE] [--separator SEP]
+  python csv_to_paragraphs.py [--input FILE|DIR|GLOB ...] [--output FILE] [--separator SEP] [--workers N]
   python csv_to_paragraphs.py --input data/anonymized/output_case.csv --output data/anonymized/case_paragraphs.txt
+  python csv_to_paragraphs.py --input data/anonymized/ --output data/anonymized/case_paragraphs.txt
+  python csv_to_paragraphs.py --input "data/anonymized/case_anonymized_2026_03_*.csv"
 """
 
 import argparse
 import csv
+import fnmatch
+import glob
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from paragraph_index import ParagraphIndex, default_index_path
+from snapshot_store import daily_file_available, daily_sources, open_daily_csv
+
 SCRIPT_DIR = Path(__file__).parent
 DEFAULT_INPUT = SCRIPT_DIR / "input" / "case.csv"
 DEFAULT_OUTPUT = SCRIPT_DIR.parent.parent / "data" / "anonymized" / "case_paragraphs.txt"
 DEFAULT_SEPARATOR = "==="
-
-
 def is_empty(value: str) -> bool:
     """Consider None, empty string, or whitespace-only as empty."""
     if value is None:
@@ -57,31 +74,39 @@ def row_to_paragraph(
     return "\n".join(lines) + "\n" + separator
 
 
-def csv_to_paragraphs(
+def expand_inputs(specs: list[str]) -> list[Path]:
+    """Files of the --input values, in order (directories and globs sorted by name)."""
+    paths = []
+    for spec in specs:
+        path = Path(spec)
+        if path.is_dir():
+            paths.extend(daily_sources(path))
+        elif glob.has_magic(spec):
+            matches = {Path(p) for p in glob.glob(spec)}
+            if not glob.has_magic(str(path.parent)) and path.parent.is_dir():
+                # Days only kept in the snapshot store
+                matches.update(p for p in daily_sources(path.parent) if fnmatch.fnmatch(str(p), spec))
+            paths.extend(sorted(matches))
+        else:
+            paths.append(path)
+    return paths
+
+
+def file_paragraphs(
     input_path: Path,
-    output_path: Path,
     separator: str = DEFAULT_SEPARATOR,
     columns: list[str] | None = None,
     require_columns: list[str] | None = None,
-) -> tuple[int, int]:
+) -> list[tuple[str, str | None]]:
     """
-    Read CSV, write paragraphs to .txt.
-    Returns (rows_read, paragraphs_written).
-
-    - columns: deprecated, use require_columns + output all columns. If set, only these
-      columns are required and written (backward compatible).
-    - require_columns: row included only if these columns are non-empty. Output: all
-      CSV columns. Use with columns=None to get all columns in output.
+    (Id, paragraph) of every row of a CSV, paragraph None when the row is
+    skipped. Runs in the worker processes of csv_files_to_paragraphs.
     """
-    rows_read = 0
-    paragraphs_written = 0
-    paragraphs = []
-
-    with open(input_path, "r", encoding="utf-8") as f:
+    blocks = []
+    with open_daily_csv(input_path) as f:
         reader = csv.DictReader(f)
         fieldnames = reader.fieldnames or []
         for row in reader:
-            rows_read += 1
             ordered_row = {k: row.get(k, "") for k in fieldnames}
             if columns is not None:
                 # Backward compat: require and output only these
@@ -96,9 +121,55 @@ def csv_to_paragraphs(
                     require_columns=require_columns or fieldnames,
                     output_columns=fieldnames,
                 )
-            if block is not None:
-                paragraphs.append(block)
-                paragraphs_written += 1
+            blocks.append(((row.get("Id") or "").strip(), block))
+    return blocks
+
+
+def _file_paragraphs_args(args: tuple) -> list[tuple[str, str | None]]:
+    return file_paragraphs(*args)
+
+
+def csv_files_to_paragraphs(
+    input_paths: list[Path],
+    output_path: Path,
+    separator: str = DEFAULT_SEPARATOR,
+    columns: list[str] | None = None,
+    require_columns: list[str] | None = None,
+    workers: int | None = None,
+) -> tuple[int, int, int]:
+    """
+    Parse the CSVs in parallel, dedupe on Id (latest file wins) and write one
+    paragraph stream. Rows without an Id are never deduplicated.
+    Returns (rows_read, duplicates, paragraphs_written).
+    """
+    workers = min(workers or os.cpu_count() or 1, len(input_paths)) or 1
+    jobs = [(path, separator, columns, require_columns) for path in input_paths]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            per_file = list(executor.map(_file_paragraphs_args, jobs))
+    else:
+        per_file = [_file_paragraphs_args(job) for job in jobs]
+
+    rows_read = 0
+    duplicates = 0
+    # Latest version of each case, at the position of its first appearance
+    by_id: dict[str, str | None] = {}
+    stream: list[tuple[str, str | None]] = []
+    for blocks in per_file:
+        rows_read += len(blocks)
+        for case_id, block in blocks:
+            if not case_id:
+                stream.append(("", block))
+            elif case_id in by_id:
+                duplicates += 1
+                by_id[case_id] = block
+            else:
+                by_id[case_id] = block
+                stream.append((case_id, None))
+    paragraphs = [
+        block for block in (by_id[case_id] if case_id else block for case_id, block in stream)
+        if block is not None
+    ]
 
     output_path.parent.mkdir(parents=True, exist_ok=True)
     with open(output_path, "w", encoding="utf-8") as f:
@@ -106,7 +177,35 @@ def csv_to_paragraphs(
         if paragraphs:
             f.write("\n")
 
-    return rows_read, paragraphs_written
+    return rows_read, duplicates, len(paragraphs)
+
+
+def csv_to_paragraphs(
+    input_path: Path,
+    output_path: Path,
+    separator: str = DEFAULT_SEPARATOR,
+    columns: list[str] | None = None,
+    require_columns: list[str] | None = None,
+) -> tuple[int, int]:
+    """
+    Read CSV, write paragraphs to .txt.
+    Returns (rows_read, paragraphs_written).
+
+    - columns: deprecated, use require_columns + output all columns. If set, only these
+      columns are required and written (backward compatible).
+    - require_columns: row included only if these columns are non-empty. Output: all
+      CSV columns. Use with columns=None to get all columns in output.
+    """
+    blocks = file_paragraphs(input_path, separator, columns, require_columns)
+    paragraphs = [block for _, block in blocks if block is not None]
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(paragraphs))
+        if paragraphs:
+            f.write("\n")
+
+    return len(blocks), len(paragraphs)
 
 
 def main() -> int:
@@ -116,9 +215,10 @@ def main() -> int:
     parser.add_argument(
         "--input",
         "-i",
-        type=Path,
-        default=DEFAULT_INPUT,
-        help=f"Input CSV path (default: {DEFAULT_INPUT})",
+        nargs="+",
+        default=[str(DEFAULT_INPUT)],
+        metavar="FILE|DIR|GLOB",
+        help=f"Input CSV files, directories of daily files or glob patterns (default: {DEFAULT_INPUT})",
     )
     parser.add_argument(
         "--output",
@@ -150,6 +250,18 @@ def main() -> int:
         metavar="COL1,COL2,...",
         help="Require these columns non-empty to include row. Output: all CSV columns.",
     )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=None,
+        help="Processes parsing the input files (default: one per CPU, at most one per file)",
+    )
+    parser.add_argument(
+        "--no-index",
+        action="store_true",
+        help="Do not write the Id -> paragraph offset index (<output>.idx)",
+    )
     args = parser.parse_args()
 
     columns = None
@@ -159,18 +271,30 @@ def main() -> int:
     if args.require:
         require_columns = [c.strip() for c in args.require.split(",") if c.strip()]
 
-    if not args.input.exists():
-        print(f"Error: input file not found: {args.input}", file=sys.stderr)
+    input_paths = expand_inputs(args.input)
+    if not input_paths:
+        print(f"Error: no input files match: {' '.join(args.input)}", file=sys.stderr)
+        return 1
+    missing = [path for path in input_paths if not daily_file_available(path)]
+    if missing:
+        print(f"Error: input file not found: {missing[0]}", file=sys.stderr)
         return 1
 
-    rows_read, paragraphs_written = csv_to_paragraphs(
-        args.input,
+    rows_read, duplicates, paragraphs_written = csv_files_to_paragraphs(
+        input_paths,
         args.output,
         args.separator,
         columns=columns,
         require_columns=require_columns,
+        workers=args.workers,
+    )
+    print(
+        f"Read {rows_read} rows from {len(input_paths)} files ({duplicates} duplicate Ids), "
+        f"wrote {paragraphs_written} paragraphs to {args.output}"
     )
-    print(f"Read {rows_read} rows, wrote {paragraphs_written} paragraphs to {args.output}")
+    if not args.no_index:
+        index = ParagraphIndex.open(args.output, separator=args.separator, rebuild=True)
+        print(f"Indexed {len(index)} Ids in {default_index_path(args.output)}")
     return 0
 
 
@@ -0,0 +1,136 @@
+"""
+Wall-clock budget for process_csv runs (--time-budget).
+
+RunDeadline measures how long each kind of work takes as the run goes
+("row": Phase 1 anonymization of one row, "ai_row": one row of a Phase 3
+AI batch) and tells process_csv whether a piece of work still fits before
+the deadline, keeping a safety margin to write the outputs. The per-unit
+durations are saved at the end of a run and are the starting estimates of
+the next one.
+
+Rows are taken in priority order: the Ids left over by a previous run
+first, then the newest cases (highest CaseNumber). The Ids a run does not
+finish are saved so the next run picks them up first.
+"""
+
+import json
+import logging
+import re
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Seconds kept free at the end of the budget to write the daily file and the master append
+DEFAULT_MARGIN_S = 60.0
+
+# Starting per-unit estimates (seconds) when no throughput was saved by a previous run
+DEFAULT_UNIT_SECONDS = {
+    "row": 0.5,
+    "ai_row": 3.0,
+}
+
+# Weight of the latest measure in the running estimate
+EWMA_ALPHA = 0.3
+
+DURATION_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smh]?)\s*$", re.IGNORECASE)
+DURATION_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value: str) -> float:
+    """Seconds of a duration like '3000', '50m' or '1.5h'."""
+    match = DURATION_PATTERN.match(value)
+    if not match:
+        raise ValueError(f"Invalid duration {value!r} (expected e.g. 3000, 50m or 1.5h)")
+    return float(match.group(1)) * DURATION_UNITS[match.group(2).lower()]
+
+
+class RunDeadline:
+    """Time left in the run and running per-unit estimates of the work still to do."""
+
+    def __init__(
+        self,
+        budget_s: float,
+        margin_s: float = DEFAULT_MARGIN_S,
+        unit_seconds: Optional[dict[str, float]] = None,
+    ):
+        self.budget_s = budget_s
+        self.margin_s = margin_s
+        self.started = time.monotonic()
+        self.unit_seconds = dict(DEFAULT_UNIT_SECONDS)
+        self.unit_seconds.update(unit_seconds or {})
+        self.measured: dict[str, int] = {}
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining(self) -> float:
+        """Seconds left before the outputs must be written (margin excluded)."""
+        return self.budget_s - self.margin_s - self.elapsed()
+
+    def estimate(self, kind: str, units: int = 1) -> float:
+        return self.unit_seconds.get(kind, 0.0) * units
+
+    def allows(self, *work: tuple[str, int]) -> bool:
+        """True if the given (kind, units) work is expected to finish before the deadline."""
+        return sum(self.estimate(kind, units) for kind, units in work) <= self.remaining()
+
+    def record(self, kind: str, seconds: float, units: int = 1) -> None:
+        """Record the duration of `units` units of work of a kind."""
+        if units <= 0:
+            return
+        per_unit = seconds / units
+        if kind in self.measured:
+            per_unit = EWMA_ALPHA * per_unit + (1 - EWMA_ALPHA) * self.unit_seconds[kind]
+        self.unit_seconds[kind] = per_unit
+        self.measured[kind] = self.measured.get(kind, 0) + units
+
+    @staticmethod
+    def load_throughput(path: Path) -> dict[str, float]:
+        """Per-unit durations saved by a previous run (empty if none or unreadable)."""
+        try:
+            stored = json.loads(path.read_text(encoding="utf-8"))
+            return {kind: float(s) for kind, s in stored.items() if kind in DEFAULT_UNIT_SECONDS}
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def save_throughput(self, path: Path) -> None:
+        """Save the per-unit durations measured in this run for the next one."""
+        if not self.measured:
+            return
+        stored = self.load_throughput(path)
+        stored.update({kind: self.unit_seconds[kind] for kind in self.measured})
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(stored, indent=2), encoding="utf-8")
+
+
+def case_number_key(case_number: str) -> tuple:
+    """Sort key of a CaseNumber: numeric ones by value, others before them."""
+    case_number = case_number.strip()
+    return (1, int(case_number)) if case_number.isdigit() else (0, case_number)
+
+
+def priority_order(records: Iterable, pending_ids: Iterable[str] = ()) -> list:
+    """Records with the pending Ids first, then by CaseNumber, newest first."""
+    pending = set(pending_ids)
+    ordered = sorted(records, key=lambda r: case_number_key(r.get("CaseNumber", "")), reverse=True)
+    ordered.sort(key=lambda r: r.get("Id", "") not in pending)
+    return ordered
+
+
+def load_pending_ids(path: Path) -> list[str]:
+    """Ids left unprocessed by previous runs (one per line)."""
+    if not path.exists():
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def save_pending_ids(path: Path, ids: list[str]) -> None:
+    """Replace the pending Ids (an empty file when there are none)."""
+    ids = [case_id for case_id in ids if case_id]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_text("".join(f"{case_id}\n" for case_id in ids), encoding="utf-8")
+    tmp_path.replace(path)
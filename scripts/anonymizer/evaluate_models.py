@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+PII recall/precision vs speed and memory of analyzer configurations.
+
+Builds a labelled corpus with SyntheticCaseGenerator.labelled_text (faker
+it_IT PII with known spans) and runs it through every combination of
+Italian spaCy model x recognizer set. Each configuration runs in its own
+process, so setup time and peak RSS are not polluted by the others.
+
+Recognizer sets:
+  - full:     the analyzer of presidio.py (spaCy NER + pattern recognizers)
+  - patterns: pattern recognizers only (SpacyRecognizer removed), to see what
+              the NER model contributes
+
+A prediction is a true positive when it overlaps a labelled span of the same
+entity type. "masked" is the share of labelled spans overlapped by any
+prediction, whatever its type: those values get replaced by some tag.
+
+Usage:
+  python evaluate_models.py                                     # lg/md/sm x full/patterns
+  python evaluate_models.py --models it_core_news_lg it_core_news_sm --docs 500
+  python evaluate_models.py --recognizers full --output /tmp/models.json
+
+Any installed spaCy pipeline (e.g. a transformer one) can be listed in
+--models; configurations whose model is not installed are reported as failed.
+The chosen model is then passed to presidio.py --nlp-model.
+"""
+
+import argparse
+import json
+import logging
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from synthetic_cases import SyntheticCaseGenerator
+
+logger = logging.getLogger("evaluate_models")
+
+SCRIPT_DIR = Path(__file__).parent
+DEFAULT_OUTPUT_DIR = SCRIPT_DIR / "benchmarks"
+DEFAULT_MODELS = ["it_core_news_lg", "it_core_news_md", "it_core_news_sm"]
+RECOGNIZER_SETS = ["full", "patterns"]
+DEFAULT_DOCS = 1000
+
+
+def build_corpus(docs: int, seed: int) -> list[dict]:
+    """Labelled texts as {"text", "spans": [[entity_type, start, end], ...]}."""
+    generator = SyntheticCaseGenerator(seed)
+    corpus = []
+    for _ in range(docs):
+        text, spans = generator.labelled_text()
+        corpus.append({"text": text, "spans": [list(span) for span in spans]})
+    return corpus
+
+
+def score(corpus: list[dict], predictions: list[list[tuple[str, int, int]]]) -> dict:
+    """Per-entity precision/recall/F1 (overlap + same type) and masked share."""
+    gold = Counter()
+    predicted = Counter()
+    tp_pred = Counter()  # predictions overlapping a same-type span
+    tp_gold = Counter()  # labelled spans overlapped by a same-type prediction
+    masked = Counter()  # labelled spans overlapped by any prediction
+    for doc, preds in zip(corpus, predictions):
+        for entity_type, start, end in preds:
+            predicted[entity_type] += 1
+            if any(g_type == entity_type and start < g_end and g_start < end
+                   for g_type, g_start, g_end in doc["spans"]):
+                tp_pred[entity_type] += 1
+        for g_type, g_start, g_end in doc["spans"]:
+            gold[g_type] += 1
+            overlapping = [p_type for p_type, start, end in preds if start < g_end and g_start < end]
+            if g_type in overlapping:
+                tp_gold[g_type] += 1
+            if overlapping:
+                masked[g_type] += 1
+
+    def metrics(g: int, p: int, tpp: int, tpg: int, m: int) -> dict:
+        precision = tpp / p if p else None
+        recall = tpg / g if g else None
+        f1 = (2 * precision * recall / (precision + recall)
+              if precision is not None and recall is not None and precision + recall else None)
+        return {
+            "gold": g,
+            "predicted": p,
+            "precision": round(precision, 4) if precision is not None else None,
+            "recall": round(recall, 4) if recall is not None else None,
+            "f1": round(f1, 4) if f1 is not None else None,
+            "masked": round(m / g, 4) if g else None,
+        }
+
+    per_entity = {
+        entity_type: metrics(gold[entity_type], predicted[entity_type], tp_pred[entity_type],
+                             tp_gold[entity_type], masked[entity_type])
+        for entity_type in sorted(set(gold) | set(predicted))
+    }
+    overall = metrics(sum(gold.values()), sum(predicted.values()), sum(tp_pred.values()),
+                      sum(tp_gold.values()), sum(masked.values()))
+    return {"overall": overall, "entities": per_entity}
+
+
+def run_configuration(model: str, recognizers: str, corpus_path: Path) -> dict:
+    """Evaluate one configuration in this process (called in the worker subprocess)."""
+    import presidio
+    import spacy
+
+    # Presidio would otherwise try to download a missing model
+    if not spacy.util.is_package(model):
+        raise SystemExit(f"spaCy model not installed: {model} (python -m spacy download {model})")
+
+    t0 = time.perf_counter()
+    analyzer = presidio.setup_analyzer(model)
+    if recognizers == "patterns":
+        analyzer.registry.remove_recognizer("SpacyRecognizer")
+    entities = list(presidio.build_anonymization_profile(nlp_model=model).entity_types)
+    # First call loads lazy spaCy components
+    analyzer.analyze(text="Mario Rossi", entities=entities, language="it")
+    setup_s = time.perf_counter() - t0
+
+    with open(corpus_path, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+    predictions = []
+    t0 = time.perf_counter()
+    for doc in corpus:
+        results = analyzer.analyze(text=doc["text"], entities=entities, language="it")
+        predictions.append([(r.entity_type, r.start, r.end) for r in results])
+    analyze_s = time.perf_counter() - t0
+
+    return {
+        "setup_s": round(setup_s, 3),
+        "analyze_s": round(analyze_s, 3),
+        "docs_per_s": round(len(corpus) / analyze_s, 2) if analyze_s else None,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        **score(corpus, predictions),
+    }
+
+
+def evaluate(model: str, recognizers: str, corpus_path: Path) -> dict:
+    """Run one configuration in a fresh interpreter and return its results."""
+    out = subprocess.run(
+        [sys.executable, str(Path(__file__).resolve()), "--worker", model, recognizers, str(corpus_path)],
+        capture_output=True,
+        text=True,
+    )
+    if out.returncode != 0:
+        error = (out.stderr.strip().splitlines() or ["unknown error"])[-1]
+        logger.error(f"  {model}/{recognizers} failed: {error}")
+        return {"error": error}
+    return json.loads(out.stdout)
+
+
+def print_matrix(configurations: list[dict]) -> None:
+    print(f"{'model':<20} {'recognizers':<11} {'docs/s':>8} {'RSS MB':>7} {'setup s':>7} "
+          f"{'prec':>6} {'recall':>6} {'masked':>6}")
+    for c in configurations:
+        r = c["results"]
+        if "error" in r:
+            print(f"{c['model']:<20} {c['recognizers']:<11} failed: {r['error']}")
+            continue
+        o = r["overall"]
+        print(f"{c['model']:<20} {c['recognizers']:<11} {r['docs_per_s']:>8} {r['peak_rss_mb']:>7} "
+              f"{r['setup_s']:>7} {o['precision']:>6} {o['recall']:>6} {o['masked']:>6}")
+    print()
+    for c in configurations:
+        if "error" in c["results"]:
+            continue
+        print(f"{c['model']} / {c['recognizers']}")
+        for entity_type, m in c["results"]["entities"].items():
+            print(f"  {entity_type:<18} gold {m['gold']:>5}  pred {m['predicted']:>5}  "
+                  f"P {m['precision'] if m['precision'] is not None else '-':>6}  "
+                  f"R {m['recall'] if m['recall'] is not None else '-':>6}  "
+                  f"masked {m['masked'] if m['masked'] is not None else '-':>6}")
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Per-entity PII precision/recall, docs/s and peak RSS of analyzer configurations",
+    )
+    parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS, metavar="NAME",
+                        help=f"Italian spaCy models (default: {' '.join(DEFAULT_MODELS)})")
+    parser.add_argument("--recognizers", nargs="+", choices=RECOGNIZER_SETS, default=RECOGNIZER_SETS,
+                        help="Recognizer sets (default: full patterns)")
+    parser.add_argument("--docs", type=int, default=DEFAULT_DOCS,
+                        help=f"Labelled texts in the corpus (default: {DEFAULT_DOCS})")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    parser.add_argument("--output", "-o", type=Path, default=None,
+                        help=f"Results JSON (default: {DEFAULT_OUTPUT_DIR}/models_<commit>.json)")
+    parser.add_argument("--worker", nargs=3, metavar=("MODEL", "RECOGNIZERS", "CORPUS"),
+                        help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main() -> int:
+    """Main entry point."""
+    args = parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    if args.worker:
+        logging.getLogger("presidio").setLevel(logging.WARNING)
+        logging.getLogger("presidio-analyzer").setLevel(logging.ERROR)
+        model, recognizers, corpus_path = args.worker
+        json.dump(run_configuration(model, recognizers, Path(corpus_path)), sys.stdout)
+        return 0
+
+    from benchmark import git_commit
+
+    corpus = build_corpus(args.docs, args.seed)
+    logger.info(f"Corpus: {len(corpus)} texts, {sum(len(doc['spans']) for doc in corpus)} labelled spans")
+    configurations = []
+    with tempfile.TemporaryDirectory(prefix="presidio-models-") as tmp:
+        corpus_path = Path(tmp) / "corpus.json"
+        corpus_path.write_text(json.dumps(corpus, ensure_ascii=False), encoding="utf-8")
+        for model in args.models:
+            for recognizers in args.recognizers:
+                logger.info(f"Evaluating {model} / {recognizers}...")
+                configurations.append({
+                    "model": model,
+                    "recognizers": recognizers,
+                    "results": evaluate(model, recognizers, corpus_path),
+                })
+
+    document = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seed": args.seed,
+        "docs": len(corpus),
+        "configurations": configurations,
+    }
+    output_path: Optional[Path] = args.output
+    if output_path is None:
+        output_path = DEFAULT_OUTPUT_DIR / f"models_{document['commit']}.json"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    logger.info(f"Results written to {output_path}")
+
+    print_matrix(configurations)
+    return 0 if all("error" not in c["results"] for c in configurations) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
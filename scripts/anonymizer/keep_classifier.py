@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Local KEEP/REMOVE classifier distilled from past LLM verdicts (optional,
+requires scikit-learn).
+
+Training data:
+  - state/ai_verdicts.csv (never committed): every MANTIENI SI/NO returned
+    by the LLM in Phase 3, with the Description after Presidio and, for KEEP
+    rows, the LLM corrections. Appended by each presidio.py run; the CI
+    workflow carries it across runs in its private Actions cache
+  - data/anonymized/case_anonymized_YYYY_MM_DD.csv: rows kept by past runs
+    (label KEEP), for the history before the verdict log existed; days moved
+    to the snapshot store (snapshot_store.py) are read from there
+
+The model is TF-IDF (word 1-2 grams + character 3-5 grams) with a logistic
+regression. presidio.py --keep-classifier decides locally the rows whose
+KEEP probability is above the threshold (or below 1 - threshold) and sends
+only the others to the LLM.
+
+Usage:
+  python keep_classifier.py train                 # Train and save the model
+  python keep_classifier.py report                # Held-out agreement and LLM calls saved
+  python keep_classifier.py report --thresholds 0.8 0.9 0.95
+"""
+
+import argparse
+import csv
+import hashlib
+import logging
+import pickle
+import random
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+try:
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import FeatureUnion, Pipeline
+except ImportError:  # optional dependency
+    LogisticRegression = None
+
+from snapshot_store import daily_sources, open_daily_csv
+
+logger = logging.getLogger(__name__)
+
+SCRIPT_DIR = Path(__file__).parent
+OUTPUT_DIR = SCRIPT_DIR.parent.parent / "data" / "anonymized"
+# Kept out of data/anonymized/: REMOVE rows are not published, and their
+# Description has not been through the LLM PII pass
+VERDICT_LOG_FILE = SCRIPT_DIR / "state" / "ai_verdicts.csv"
+MODEL_FILE = SCRIPT_DIR / "state" / "keep_classifier.pkl"
+DEFAULT_THRESHOLD = 0.9
+DEFAULT_REPORT_THRESHOLDS = [0.7, 0.8, 0.9, 0.95]
+HOLDOUT_SHARE = 0.2
+
+VERDICT_FIELDNAMES = ["date", "Id", "source", "keep", "keep_probability", "Description"]
+
+
+def classifier_available() -> bool:
+    return LogisticRegression is not None
+
+
+def append_verdicts(path: Path, verdicts: list[dict]) -> None:
+    """Append verdict rows (VERDICT_FIELDNAMES) to the verdict log."""
+    if not verdicts:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    file_exists = path.exists()
+    with open(path, "a", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=VERDICT_FIELDNAMES)
+        if not file_exists:
+            writer.writeheader()
+        writer.writerows(verdicts)
+
+
+def verdict_row(case_id: str, description: str, keep: bool, source: str,
+                keep_probability: Optional[float] = None) -> dict:
+    """One verdict log row; source is "llm" or "local"."""
+    return {
+        "date": datetime.now().strftime("%Y-%m-%d"),
+        "Id": case_id,
+        "source": source,
+        "keep": int(keep),
+        "keep_probability": "" if keep_probability is None else f"{keep_probability:.4f}",
+        "Description": description,
+    }
+
+
+def load_training_data(
+    verdict_log: Path = VERDICT_LOG_FILE,
+    output_dir: Path = OUTPUT_DIR,
+) -> tuple[list[str], list[int]]:
+    """
+    Return (descriptions, labels) with label 1 = KEEP, one example per Id.
+    LLM verdicts win over kept rows of the daily outputs; local decisions are
+    not used (the model would learn from itself).
+    """
+    examples: dict[str, tuple[str, int]] = {}
+    for path in daily_sources(output_dir):
+        with open_daily_csv(path, newline="") as f:
+            for row in csv.DictReader(f):
+                if row.get("Id") and row.get("Description"):
+                    examples[row["Id"]] = (row["Description"], 1)
+    if verdict_log.exists():
+        with open(verdict_log, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                if row.get("source") == "llm" and row.get("Id") and row.get("Description"):
+                    examples[row["Id"]] = (row["Description"], int(row["keep"]))
+    texts = [text for text, _ in examples.values()]
+    labels = [label for _, label in examples.values()]
+    return texts, labels
+
+
+class KeepClassifier:
+    """TF-IDF + logistic regression estimate of P(KEEP) for a Description."""
+
+    def __init__(self, pipeline, version: str = ""):
+        self.pipeline = pipeline
+        self.version = version
+
+    @classmethod
+    def train(cls, texts: list[str], labels: list[int]) -> "KeepClassifier":
+        if not classifier_available():
+            raise RuntimeError("scikit-learn is not installed (pip install scikit-learn)")
+        if len(set(labels)) < 2:
+            raise ValueError(
+                "Training data has a single class: run the pipeline with the LLM until "
+                f"{VERDICT_LOG_FILE.name} has REMOVE verdicts too"
+            )
+        pipeline = Pipeline([
+            ("features", FeatureUnion([
+                ("words", TfidfVectorizer(ngram_range=(1, 2), min_df=2, sublinear_tf=True)),
+                ("chars", TfidfVectorizer(analyzer="char_wb", ngram_range=(3, 5), min_df=2,
+                                          sublinear_tf=True, max_features=50000)),
+            ])),
+            ("model", LogisticRegression(max_iter=1000, class_weight="balanced")),
+        ])
+        pipeline.fit(texts, labels)
+        return cls(pipeline)
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self.pipeline, f)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "KeepClassifier":
+        if not classifier_available():
+            raise RuntimeError("scikit-learn is not installed (pip install scikit-learn)")
+        data = path.read_bytes()
+        return cls(pickle.loads(data), hashlib.sha256(data).hexdigest()[:12])
+
+    def keep_probability(self, texts: list[str]) -> list[float]:
+        if not texts:
+            return []
+        keep_column = list(self.pipeline.classes_).index(1)
+        return [float(p[keep_column]) for p in self.pipeline.predict_proba(texts)]
+
+
+def decide(keep_probability: float, threshold: float) -> Optional[bool]:
+    """True/False when the classifier is confident enough, None to ask the LLM."""
+    if keep_probability >= threshold:
+        return True
+    if keep_probability <= 1 - threshold:
+        return False
+    return None
+
+
+def holdout_report(
+    texts: list[str],
+    labels: list[int],
+    thresholds: list[float],
+    batch_size: int = 10,
+    seed: int = 42,
+) -> list[dict]:
+    """
+    Train on (1 - HOLDOUT_SHARE) of the examples and, for each threshold,
+    measure on the rest the share decided locally, the agreement of those
+    decisions with the LLM and the LLM batch calls saved.
+    """
+    order = list(range(len(texts)))
+    random.Random(seed).shuffle(order)
+    split = int(len(order) * (1 - HOLDOUT_SHARE))
+    train_idx, test_idx = order[:split], order[split:]
+    classifier = KeepClassifier.train([texts[i] for i in train_idx], [labels[i] for i in train_idx])
+    probabilities = classifier.keep_probability([texts[i] for i in test_idx])
+    test_labels = [labels[i] for i in test_idx]
+
+    calls_before = -(-len(test_idx) // batch_size)
+    report = []
+    for threshold in thresholds:
+        decided = [
+            (decision, label)
+            for decision, label in ((decide(p, threshold), l) for p, l in zip(probabilities, test_labels))
+            if decision is not None
+        ]
+        agree = sum(int(decision) == label for decision, label in decided)
+        calls_after = -(-(len(test_idx) - len(decided)) // batch_size)
+        report.append({
+            "threshold": threshold,
+            "holdout_rows": len(test_idx),
+            "decided_locally": len(decided),
+            "local_share": round(len(decided) / len(test_idx), 4) if test_idx else 0.0,
+            "agreement": round(agree / len(decided), 4) if decided else None,
+            "local_remove_disagreements": sum(1 for d, l in decided if not d and l == 1),
+            "llm_calls_before": calls_before,
+            "llm_calls_after": calls_after,
+        })
+    return report
+
+
+def print_report(report: list[dict]) -> None:
+    print(f"{'threshold':>9} {'local':>7} {'share':>6} {'agree':>7} {'lost KEEP':>9} {'LLM calls':>13}")
+    for r in report:
+        agreement = f"{r['agreement']:.1%}" if r["agreement"] is not None else "-"
+        print(
+            f"{r['threshold']:>9.2f} {r['decided_locally']:>7} {r['local_share']:>6.1%} {agreement:>7} "
+            f"{r['local_remove_disagreements']:>9} {r['llm_calls_before']:>6} -> {r['llm_calls_after']:<5}"
+        )
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Train/evaluate the local KEEP/REMOVE classifier used by presidio.py --keep-classifier",
+    )
+    parser.add_argument("command", choices=["train", "report"])
+    parser.add_argument("--verdicts", type=Path, default=VERDICT_LOG_FILE,
+                        help=f"LLM verdict log (default: {VERDICT_LOG_FILE})")
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR,
+                        help=f"Directory of the daily outputs (default: {OUTPUT_DIR})")
+    parser.add_argument("--model", type=Path, default=MODEL_FILE,
+                        help=f"Model file (default: {MODEL_FILE})")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=DEFAULT_REPORT_THRESHOLDS,
+                        help="Confidence thresholds for the report (default: 0.7 0.8 0.9 0.95)")
+    return parser.parse_args()
+
+
+def main() -> int:
+    """Main entry point."""
+    args = parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    if not classifier_available():
+        logger.error("scikit-learn is not installed (pip install scikit-learn)")
+        return 1
+
+    texts, labels = load_training_data(args.verdicts, args.output_dir)
+    logger.info(f"Training examples: {len(texts)} ({sum(labels)} KEEP, {len(labels) - sum(labels)} REMOVE)")
+    try:
+        if args.command == "train":
+            classifier = KeepClassifier.train(texts, labels)
+            classifier.save(args.model)
+            logger.info(f"Model written to {args.model}")
+        print_report(holdout_report(texts, labels, args.thresholds))
+    except ValueError as e:
+        logger.error(str(e))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
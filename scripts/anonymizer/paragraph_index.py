@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Id -> (byte offset, length) index and memory-mapped reader for the paragraph
+files written by csv_to_paragraphs.py (output_case.txt).
+
+Paragraphs are "col: value" lines closed by a separator line ("==="). One
+scan records, for every paragraph with an "Id: " line, its byte range and
+CaseNumber in a sidecar file (<file>.idx). The reader memory-maps the text
+file and decodes only the paragraph asked for.
+
+When paragraphs are appended to the file (same hash of the bytes up to the
+last indexed separator), only the appended part is scanned; any other change
+rebuilds the index. A later paragraph with the same Id replaces the earlier one.
+
+Usage:
+  python paragraph_index.py data/anonymized/output_case.txt 5007Q00000LXyURQA1
+  python paragraph_index.py data/anonymized/output_case.txt 01121355 --separator ===
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import sys
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bumped when the sidecar layout changes
+INDEX_VERSION = 2
+
+DEFAULT_SEPARATOR = "==="
+HASH_CHUNK_BYTES = 1 << 20
+
+
+def scan_paragraphs(
+    f: BinaryIO,
+    start: int,
+    separator: str = DEFAULT_SEPARATOR,
+) -> tuple[list[tuple[str, str, int, int]], int]:
+    """
+    Scan a paragraph file opened in binary mode from byte `start`.
+    Returns (entries, scanned_to): entries as (Id, CaseNumber, offset, length)
+    of the paragraph text without its separator line, scanned_to the end of
+    the last separator line (a trailing unterminated paragraph is not indexed).
+    """
+    sep = separator.encode("utf-8")
+    entries = []
+    f.seek(start)
+    pos = block_start = scanned_to = start
+    case_id = case_number = None
+    for line in f:
+        line_start = pos
+        pos += len(line)
+        if line.rstrip(b"\r\n") == sep:
+            if case_id:
+                # Without the newline that precedes the separator
+                entries.append((case_id, case_number or "", block_start, max(0, line_start - 1 - block_start)))
+            block_start = scanned_to = pos
+            case_id = case_number = None
+        elif case_id is None and line.startswith(b"Id: "):
+            case_id = line[4:].strip().decode("utf-8")
+        elif case_number is None and line.startswith(b"CaseNumber: "):
+            case_number = line[12:].strip().decode("utf-8")
+    return entries, scanned_to
+
+
+def _hash_range(hasher, f: BinaryIO, start: int, end: int):
+    """Feed bytes [start, end) of f to hasher and return it."""
+    f.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = f.read(min(HASH_CHUNK_BYTES, remaining))
+        if not chunk:
+            break
+        hasher.update(chunk)
+        remaining -= len(chunk)
+    return hasher
+
+
+class ParagraphIndex:
+    """Byte ranges of the paragraphs of a file by Id, persisted in a sidecar file."""
+
+    def __init__(self, txt_path: Path, separator: str = DEFAULT_SEPARATOR):
+        self.txt_path = txt_path
+        self.separator = separator
+        self.entries: dict[str, tuple[int, int]] = {}
+        self.case_numbers: dict[str, str] = {}
+        self.size = 0
+        self.mtime_ns = 0
+        self.scanned_to = 0
+        self.prefix_hash = ""
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def is_current(self) -> bool:
+        st = self.txt_path.stat()
+        return st.st_size == self.size and st.st_mtime_ns == self.mtime_ns
+
+    def update(self) -> int:
+        """
+        Bring the index up to date with the file: scan only the appended bytes
+        when the indexed part hashes as before, everything otherwise.
+        Returns the number of paragraphs scanned.
+        """
+        st = self.txt_path.stat()
+        with open(self.txt_path, "rb") as f:
+            hasher = hashlib.blake2b(digest_size=16)
+            appended = (
+                self.scanned_to
+                and st.st_size >= self.scanned_to
+                and _hash_range(hasher, f, 0, self.scanned_to).hexdigest() == self.prefix_hash
+            )
+            if not appended:
+                self.entries.clear()
+                self.case_numbers.clear()
+                self.scanned_to = 0
+                hasher = hashlib.blake2b(digest_size=16)
+            start = self.scanned_to
+            entries, self.scanned_to = scan_paragraphs(f, start, self.separator)
+            self.prefix_hash = _hash_range(hasher, f, start, self.scanned_to).hexdigest()
+        for case_id, case_number, offset, length in entries:
+            self.entries[case_id] = (offset, length)
+            if case_number:
+                self.case_numbers[case_number] = case_id
+        self.size = st.st_size
+        self.mtime_ns = st.st_mtime_ns
+        return len(entries)
+
+    def save(self, index_path: Path) -> None:
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        case_numbers = {case_id: number for number, case_id in self.case_numbers.items()}
+        meta = {
+            "version": INDEX_VERSION,
+            "txt": str(self.txt_path.resolve()),
+            "separator": self.separator,
+            "size": self.size,
+            "mtime_ns": self.mtime_ns,
+            "scanned_to": self.scanned_to,
+            "prefix_hash": self.prefix_hash,
+            "paragraphs": len(self.entries),
+        }
+        tmp_path = index_path.with_suffix(index_path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(meta) + "\n")
+            for case_id, (offset, length) in self.entries.items():
+                f.write(f"{case_id}\t{case_numbers.get(case_id, '')}\t{offset}\t{length}\n")
+        tmp_path.replace(index_path)
+
+    @classmethod
+    def load(cls, txt_path: Path, index_path: Path, separator: str = DEFAULT_SEPARATOR) -> Optional["ParagraphIndex"]:
+        """Load the sidecar index (possibly stale), or None if missing or unreadable."""
+        index = cls(txt_path, separator)
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                meta = json.loads(f.readline())
+                for line in f:
+                    case_id, case_number, offset, length = line.rstrip("\n").split("\t")
+                    index.entries[case_id] = (int(offset), int(length))
+                    if case_number:
+                        index.case_numbers[case_number] = case_id
+        except (OSError, ValueError):
+            return None
+        if (
+            meta.get("version") != INDEX_VERSION
+            or meta.get("separator") != separator
+            or len(index.entries) != meta.get("paragraphs")
+        ):
+            return None
+        index.size = meta["size"]
+        index.mtime_ns = meta["mtime_ns"]
+        index.scanned_to = meta["scanned_to"]
+        index.prefix_hash = meta["prefix_hash"]
+        return index
+
+    @classmethod
+    def open(
+        cls,
+        txt_path: Path,
+        index_path: Optional[Path] = None,
+        separator: str = DEFAULT_SEPARATOR,
+        rebuild: bool = False,
+    ) -> "ParagraphIndex":
+        """
+        Load the index of txt_path, updating or building it if needed
+        (rebuild: ignore the sidecar file, e.g. after rewriting txt_path).
+        """
+        index_path = index_path or default_index_path(txt_path)
+        index = None if rebuild else cls.load(txt_path, index_path, separator)
+        if index is None or not index.is_current():
+            built = index is None
+            index = index or cls(txt_path, separator)
+            scanned = index.update()
+            index.save(index_path)
+            logger.info(
+                f"{'Indexed' if built else 'Updated index with'} {scanned} paragraphs of {txt_path} "
+                f"({len(index)} Ids) in {index_path}"
+            )
+        return index
+
+
+def default_index_path(txt_path: Path) -> Path:
+    return txt_path.with_name(txt_path.name + ".idx")
+
+
+class ParagraphReader:
+    """Memory-mapped lookup of paragraphs by Id or CaseNumber."""
+
+    def __init__(
+        self,
+        txt_path: Path,
+        index_path: Optional[Path] = None,
+        separator: str = DEFAULT_SEPARATOR,
+        encoding: str = "utf-8",
+    ):
+        self.txt_path = txt_path
+        self.encoding = encoding
+        self.index = ParagraphIndex.open(txt_path, index_path, separator)
+        self._file = open(txt_path, "rb")
+        self._mm = (
+            mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self.index.size else b""
+        )
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, case_id: str) -> bool:
+        return case_id in self.index.entries
+
+    def __enter__(self) -> "ParagraphReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def ids(self) -> Iterator[str]:
+        return iter(self.index.entries)
+
+    def get(self, case_id: str) -> Optional[str]:
+        """Paragraph of a case Id (without the separator line), or None."""
+        entry = self.index.entries.get(case_id)
+        if entry is None:
+            return None
+        offset, length = entry
+        return self._mm[offset: offset + length].decode(self.encoding)
+
+    def get_by_case_number(self, case_number: str) -> Optional[str]:
+        """Paragraph of a CaseNumber, or None."""
+        case_id = self.index.case_numbers.get(case_number)
+        return self.get(case_id) if case_id is not None else None
+
+    def close(self) -> None:
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Print the paragraphs of the given case Ids/CaseNumbers (indexing the file if needed)",
+    )
+    parser.add_argument("txt", type=Path, help="Paragraph file (e.g. data/anonymized/output_case.txt)")
+    parser.add_argument("keys", nargs="+", metavar="ID_OR_CASENUMBER")
+    parser.add_argument("--separator", "-s", default=DEFAULT_SEPARATOR,
+                        help=f"Paragraph separator (default: {DEFAULT_SEPARATOR!r})")
+    return parser.parse_args()
+
+
+def main() -> int:
+    """Main entry point."""
+    args = parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    if not args.txt.exists():
+        logger.error(f"File not found: {args.txt}")
+        return 1
+    missing = 0
+    with ParagraphReader(args.txt, separator=args.separator) as reader:
+        for key in args.keys:
+            paragraph = reader.get(key)
+            if paragraph is None:
+                paragraph = reader.get_by_case_number(key)
+            if paragraph is None:
+                logger.warning(f"Not found: {key}")
+                missing += 1
+                continue
+            print(paragraph)
+            print(args.separator)
+    return 1 if missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
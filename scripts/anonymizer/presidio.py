@@ -6,25 +6,61 @@ Replaces PII with tags, filters noisy rows, and uses AI to validate useful conte
 Usage:
     python presidio.py              # Process all rows
     python presidio.py --test 50    # Process only first 50 rows (test mode)
+    python presidio.py --resume     # Continue an interrupted run from its checkpoint
+    python presidio.py --span-store   # Also save the analyzer spans of every cell
+    python presidio.py --reanonymize  # Rebuild output from stored spans (no NLP models)
+    python presidio.py --time-budget 50m  # Newest cases first, stop in time to write a partial output
+    python presidio.py --pseudonyms case  # [FAKE_PERSON_1], [FAKE_PERSON_2]... per case instead of [FAKE_PERSON]
+    python presidio.py --shard 2/4  # Process only the cases of shard 2 of 4 (by Id hash)
+    python presidio.py merge        # Combine the shard outputs and append to output_case.csv
 """
 
 import argparse
 import csv
+import hashlib
+import json
 import logging
 import os
 import re
 import sys
+import time
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
 from dotenv import load_dotenv
 from openai import OpenAI
-from presidio_analyzer import AnalyzerEngine, RecognizerRegistry, Pattern, PatternRecognizer
+from presidio_analyzer import AnalyzerEngine, BatchAnalyzerEngine, RecognizerRegistry, Pattern, PatternRecognizer
 from presidio_analyzer.nlp_engine import NlpEngineProvider
 from presidio_anonymizer import AnonymizerEngine
 from presidio_anonymizer.entities import OperatorConfig
 
+from arrow_ingest import arrow_available, read_case_values
+from case_index import CaseCsvReader
+from case_record import CaseSchema
+from checkpoint import RunCheckpoint, input_signature
+from deadline import (
+    DEFAULT_MARGIN_S, RunDeadline, load_pending_ids, parse_duration, priority_order, save_pending_ids,
+)
+from keep_classifier import (
+    DEFAULT_THRESHOLD as KEEP_CLASSIFIER_THRESHOLD,
+    MODEL_FILE as KEEP_CLASSIFIER_FILE,
+    VERDICT_LOG_FILE,
+    KeepClassifier,
+    append_verdicts,
+    classifier_available,
+    decide,
+    verdict_row,
+)
+from sharding import (
+    check_complete, find_partials, input_order, merge_partials, parse_shard, shard_of, shard_suffix,
+)
+from pseudonyms import PSEUDONYM_SCOPES, PSEUDONYM_TAG_REGEX, PseudonymVault, hmac_key_from_env
+from span_store import SpanStore, SpanStoreMissError
+from text_chunks import CHUNK_MAX_CHARS, CHUNK_OVERLAP_CHARS, analyze_chunked
+from token_usage import TokenLedger, estimate_tokens
+
 # Load environment variables
 load_dotenv()
 
@@ -40,6 +76,28 @@ logger = logging.getLogger(__name__)
 SCRIPT_DIR = Path(__file__).parent
 INPUT_FILE = SCRIPT_DIR / "input" / "case.csv"
 OUTPUT_DIR = SCRIPT_DIR.parent.parent / "data" / "anonymized"
+SHARDS_DIR = OUTPUT_DIR / "shards"
+STATE_FILE = SCRIPT_DIR / "state" / "checkpoint.sqlite"
+SPAN_STORE_FILE = SCRIPT_DIR / "state" / "spans.sqlite"
+CASE_INDEX_FILE = SCRIPT_DIR / "state" / "case.csv.idx"
+# Committed with the outputs, so the next (CI) run finds it
+PENDING_IDS_FILE = OUTPUT_DIR / "pending_ids.txt"
+THROUGHPUT_FILE = SCRIPT_DIR / "state" / "throughput.json"
+
+# spaCy models used by the Presidio NLP engine; the Italian one is selectable
+# (--nlp-model, env PRESIDIO_NLP_MODEL), see evaluate_models.py for the trade-offs
+NLP_MODEL = os.getenv("PRESIDIO_NLP_MODEL", "it_core_news_lg")
+
+
+def nlp_models(it_model: str = NLP_MODEL) -> list[dict]:
+    """spaCy model configuration of the NLP engine for a given Italian model."""
+    return [
+        {"lang_code": "it", "model_name": it_model},
+        {"lang_code": "en", "model_name": "en_core_web_lg"},
+    ]
+
+
+NLP_MODELS = nlp_models()
 
 # Entity types to detect and anonymize
 ENTITY_TYPES = [
@@ -145,7 +203,14 @@ DENYLIST_FRASI_RISPOSTA = [
 ]
 
 
-def contains_denylist_phrase(text: str) -> Optional[str]:
+# Tags written by the anonymizer (and by the AI phase), e.g. [FAKE_PERSON]
+FAKE_TAG_REGEX = r"\[FAKE_[A-Z_]+\]"
+
+
+def contains_denylist_phrase(
+    text: str,
+    profile: Optional["AnonymizationProfile"] = None,
+) -> Optional[str]:
     """
     Check if text contains any phrase from the denylist.
     Returns the matched phrase if found, None otherwise.
@@ -153,9 +218,10 @@ def contains_denylist_phrase(text: str) -> Optional[str]:
     if not text:
         return None
     
+    profile = profile or DEFAULT_PROFILE
     text_lower = text.lower()
-    for phrase in DENYLIST_FRASI_RISPOSTA:
-        if phrase.lower() in text_lower:
+    for phrase, phrase_lower in profile.denylist:
+        if phrase_lower in text_lower:
             return phrase
     return None
 
@@ -192,11 +258,12 @@ def create_italian_phone_recognizer() -> PatternRecognizer:
 
 # Regex for codice tesoriera (e.g. TU-138-181002 → TU-XXX-XXXXXX)
 CODICE_TESORIERA_REGEX = r"\b([A-Z]{2,3})-\d+-\d{6}\b"
+_CODICE_TESORIERA_PREFIX = re.compile(r"^([A-Z]{2,3})")
 
 
 def _redact_codice_tesoriera(matched_text: str) -> str:
     """Replace codice tesoriera with PREFIX-XXX-XXXXXX (preserves 2–3 letter prefix)."""
-    m = re.match(r"^([A-Z]{2,3})", matched_text)
+    m = _CODICE_TESORIERA_PREFIX.match(matched_text)
     prefix = m.group(1) if m else "XX"
     return f"{prefix}-XXX-XXXXXX"
 
@@ -215,17 +282,106 @@ def create_codice_tesoriera_recognizer() -> PatternRecognizer:
     )
 
 
-def setup_analyzer() -> AnalyzerEngine:
+@dataclass(frozen=True)
+class AnonymizationProfile:
+    """
+    Anonymization configuration built once at startup and passed through the pipeline.
+
+    Holds the entity list, the Presidio operator map, the compiled tag pattern and
+    the Phase 2 settings. `version` is a short hash of all of them, so outputs
+    and caches can record which configuration produced them; `analysis_version`
+    only covers what changes the analyzer spans (entities, models, recognizer
+    patterns), so stored spans survive edits to tags, operators and filters.
+    `pseudonyms` is the PseudonymVault scope when entities get per-value
+    surrogate tags ([FAKE_PERSON_1]) instead of the generic ones.
+    """
+
+    entity_types: tuple[str, ...]
+    tag_mapping: dict[str, str]
+    operators: dict[str, OperatorConfig]
+    tag_pattern: re.Pattern
+    tag_threshold: float
+    denylist: tuple[tuple[str, str], ...]  # (phrase, phrase.lower())
+    version: str
+    analysis_version: str
+    pseudonyms: Optional[str] = None
+
+
+def build_anonymization_profile(
+    entity_types: list[str] = ENTITY_TYPES,
+    tag_mapping: dict[str, str] = TAG_MAPPING,
+    tag_threshold: float = TAG_THRESHOLD,
+    denylist: list[str] = DENYLIST_FRASI_RISPOSTA,
+    nlp_model: str = NLP_MODEL,
+    pseudonyms: Optional[str] = None,
+    pseudonym_key_id: str = "",
+) -> AnonymizationProfile:
+    """
+    Build the operator map and compiled patterns for the given configuration.
+    With pseudonyms (a PseudonymVault scope, pseudonym_key_id its key_id), the
+    tag pattern also matches surrogate tags and the version covers the scope/key.
+    """
+    operators = {}
+    for entity_type in entity_types:
+        if entity_type == "CODICE_TESORIERA":
+            operators[entity_type] = OperatorConfig(
+                "custom", {"lambda": _redact_codice_tesoriera}
+            )
+        else:
+            tag = tag_mapping.get(entity_type, f"FAKE_{entity_type}")
+            operators[entity_type] = OperatorConfig("replace", {"new_value": f"[{tag}]"})
+    
+    fingerprint = json.dumps(
+        {
+            "entity_types": list(entity_types),
+            "tag_mapping": tag_mapping,
+            "tag_threshold": tag_threshold,
+            "codice_tesoriera_regex": CODICE_TESORIERA_REGEX,
+            "fake_tag_regex": FAKE_TAG_REGEX,
+            "denylist": list(denylist),
+            **({"pseudonyms": [pseudonyms, pseudonym_key_id]} if pseudonyms else {}),
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    version = hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:12]
+    
+    analysis_fingerprint = json.dumps(
+        {
+            "entity_types": list(entity_types),
+            "nlp_models": nlp_models(nlp_model),
+            "phone_patterns": [p.regex for p in create_italian_phone_recognizer().patterns],
+            "codice_tesoriera_regex": CODICE_TESORIERA_REGEX,
+            "chunking": [CHUNK_MAX_CHARS, CHUNK_OVERLAP_CHARS],
+        },
+        sort_keys=True,
+    )
+    analysis_version = hashlib.sha256(analysis_fingerprint.encode("utf-8")).hexdigest()[:12]
+    
+    return AnonymizationProfile(
+        entity_types=tuple(entity_types),
+        tag_mapping=dict(tag_mapping),
+        operators=operators,
+        tag_pattern=re.compile(PSEUDONYM_TAG_REGEX if pseudonyms else FAKE_TAG_REGEX),
+        tag_threshold=tag_threshold,
+        denylist=tuple((phrase, phrase.lower()) for phrase in denylist),
+        version=version,
+        analysis_version=analysis_version,
+        pseudonyms=pseudonyms,
+    )
+
+
+DEFAULT_PROFILE = build_anonymization_profile()
+
+
+def setup_analyzer(nlp_model: str = NLP_MODEL) -> AnalyzerEngine:
     """Initialize Presidio analyzer with Italian language support."""
-    logger.info("Setting up Presidio analyzer with Italian NLP...")
+    logger.info(f"Setting up Presidio analyzer with Italian NLP ({nlp_model})...")
     
     # Configure NLP engine for Italian
     configuration = {
         "nlp_engine_name": "spacy",
-        "models": [
-            {"lang_code": "it", "model_name": "it_core_news_lg"},
-            {"lang_code": "en", "model_name": "en_core_web_lg"},
-        ],
+        "models": nlp_models(nlp_model),
     }
     
     provider = NlpEngineProvider(nlp_configuration=configuration)
@@ -269,41 +425,60 @@ def setup_anonymizer() -> AnonymizerEngine:
 
 def anonymize_text(
     text: str,
-    analyzer: AnalyzerEngine,
+    analyzer: Optional[AnalyzerEngine],
     anonymizer: AnonymizerEngine,
+    profile: Optional[AnonymizationProfile] = None,
+    span_store: Optional[SpanStore] = None,
+    vault: Optional[PseudonymVault] = None,
+    case_id: str = "",
 ) -> tuple[str, int, int]:
     """
     Anonymize text using Presidio, replacing PII with tags.
     
+    With a span store, analyzer results are read from it when present and
+    saved to it otherwise. With analyzer=None only stored spans are used
+    (SpanStoreMissError if the cell was never analyzed). With a vault, each
+    distinct value gets its surrogate tag within case_id (see pseudonyms.py).
+    
     Returns:
         tuple: (anonymized_text, num_tags, original_word_count)
     """
     if not text or not text.strip():
         return text, 0, 0
     
-    # Analyze text for PII entities
-    results = analyzer.analyze(
-        text=text,
-        entities=ENTITY_TYPES,
-        language="it",
-    )
+    profile = profile or DEFAULT_PROFILE
+    
+    # Analyze text for PII entities (or reuse the stored spans)
+    results = span_store.get(text) if span_store is not None else None
+    if results is None:
+        if analyzer is None:
+            raise SpanStoreMissError(text[:50])
+        # Long cells (email threads) are analyzed in overlapping windows
+        results = analyze_chunked(text, analyzer, list(profile.entity_types), language="it")
+        if span_store is not None:
+            span_store.put(text, results)
     
+    return _apply_operators(text, results, anonymizer, profile, vault, case_id)
+
+
+def _apply_operators(
+    text: str,
+    results: list,
+    anonymizer: AnonymizerEngine,
+    profile: AnonymizationProfile,
+    vault: Optional[PseudonymVault] = None,
+    case_id: str = "",
+) -> tuple[str, int, int]:
+    """Replace the analyzer results in text with the profile operators."""
     # Count original words (approximate)
     original_word_count = len(text.split())
     
     if not results:
         return text, 0, original_word_count
     
-    # Create operator configs for each entity type
-    operators = {}
-    for entity_type in ENTITY_TYPES:
-        if entity_type == "CODICE_TESORIERA":
-            operators[entity_type] = OperatorConfig(
-                "custom", {"lambda": _redact_codice_tesoriera}
-            )
-        else:
-            tag = TAG_MAPPING.get(entity_type, f"FAKE_{entity_type}")
-            operators[entity_type] = OperatorConfig("replace", {"new_value": f"[{tag}]"})
+    operators = profile.operators
+    if vault is not None:
+        operators = vault.prepare(case_id, text, results, profile.operators)
     
     # Anonymize
     anonymized_result = anonymizer.anonymize(
@@ -315,14 +490,69 @@ def anonymize_text(
     return anonymized_result.text, len(results), original_word_count
 
 
-def calculate_tag_percentage(text: str) -> float:
+def anonymize_texts(
+    texts: list[str],
+    analyzer: AnalyzerEngine,
+    anonymizer: AnonymizerEngine,
+    profile: Optional[AnonymizationProfile] = None,
+    span_store: Optional[SpanStore] = None,
+    vault: Optional[PseudonymVault] = None,
+    case_ids: Optional[list[str]] = None,
+) -> list[tuple[str, int, int]]:
+    """
+    Same as anonymize_text for a list of texts, with the NLP pipeline run
+    once over the whole list (spaCy nlp.pipe) instead of once per text.
+    Texts longer than CHUNK_MAX_CHARS are analyzed by window, as in anonymize_text.
+    Stored spans are reused and new ones saved as in anonymize_text; with a
+    vault, text i belongs to case case_ids[i] and the operators run in list
+    order, so a case's texts given in column order get the surrogates of the
+    batch pipeline (releasing the cases is left to the caller).
+    """
+    profile = profile or DEFAULT_PROFILE
+    all_results: list[Optional[list]] = [None] * len(texts)
+    pending = []
+    for i, text in enumerate(texts):
+        if not text or not text.strip():
+            continue
+        results = span_store.get(text) if span_store is not None else None
+        if results is None and len(text) > CHUNK_MAX_CHARS:
+            results = analyze_chunked(text, analyzer, list(profile.entity_types), language="it")
+            if span_store is not None:
+                span_store.put(text, results)
+        if results is None:
+            pending.append(i)
+        all_results[i] = results
+    if pending:
+        batch_results = BatchAnalyzerEngine(analyzer_engine=analyzer).analyze_iterator(
+            [texts[i] for i in pending],
+            language="it",
+            batch_size=len(pending),
+            entities=list(profile.entity_types),
+        )
+        for i, results in zip(pending, batch_results):
+            all_results[i] = results
+            if span_store is not None:
+                span_store.put(texts[i], results)
+    outputs = []
+    for i, (text, results) in enumerate(zip(texts, all_results)):
+        if results is None:
+            outputs.append((text, 0, 0))
+        else:
+            case_id = case_ids[i] if case_ids else ""
+            outputs.append(_apply_operators(text, results, anonymizer, profile, vault, case_id))
+    return outputs
+
+
+def calculate_tag_percentage(
+    text: str,
+    profile: Optional[AnonymizationProfile] = None,
+) -> float:
     """Calculate the percentage of text that consists of FAKE_ tags."""
     if not text or not text.strip():
         return 0.0
     
     # Find all tags
-    tag_pattern = r"\[FAKE_[A-Z_]+\]"
-    tags = re.findall(tag_pattern, text)
+    tags = (profile or DEFAULT_PROFILE).tag_pattern.findall(text)
     
     # Calculate approximate percentage based on word count
     words = text.split()
@@ -336,8 +566,8 @@ def calculate_tag_percentage(text: str) -> float:
     return tag_word_count / total_words if total_words > 0 else 0.0
 
 
-def setup_ai_client() -> Optional[OpenAI]:
-    """Setup OpenAI client for OVH AI Endpoints."""
+def setup_ai_client(max_retries: Optional[int] = None) -> Optional[OpenAI]:
+    """Setup OpenAI client for OVH AI Endpoints (max_retries: client default if None)."""
     api_url = os.getenv("OVH_API_URL")
     api_key = os.getenv("OVH_API_KEY")
     
@@ -350,6 +580,7 @@ def setup_ai_client() -> Optional[OpenAI]:
     client = OpenAI(
         base_url=api_url,
         api_key=api_key,
+        **({"max_retries": max_retries} if max_retries is not None else {}),
     )
     
     logger.info("OVH AI client initialized successfully")
@@ -357,57 +588,38 @@ def setup_ai_client() -> Optional[OpenAI]:
 
 
 AI_BATCH_SIZE = 10  # Number of rows to process in each AI batch
+AI_MAX_TOKENS = 8000  # max_tokens of each AI batch request
+AI_JSON_TOKENS_PER_ROW = 30  # Estimated completion tokens per row in json format
+AI_RESULT_PATTERN = re.compile(
+    r"\[RISULTATO\s*(\d+)\](.*?)\[/RISULTATO\s*\d+\]", re.DOTALL | re.IGNORECASE
+)
+AI_MANTIENI_PATTERN = re.compile(r"^\s*MANTIENI:(.*)$", re.MULTILINE | re.IGNORECASE)
+AI_TESTO_PATTERN = re.compile(r"^\s*TESTO:(.*)", re.MULTILINE | re.DOTALL | re.IGNORECASE)
 
+# "json": the model returns only verdicts + {original substring -> tag} replacements,
+# applied locally. "text": legacy format, the model echoes the corrected text.
+# Text stays the default until JSON mode (response_format=json_object) is proven on
+# the OVH endpoint; a run in json format falls back to text if the endpoint rejects it.
+AI_RESPONSE_FORMAT = os.getenv("OVH_RESPONSE_FORMAT", "text")
 
-def ai_batch_anonymize_and_evaluate(
-    client: OpenAI, 
-    rows_data: list[tuple[int, str]]
-) -> dict[int, tuple[Optional[str], bool]]:
-    """
-    Process multiple rows in a single AI call for efficiency.
-    
-    Args:
-        client: OpenAI client
-        rows_data: List of (row_index, text) tuples
-    
-    Returns:
-        dict mapping row_index to (anonymized_text or None, is_useful)
-    """
-    results = {}
-    
-    # Filter out empty/short texts
-    valid_rows = []
-    for row_idx, text in rows_data:
-        if not text or not text.strip():
-            logger.info(f"  Row {row_idx}: Empty text, removing")
-            results[row_idx] = (None, False)
-        elif len(text.strip()) < 20:
-            logger.info(f"  Row {row_idx}: Text too short, removing")
-            results[row_idx] = (None, False)
-        else:
-            valid_rows.append((row_idx, text))
-    
-    if not valid_rows:
-        return results
-    
-    # Build batch prompt
-    batch_content = []
-    for i, (row_idx, text) in enumerate(valid_rows, start=1):
-        # Truncate each text to avoid token limits
-        truncated = text[:2000] if len(text) > 2000 else text
-        batch_content.append(f"[RIGA {row_idx}]\n{truncated}\n[/RIGA {row_idx}]")
-    
-    batch_text = "\n\n".join(batch_content)
-    
-    try:
-        model = os.getenv("OVH_MODEL", "Meta-Llama-3_3-70B-Instruct")
-        
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": """Sei un assistente esperto in anonimizzazione e valutazione di testi per una knowledge base di assistenza PA (Pubblica Amministrazione) italiana, legato alle misure PNRR.
+# Columns sent to the AI phase. Description is always sent (it drives the verdict);
+# in json format the residual-risk columns are added to the same request when
+# Presidio left capitalized-name candidates in them.
+AI_DESCRIPTION_COLUMN = "Description"
+AI_RESIDUAL_RISK_COLUMNS = [
+    "Risoluzione__c",
+    "Commenti_Ente__c",
+    "Ulteriori_informazioni_a_supporto__c",
+]
+AI_MAX_CHARS_PER_COLUMN = 2000
+# Shortest AI-proposed original replaced (shorter ones are fragments or initials)
+AI_MIN_REPLACEMENT_CHARS = 3
+# Two or more consecutive capitalized words (e.g. "Maria Giovanna", "Gentile Paolo")
+NAME_CANDIDATE_PATTERN = re.compile(
+    r"\b[A-ZÀÈÉÌÒÙ][a-zàèéìòù']+(?:[ \t]+[A-ZÀÈÉÌÒÙ][a-zàèéìòù']+)+"
+)
+
+AI_SYSTEM_PROMPT = """Sei un assistente esperto in anonimizzazione e valutazione di testi per una knowledge base di assistenza PA (Pubblica Amministrazione) italiana, legato alle misure PNRR.
 
 HAI DUE COMPITI PER OGNI RIGA:
 
@@ -432,7 +644,10 @@ MANTIENI: NO (escludi) se è un case puntuale: la risoluzione è soprattutto con
 
 MANTIENI: SI (mantieni) se la risposta contiene contenuto riutilizzabile: procedure chiare, eccezioni, criteri, passi dettagliati o spiegazioni di policy/requisiti che valgono in generale.
 
-## FORMATO RISPOSTA (per ogni riga)
+"""
+
+AI_RESPONSE_FORMATS = {
+    "text": """## FORMATO RISPOSTA (per ogni riga)
 Rispondi così per OGNI riga, una dopo l'altra:
 
 [RISULTATO n]
@@ -440,61 +655,334 @@ MANTIENI: SI oppure NO
 TESTO: <testo corretto con sostituzioni, oppure INVARIATO se non servono modifiche>
 [/RISULTATO n]
 
-Dove n è il numero della riga originale."""
-                },
-                {
-                    "role": "user",
-                    "content": f"Analizza queste {len(valid_rows)} righe:\n\n{batch_text}"
-                }
-            ],
-            max_tokens=8000,
+Dove n è il numero della riga originale.""",
+    "json": """## FORMATO RISPOSTA (JSON)
+Rispondi SOLO con un oggetto JSON, senza altro testo, con un elemento per OGNI riga:
+
+{"risultati": [{"riga": n, "mantieni": true, "sostituzioni": [{"originale": "Mario Rossi", "tag": "FAKE_PERSON"}]}]}
+
+- "riga": il numero della riga originale
+- "mantieni": true (MANTIENI: SI) oppure false (MANTIENI: NO)
+- "sostituzioni": solo i dati personali NON ancora anonimizzati; lista vuota se non servono modifiche
+- "campo": se la riga contiene più campi ([CAMPO nome] ... [/CAMPO nome]), il nome del campo in cui si trova "originale"
+- "originale": sottostringa ESATTA del testo della riga (stessi caratteri, maiuscole, spazi e punteggiatura)
+- "tag": uno tra FAKE_PERSON, FAKE_EMAIL, FAKE_PHONE, FAKE_CODICE_FISCALE, FAKE_IBAN, FAKE_INDIRIZZO, FAKE_PARTITA_IVA
+
+NON riscrivere il testo delle righe.""",
+}
+
+
+class AIBatchError(Exception):
+    """AI call failed for a whole batch; carries the keep-all fallback results."""
+
+    def __init__(self, message: str, fallback_results: dict[int, tuple[Optional[dict[str, str]], bool]]):
+        super().__init__(message)
+        self.fallback_results = fallback_results
+
+
+def _parse_text_response(answer: str) -> dict[int, tuple[Optional[str], bool]]:
+    """Parse the legacy [RISULTATO n] / MANTIENI / TESTO format (TESTO may span lines)."""
+    parsed_results = {}
+    for match in AI_RESULT_PATTERN.findall(answer):
+        try:
+            result_idx = int(match[0])
+        except ValueError:
+            continue
+        content = match[1].strip()
+        
+        mantieni = AI_MANTIENI_PATTERN.search(content)
+        is_useful = bool(mantieni) and "SI" in mantieni.group(1).upper()
+        
+        anonymized_text = None
+        testo = AI_TESTO_PATTERN.search(content)
+        if testo:
+            text_part = testo.group(1).strip()
+            if text_part.upper() != "INVARIATO" and text_part:
+                anonymized_text = text_part
+        
+        parsed_results[result_idx] = (anonymized_text, is_useful)
+    return parsed_results
+
+
+def _parse_json_response(answer: str) -> dict[int, tuple[list[tuple[Optional[str], str, str]], bool]]:
+    """
+    Parse the JSON format: {"risultati": [{"riga", "mantieni", "sostituzioni"}]}.
+    Returns {row_index: ([(column or None, original, tag), ...], is_useful)};
+    malformed entries are skipped.
+    """
+    # Tolerate ```json fences or text around the object
+    start, end = answer.find("{"), answer.rfind("}")
+    if start < 0 or end < start:
+        return {}
+    try:
+        data = json.loads(answer[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+    
+    entries = data.get("risultati", []) if isinstance(data, dict) else []
+    parsed_results = {}
+    for entry in entries if isinstance(entries, list) else []:
+        try:
+            result_idx = int(entry["riga"])
+            is_useful = entry.get("mantieni") is True or str(entry.get("mantieni")).upper() in ("SI", "TRUE")
+            replacements = [
+                (r.get("campo") and str(r["campo"]), str(r["originale"]), str(r["tag"]))
+                for r in entry.get("sostituzioni") or []
+                if isinstance(r, dict) and "originale" in r and "tag" in r
+            ]
+        except (KeyError, TypeError, ValueError, AttributeError):
+            continue
+        parsed_results[result_idx] = (replacements, is_useful)
+    return parsed_results
+
+
+def apply_ai_replacements(
+    text: str,
+    replacements: list[tuple[str, str]],
+    profile: AnonymizationProfile,
+    row_idx: int,
+) -> tuple[str, int]:
+    """
+    Apply AI-proposed {original substring -> tag} replacements to text.
+    
+    A replacement is applied only if the tag is one of the profile tags, the
+    original has at least AI_MIN_REPLACEMENT_CHARS characters, and it occurs
+    as a whole word outside existing tags; only those occurrences are replaced.
+    Longer substrings are replaced first. Returns (text, replacements_applied).
+    """
+    allowed_tags = set(profile.tag_mapping.values())
+    applied = 0
+    for original, tag in sorted(replacements, key=lambda r: len(r[0]), reverse=True):
+        tag = tag.strip().strip("[]")
+        if tag not in allowed_tags:
+            logger.warning(f"  Row {row_idx}: AI replacement with unknown tag '{tag}' ignored")
+            continue
+        if len(original.strip()) < AI_MIN_REPLACEMENT_CHARS:
+            logger.warning(f"  Row {row_idx}: AI replacement shorter than {AI_MIN_REPLACEMENT_CHARS} chars, ignored")
+            continue
+        pattern = re.compile(rf"(?<!\w){re.escape(original)}(?!\w)")
+        text, count = _sub_outside_tags(pattern, f"[{tag}]", text, profile.tag_pattern)
+        if not count:
+            logger.warning(f"  Row {row_idx}: AI replacement not found as a whole word in text, ignored")
+            continue
+        applied += 1
+    return text, applied
+
+
+def _sub_outside_tags(pattern: re.Pattern, replacement: str, text: str, tag_pattern: re.Pattern) -> tuple[str, int]:
+    """Replace the matches of pattern in the parts of text between tags. Returns (text, count)."""
+    parts = []
+    count = 0
+    pos = 0
+    for tag in [*tag_pattern.finditer(text), None]:
+        end = tag.start() if tag else len(text)
+        segment, n = pattern.subn(lambda _: replacement, text[pos:end])
+        parts.append(segment)
+        count += n
+        if tag:
+            parts.append(tag.group())
+            pos = tag.end()
+    return "".join(parts), count
+
+
+def has_name_candidates(text: str) -> bool:
+    """True if text still contains capitalized words that could be a person name."""
+    return bool(text) and NAME_CANDIDATE_PATTERN.search(text) is not None
+
+
+def ai_columns_for_row(
+    row: dict,
+    description_text: str,
+    response_format: str = AI_RESPONSE_FORMAT,
+) -> dict[str, str]:
+    """
+    Columns of an anonymized row to send to the AI phase: Description, plus (json
+    format only) each residual-risk column that still has name candidates.
+    """
+    columns = {AI_DESCRIPTION_COLUMN: description_text}
+    if response_format == "json":
+        for col in AI_RESIDUAL_RISK_COLUMNS:
+            if has_name_candidates(row.get(col, "")):
+                columns[col] = row[col]
+    return columns
+
+
+def _format_ai_row(row_idx: int, columns: dict[str, str]) -> str:
+    """Format one row for the batch prompt (one [CAMPO] block per column if more than one)."""
+    if len(columns) == 1:
+        text = next(iter(columns.values()))
+        return f"[RIGA {row_idx}]\n{text[:AI_MAX_CHARS_PER_COLUMN]}\n[/RIGA {row_idx}]"
+    fields = "\n".join(
+        f"[CAMPO {col}]\n{text[:AI_MAX_CHARS_PER_COLUMN]}\n[/CAMPO {col}]"
+        for col, text in columns.items()
+    )
+    return f"[RIGA {row_idx}]\n{fields}\n[/RIGA {row_idx}]"
+
+
+def _split_ai_rows(
+    rows_data: list[tuple[int, dict[str, str]]],
+    log: bool = True,
+) -> tuple[list[tuple[int, dict[str, str]]], dict[int, tuple[None, bool]]]:
+    """Split batch rows into rows to send and rows removed for an empty/short Description."""
+    valid_rows = []
+    removed = {}
+    for row_idx, columns in rows_data:
+        text = columns.get(AI_DESCRIPTION_COLUMN, "")
+        if not text or not text.strip():
+            if log:
+                logger.info(f"  Row {row_idx}: Empty text, removing")
+            removed[row_idx] = (None, False)
+        elif len(text.strip()) < 20:
+            if log:
+                logger.info(f"  Row {row_idx}: Text too short, removing")
+            removed[row_idx] = (None, False)
+        else:
+            valid_rows.append((row_idx, columns))
+    return valid_rows, removed
+
+
+def build_ai_messages(valid_rows: list[tuple[int, dict[str, str]]], response_format: str) -> list[dict]:
+    """Chat messages of one AI batch request."""
+    # Build batch prompt (each column truncated to avoid token limits)
+    batch_text = "\n\n".join(_format_ai_row(row_idx, columns) for row_idx, columns in valid_rows)
+    return [
+        {
+            "role": "system",
+            "content": AI_SYSTEM_PROMPT + AI_RESPONSE_FORMATS[response_format]
+        },
+        {
+            "role": "user",
+            "content": f"Analizza queste {len(valid_rows)} righe:\n\n{batch_text}"
+        }
+    ]
+
+
+def estimate_ai_batch_tokens(
+    rows_data: list[tuple[int, dict[str, str]]],
+    response_format: str = AI_RESPONSE_FORMAT,
+) -> tuple[int, int]:
+    """
+    Estimate (prompt_tokens, completion_tokens) of one AI batch before sending it.
+    The json format answers with a short verdict per row, the text format
+    echoes each Description.
+    """
+    valid_rows, _ = _split_ai_rows(rows_data, log=False)
+    if not valid_rows:
+        return 0, 0
+    prompt = sum(estimate_tokens(m["content"]) for m in build_ai_messages(valid_rows, response_format))
+    if response_format == "json":
+        completion = AI_JSON_TOKENS_PER_ROW * len(valid_rows)
+    else:
+        completion = sum(
+            AI_JSON_TOKENS_PER_ROW + estimate_tokens(columns[AI_DESCRIPTION_COLUMN][:AI_MAX_CHARS_PER_COLUMN])
+            for _, columns in valid_rows
+        )
+    return prompt, min(completion, AI_MAX_TOKENS)
+
+
+def ai_batch_anonymize_and_evaluate(
+    client: OpenAI, 
+    rows_data: list[tuple[int, dict[str, str]]],
+    profile: Optional[AnonymizationProfile] = None,
+    raise_errors: bool = False,
+    response_format: str = AI_RESPONSE_FORMAT,
+    ledger: Optional[TokenLedger] = None,
+    timeout: Optional[float] = None,
+) -> dict[int, tuple[Optional[dict[str, str]], bool]]:
+    """
+    Process multiple rows in a single AI call for efficiency.
+    
+    Args:
+        client: OpenAI client
+        rows_data: List of (row_index, {column: text}) tuples; rows are
+            dropped when their Description is empty or too short
+        profile: Anonymization profile (defaults to DEFAULT_PROFILE)
+        raise_errors: raise AIBatchError instead of returning the keep-all
+            fallback when the AI call fails (so the batch can be retried)
+        response_format: "json" (replacements applied locally) or "text"
+            (the model echoes the corrected text)
+        ledger: records the token usage of the request
+        timeout: seconds before the request is abandoned (client default if None)
+    
+    Returns:
+        dict mapping row_index to ({column: corrected_text} or None, is_useful)
+    """
+    profile = profile or DEFAULT_PROFILE
+    
+    # Filter out empty/short texts
+    valid_rows, results = _split_ai_rows(rows_data)
+    
+    if not valid_rows:
+        return results
+    
+    try:
+        model = os.getenv("OVH_MODEL", "Meta-Llama-3_3-70B-Instruct")
+        
+        response = client.chat.completions.create(
+            model=model,
+            messages=build_ai_messages(valid_rows, response_format),
+            max_tokens=AI_MAX_TOKENS,
             temperature=0.1,
+            **({"response_format": {"type": "json_object"}} if response_format == "json" else {}),
+            **({"timeout": timeout} if timeout is not None else {}),
         )
         
+        if ledger is not None:
+            estimated_prompt, estimated_completion = estimate_ai_batch_tokens(valid_rows, response_format)
+            prompt_tokens, completion_tokens = ledger.record(
+                f"rows {valid_rows[0][0]}-{valid_rows[-1][0]}",
+                getattr(response, "usage", None),
+                estimated_prompt,
+                estimated_completion,
+            )
+            logger.info(
+                f"  Tokens: {prompt_tokens} prompt + {completion_tokens} completion "
+                f"({(prompt_tokens + completion_tokens) / len(valid_rows):.0f}/row)"
+            )
+        
         answer = response.choices[0].message.content.strip()
         
         # Parse batch response
-        import re
-        pattern = r'\[RISULTATO\s*(\d+)\](.*?)\[/RISULTATO\s*\d+\]'
-        matches = re.findall(pattern, answer, re.DOTALL | re.IGNORECASE)
-        
-        parsed_results = {}
-        for match in matches:
-            try:
-                result_idx = int(match[0])
-                content = match[1].strip()
-                
-                is_useful = False
-                anonymized_text = None
-                
-                for line in content.split("\n"):
-                    line = line.strip()
-                    if line.upper().startswith("MANTIENI:"):
-                        is_useful = "SI" in line.upper()
-                    elif line.upper().startswith("TESTO:"):
-                        text_part = line[6:].strip()
-                        if text_part.upper() != "INVARIATO" and text_part:
-                            anonymized_text = text_part
-                
-                parsed_results[result_idx] = (anonymized_text, is_useful)
-            except (ValueError, IndexError):
-                continue
+        if response_format == "json":
+            parsed_results = {}
+            rows_columns = dict(valid_rows)
+            for result_idx, (replacements, is_useful) in _parse_json_response(answer).items():
+                if result_idx not in rows_columns:
+                    continue
+                columns = rows_columns[result_idx]
+                corrected = {}
+                for col, text in columns.items():
+                    # Replacements for this column, or without a (known) column if found here
+                    col_replacements = [
+                        (original, tag)
+                        for campo, original, tag in replacements
+                        if campo == col or (campo not in columns and original in text)
+                    ]
+                    new_text, applied = apply_ai_replacements(text, col_replacements, profile, result_idx)
+                    if applied:
+                        corrected[col] = new_text
+                parsed_results[result_idx] = (corrected or None, is_useful)
+        else:
+            parsed_results = {
+                result_idx: ({AI_DESCRIPTION_COLUMN: anon_text} if anon_text else None, is_useful)
+                for result_idx, (anon_text, is_useful) in _parse_text_response(answer).items()
+            }
         
         # Log results and merge with pre-filtered results
-        for row_idx, text in valid_rows:
+        for row_idx, columns in valid_rows:
             if row_idx in parsed_results:
-                anon_text, is_useful = parsed_results[row_idx]
+                corrected, is_useful = parsed_results[row_idx]
                 
                 # Count AI corrections
-                if anon_text:
-                    original_tags = len(re.findall(r"\[FAKE_[A-Z_]+\]", text))
-                    new_tags = len(re.findall(r"\[FAKE_[A-Z_]+\]", anon_text))
+                for col, anon_text in (corrected or {}).items():
+                    original_tags = len(profile.tag_pattern.findall(columns.get(col, "")))
+                    new_tags = len(profile.tag_pattern.findall(anon_text))
                     ai_added = new_tags - original_tags
                     if ai_added > 0:
-                        logger.info(f"  Row {row_idx}: AI found {ai_added} additional PII")
+                        logger.info(f"  Row {row_idx}: AI found {ai_added} additional PII in '{col}'")
                 
                 logger.info(f"  Row {row_idx}: AI = {'KEEP' if is_useful else 'REMOVE'}")
-                results[row_idx] = (anon_text, is_useful)
+                results[row_idx] = (corrected, is_useful)
             else:
                 # If parsing failed for this row, keep it by default
                 logger.warning(f"  Row {row_idx}: AI response parsing failed, keeping")
@@ -506,9 +994,91 @@ Dove n è il numero della riga originale."""
         logger.error(f"AI batch processing failed: {e}. Keeping all rows unchanged.")
         for row_idx, _ in valid_rows:
             results[row_idx] = (None, True)
+        if raise_errors:
+            raise AIBatchError(str(e), results) from e
         return results
 
 
+def json_mode_rejected(error: Optional[BaseException]) -> bool:
+    """True if an AI request failed because the endpoint does not accept JSON mode."""
+    message = str(error).lower()
+    return getattr(error, "status_code", None) in (400, 422) and ("response_format" in message or "json" in message)
+
+
+def phase2_verdict(
+    row_num: int,
+    description_text: str,
+    risoluzione_text: str,
+    profile: AnonymizationProfile,
+) -> str:
+    """
+    Apply the pre-AI filters to one row.
+    Returns 'tags' (too many tags in Description), 'denylist' (denylist match
+    in Risoluzione__c) or 'keep'.
+    """
+    # Check 1: Tag percentage on Description
+    tag_percentage = calculate_tag_percentage(description_text, profile)
+    if tag_percentage >= profile.tag_threshold:
+        logger.info(f"  Row {row_num}: Description tag % {tag_percentage:.1%} >= {profile.tag_threshold:.0%}, REMOVING")
+        return "tags"
+    
+    # Check 2: Denylist phrases in Risoluzione__c
+    denylist_match = contains_denylist_phrase(risoluzione_text, profile)
+    if denylist_match:
+        logger.info(f"  Row {row_num}: Denylist match in Risoluzione: '{denylist_match}', REMOVING")
+        return "denylist"
+    
+    # Row passed both filters
+    logger.info(f"  Row {row_num}: Tag % {tag_percentage:.1%}, no denylist match, keeping")
+    return "keep"
+
+
+def append_to_master(rows: list[dict], fieldnames: list[str], master_path: Path) -> int:
+    """Append the rows whose Id is not yet in the master file. Returns the number appended."""
+    logger.info("=" * 60)
+    logger.info(f"Appending to master file: {master_path}")
+    logger.info("=" * 60)
+    
+    # Load existing IDs from master file to avoid duplicates
+    existing_ids = set()
+    if master_path.exists():
+        with open(master_path, "r", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                existing_ids.add(row.get("Id", ""))
+        logger.info(f"Master file exists with {len(existing_ids)} existing records")
+    
+    # Filter out rows already in master
+    new_rows = [row for row in rows if row.get("Id", "") not in existing_ids]
+    
+    if new_rows:
+        # Append new rows to master file
+        file_exists = master_path.exists()
+        with open(master_path, "a", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            if not file_exists:
+                writer.writeheader()
+            writer.writerows(new_rows)
+        
+        logger.info(f"Appended {len(new_rows)} new records to master file (skipped {len(rows) - len(new_rows)} duplicates)")
+    else:
+        logger.info(f"No new records to append (all {len(rows)} already in master)")
+    return len(new_rows)
+
+
+# Columns anonymized in Phase 1
+TEXT_COLUMNS = [
+    "Subject",
+    "Description",
+    "Risoluzione__c",
+    "Commenti_Ente__c",
+    "Ulteriori_informazioni_a_supporto__c",
+    "Dettaglio_richiesta__c",
+]
+# Other columns read before the output is written (Id: checkpoint, vault, verdicts; CaseNumber: priority)
+KEY_COLUMNS = ["Id", "CaseNumber"]
+
+
 def process_csv(
     input_path: Path,
     output_path: Path,
@@ -517,13 +1087,67 @@ def process_csv(
     ai_client: Optional[OpenAI],
     limit: Optional[int] = None,
     skip_master_append: bool = False,
+    profile: Optional[AnonymizationProfile] = None,
+    checkpoint: Optional[RunCheckpoint] = None,
+    span_store: Optional[SpanStore] = None,
+    ai_response_format: str = AI_RESPONSE_FORMAT,
+    shard: Optional[tuple[int, int]] = None,
+    index_path: Optional[Path] = None,
+    ingest: str = "csv",
+    ledger: Optional[TokenLedger] = None,
+    keep_classifier: Optional[KeepClassifier] = None,
+    classifier_threshold: float = KEEP_CLASSIFIER_THRESHOLD,
+    verdict_log: Optional[Path] = None,
+    deadline: Optional[RunDeadline] = None,
+    pending_path: Optional[Path] = None,
+    deferred_path: Optional[Path] = None,
+    vault: Optional[PseudonymVault] = None,
 ) -> dict:
     """
     Process the CSV file, anonymizing and filtering rows.
     
+    With shard=(i, N), only the cases whose Id hashes to shard i are processed
+    (after the limit is applied, so the shards of a test run add up to it).
+    The input is read through its record offset index (index_path, default
+    <input>.idx), so a limit only parses the first `limit` rows. With
+    ingest="arrow" it is parsed by pyarrow instead: the limit and shard
+    selection run on the Arrow table, and only the TEXT_COLUMNS and
+    KEY_COLUMNS cells are materialized before the output rows are known.
+    
+    The ledger records the tokens of every AI request. When it has a budget,
+    no new batch is sent once its estimated tokens would exceed the budget;
+    the rows of the batches not sent are dropped from this run's output (they
+    are not checkpointed, so a later --resume or run processes them).
+    
+    With a keep_classifier, rows it is confident about (P(KEEP) >= threshold
+    or <= 1 - threshold, and no name candidates left for a KEEP) are decided
+    locally and only the other rows are sent to the LLM. LLM and local
+    verdicts are appended to verdict_log, the classifier's training data.
+    
+    With a deadline, rows are anonymized and sent to the AI in priority order
+    (Ids in pending_path first, then newest CaseNumber first). No row is
+    started in Phase 1 unless it and the AI batches of the rows already done
+    are expected to fit in the time left, and no AI batch is sent unless it is
+    expected to fit; the output keeps the input order. The Ids not processed
+    (deadline or token budget) are saved to pending_path for the next run,
+    which also drops the pending Ids it processed. With a deferred_path
+    (shard runs), pending_path is only read and this run's unprocessed Ids
+    are written to deferred_path instead, for merge to combine.
+    
+    With a checkpoint, Phase 1 rows, Phase 2 verdicts and completed AI batches
+    are stored as they are produced and reused when already present, and the
+    rows of an AI batch that fails are left out of the output (saved with the
+    pending Ids) instead of being kept unchecked, so a --resume can retry them.
+    With a span store, analyzer results are cached per cell; with analyzer=None
+    Phase 1 uses only the stored spans and drops rows that have none.
+    With a vault, entities get per-value surrogate tags, consistent across the
+    text columns of a case (profile.pseudonyms should be its scope).
+    
     Returns:
         dict with processing statistics
     """
+    profile = profile or DEFAULT_PROFILE
+    ledger = ledger if ledger is not None else TokenLedger()
     stats = {
         "total_rows": 0,
         "anonymized_rows": 0,
@@ -532,63 +1156,145 @@ def process_csv(
         "filtered_by_ai": 0,
         "kept_rows": 0,
         "total_entities_found": 0,
+        "missing_spans": 0,
+        "not_sent_over_budget": 0,
+        "deferred_by_deadline": 0,
+        "deferred_by_ai_error": 0,
+        "kept_by_classifier": 0,
+        "removed_by_classifier": 0,
+        "ai_calls_saved": 0,
+        "estimated_tokens": 0,
+        "profile_version": profile.version,
     }
     
     logger.info(f"Reading input file: {input_path}")
     
-    # Read input CSV
-    with open(input_path, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        fieldnames = reader.fieldnames
-        rows = list(reader)
-    
-    total_available = len(rows)
+    test_mode = limit is not None and limit > 0
+    row_limit = limit if test_mode else None
     
-    # Apply limit if specified (test mode)
-    if limit is not None and limit > 0:
-        rows = rows[:limit]
-        logger.info(f"TEST MODE: Processing {len(rows)} of {total_available} available rows")
+    passthrough = None
+    if ingest == "arrow":
+        # Limit and shard selection on the Arrow table; only the text and key columns of the
+        # selected rows are materialized, the others are filled in for the rows written
+        fieldnames, value_rows, selected, passthrough = read_case_values(
+            input_path, columns=TEXT_COLUMNS + KEY_COLUMNS, limit=row_limit, shard=shard
+        )
+        if test_mode:
+            logger.info(f"TEST MODE: Processing the first {selected} rows")
+        if shard is not None:
+            logger.info(f"SHARD {shard[0]}/{shard[1]}: {len(value_rows)} of {selected} rows")
+    else:
+        # Read input CSV (only the first `limit` rows in test mode)
+        with CaseCsvReader(input_path, index_path) as reader:
+            fieldnames = reader.fieldnames
+            total_available = len(reader)
+            value_rows = list(reader.value_rows(0, row_limit))
+        
+        if test_mode:
+            logger.info(f"TEST MODE: Processing {len(value_rows)} of {total_available} available rows")
+        
+        if shard is not None:
+            selected = len(value_rows)
+            id_pos = fieldnames.index("Id") if "Id" in fieldnames else None
+            value_rows = [
+                cells for cells in value_rows
+                if shard_of(cells[id_pos] if id_pos is not None and id_pos < len(cells) else "", shard[1]) == shard[0]
+            ]
+            logger.info(f"SHARD {shard[0]}/{shard[1]}: {len(value_rows)} of {selected} rows")
+    
+    # One record per row, with the output 'url' column already in the schema
+    output_fieldnames = list(fieldnames) + ["url"]
+    schema = CaseSchema(output_fieldnames)
+    records = [schema.record(i, cells) for i, cells in enumerate(value_rows, start=1)]
+    del value_rows
     
-    stats["total_rows"] = len(rows)
+    stats["total_rows"] = len(records)
     logger.info(f"Total rows to process: {stats['total_rows']}")
     
+    # Ids left over by previous runs (deadline or token budget), done first with a deadline
+    pending_ids = load_pending_ids(pending_path) if pending_path else []
+    input_ids = {record.get("Id", "") for record in records} if pending_path else set()
+    if pending_ids:
+        logger.info(
+            f"{sum(case_id in input_ids for case_id in pending_ids)} of {len(pending_ids)} Ids "
+            f"left over by previous runs are in the input"
+        )
+    deferred_ids = []
+    if deadline is not None:
+        records = priority_order(records, pending_ids)
+        logger.info(
+            f"Time budget: {deadline.remaining():.0f}s left (margin {deadline.margin_s:.0f}s), "
+            f"rows in priority order (left-over Ids, then newest CaseNumber)"
+        )
+    
     processed_rows = []
     
     # Columns to anonymize (text columns)
-    text_columns = [
-        "Subject",
-        "Description",
-        "Risoluzione__c",
-        "Commenti_Ente__c",
-        "Ulteriori_informazioni_a_supporto__c",
-        "Dettaglio_richiesta__c",
-    ]
+    text_columns = [col for col in TEXT_COLUMNS if col in schema.positions]
     
     logger.info("=" * 60)
     logger.info("PHASE 1: Anonymization with Presidio")
     logger.info("=" * 60)
     
-    for i, row in enumerate(rows, start=1):
+    restored_rows = checkpoint.anonymized_rows() if checkpoint else {}
+    if restored_rows:
+        logger.info(f"Restored {len(restored_rows)} anonymized rows from checkpoint")
+    
+    # Rows done that will (or may) need AI time in Phase 3 (deadline mode)
+    ai_rows = 0
+    for record in records:
+        i = record.index
+        if i in restored_rows:
+            anonymized_row, row_total_entities = restored_rows.pop(i)
+            # Phase 1 only changes the text columns
+            for col in text_columns:
+                record[col] = anonymized_row.get(col, "")
+            record.num_entities = row_total_entities
+            stats["total_entities_found"] += row_total_entities
+            if row_total_entities > 0:
+                stats["anonymized_rows"] += 1
+            processed_rows.append(record)
+            ai_rows += 1
+            continue
+        
+        if deadline is not None and not deadline.allows(("row", 1), ("ai_row", ai_rows if ai_client else 0)):
+            if not deferred_ids:
+                logger.warning(
+                    f"Time budget: {deadline.remaining():.0f}s left, no more rows are anonymized "
+                    f"(the remaining ones are left for the next run)"
+                )
+            deferred_ids.append(record.get("Id", ""))
+            continue
+        
         logger.info(f"Processing row {i}/{stats['total_rows']}...")
         
         row_total_entities = 0
-        anonymized_row = row.copy()
-        combined_text = ""
-        
-        # Anonymize each text column
-        for col in text_columns:
-            if col in row and row[col]:
-                original_text = row[col]
-                anonymized_text, num_entities, _ = anonymize_text(
-                    original_text, analyzer, anonymizer
-                )
-                anonymized_row[col] = anonymized_text
-                row_total_entities += num_entities
-                combined_text += " " + anonymized_text
-                
-                if num_entities > 0:
-                    logger.info(f"  Column '{col}': {num_entities} entities anonymized")
+        t0 = time.perf_counter()
         
+        # Anonymize each text column (in place: the record is passed on, not copied)
+        case_id = record.get("Id", "") or f"row{i}"
+        try:
+            for col in text_columns:
+                original_text = record[col]
+                if original_text:
+                    anonymized_text, num_entities, _ = anonymize_text(
+                        original_text, analyzer, anonymizer, profile, span_store, vault, case_id
+                    )
+                    record[col] = anonymized_text
+                    row_total_entities += num_entities
+                    
+                    if num_entities > 0:
+                        logger.info(f"  Column '{col}': {num_entities} entities anonymized")
+        except SpanStoreMissError:
+            # Never write a cell that was not anonymized
+            logger.warning(f"  Row {i}: no stored spans for column '{col}', REMOVING")
+            stats["missing_spans"] += 1
+            continue
+        finally:
+            if vault is not None:
+                vault.release(case_id)
+        
+        record.num_entities = row_total_entities
         stats["total_entities_found"] += row_total_entities
         
         if row_total_entities > 0:
@@ -597,39 +1303,56 @@ def process_csv(
         else:
             logger.info(f"  Row {i}: No PII entities found")
         
-        # Store combined text for later filtering
-        anonymized_row["_combined_text"] = combined_text.strip()
-        processed_rows.append(anonymized_row)
+        if checkpoint:
+            checkpoint.save_anonymized_row(i, {col: record[col] for col in text_columns}, row_total_entities)
+        processed_rows.append(record)
+        
+        if deadline is not None:
+            deadline.record("row", time.perf_counter() - t0)
+            # Phase 2 verdict now, so that AI time is reserved only for the rows that reach Phase 3
+            record.verdict = phase2_verdict(
+                i, record.get("Description", ""), record.get("Risoluzione__c", ""), profile
+            )
+            ai_rows += record.verdict == "keep"
+    
+    del records
+    stats["deferred_by_deadline"] = len(deferred_ids)
+    if deadline is not None:
+        # Output in input order, whatever the processing order
+        processed_rows.sort(key=lambda record: record.index)
+    if checkpoint:
+        checkpoint.flush()
+    if span_store is not None:
+        span_store.flush()
     
     logger.info("=" * 60)
     logger.info("PHASE 2: Pre-AI filtering (tag % on Description + denylist on Risoluzione)")
     logger.info("=" * 60)
     
     filtered_rows = []
-    
-    for i, row in enumerate(processed_rows, start=1):
-        combined_text = row.pop("_combined_text", "")
-        description_text = row.get("Description", "")
-        risoluzione_text = row.get("Risoluzione__c", "")
+    stored_verdicts = checkpoint.filter_verdicts() if checkpoint else {}
+    verdicts = {}
+    
+    for record in processed_rows:
+        i = record.index
+        verdict = stored_verdicts.get(i) or record.verdict
+        if verdict is None:
+            verdict = phase2_verdict(
+                i, record.get("Description", ""), record.get("Risoluzione__c", ""), profile
+            )
+        record.verdict = verdicts[i] = verdict
         
-        # Check 1: Tag percentage on Description
-        tag_percentage = calculate_tag_percentage(description_text)
-        if tag_percentage >= TAG_THRESHOLD:
-            logger.info(f"  Row {i}: Description tag % {tag_percentage:.1%} >= {TAG_THRESHOLD:.0%}, REMOVING")
+        if verdict == "tags":
             stats["filtered_by_tags"] += 1
             continue
-        
-        # Check 2: Denylist phrases in Risoluzione__c
-        denylist_match = contains_denylist_phrase(risoluzione_text)
-        if denylist_match:
-            logger.info(f"  Row {i}: Denylist match in Risoluzione: '{denylist_match}', REMOVING")
+        if verdict == "denylist":
             stats["filtered_by_denylist"] += 1
             continue
         
-        # Row passed both filters
-        logger.info(f"  Row {i}: Tag % {tag_percentage:.1%}, no denylist match, keeping")
-        row["_description_text"] = description_text  # Store for AI phase
-        filtered_rows.append(row)
+        filtered_rows.append(record)
+    
+    if checkpoint and len(stored_verdicts) != len(verdicts):
+        checkpoint.save_filter_verdicts(verdicts)
     
     logger.info(f"Rows after pre-AI filtering: {len(filtered_rows)} (tag filter: {stats['filtered_by_tags']}, denylist: {stats['filtered_by_denylist']})")
     
@@ -638,78 +1361,220 @@ def process_csv(
     logger.info("=" * 60)
     
     if ai_client:
-        final_rows = []
         total_ai_corrections = 0
+        verdicts_to_log = []
+        
+        # Columns for batch processing (Description + residual-risk columns)
+        extra_columns = 0
+        for record in filtered_rows:
+            record.ai_columns = ai_columns_for_row(record, record.get("Description", ""), ai_response_format)
+            extra_columns += len(record.ai_columns) - 1
+        if extra_columns:
+            logger.info(f"Sending {extra_columns} residual-risk columns with name candidates along with Description")
+        
+        # Local classifier: confident verdicts are decided without the LLM. A local
+        # KEEP also requires no name candidates left, since the LLM is the second PII pass.
+        rows_to_send = filtered_rows
+        if keep_classifier is not None:
+            rows_to_send = []
+            probabilities = keep_classifier.keep_probability([r.get("Description", "") for r in filtered_rows])
+            for record, probability in zip(filtered_rows, probabilities):
+                decision = decide(probability, classifier_threshold)
+                if decision and any(has_name_candidates(text) for text in record.ai_columns.values()):
+                    decision = None
+                if decision is None:
+                    rows_to_send.append(record)
+                    continue
+                record.ai_keep = decision
+                record.ai_columns = None
+                stats["kept_by_classifier" if decision else "removed_by_classifier"] += 1
+                verdicts_to_log.append(verdict_row(
+                    record.get("Id", ""), record.get("Description", ""), decision, "local", probability
+                ))
+            stats["ai_calls_saved"] = (
+                (len(filtered_rows) + AI_BATCH_SIZE - 1) // AI_BATCH_SIZE
+                - (len(rows_to_send) + AI_BATCH_SIZE - 1) // AI_BATCH_SIZE
+            )
+            logger.info(
+                f"Local classifier (threshold {classifier_threshold}): {stats['kept_by_classifier']} KEEP, "
+                f"{stats['removed_by_classifier']} REMOVE, {len(rows_to_send)} rows to the LLM "
+                f"({stats['ai_calls_saved']} calls saved)"
+            )
         
-        # Prepare data for batch processing (using Description text)
-        rows_with_index = []
-        for i, row in enumerate(filtered_rows, start=1):
-            description_text = row.get("_description_text", "")
-            rows_with_index.append((i, row, description_text))
+        if deadline is not None:
+            # Newest cases get the AI first
+            rows_to_send = priority_order(rows_to_send, pending_ids)
+        
+        # Rows numbered by their position among the rows sent to the AI
+        for i, record in enumerate(rows_to_send, start=1):
+            record.index = i
         
         # Process in batches
-        num_batches = (len(rows_with_index) + AI_BATCH_SIZE - 1) // AI_BATCH_SIZE
-        logger.info(f"Processing {len(rows_with_index)} rows in {num_batches} batches of {AI_BATCH_SIZE}")
+        num_batches = (len(rows_to_send) + AI_BATCH_SIZE - 1) // AI_BATCH_SIZE
+        logger.info(f"Processing {len(rows_to_send)} rows in {num_batches} batches of {AI_BATCH_SIZE}")
+        
+        # Pre-run estimate from the rows that passed Phase 2
+        batch_estimates = [
+            sum(estimate_ai_batch_tokens(
+                [(record.index, record.ai_columns) for record in rows_to_send[start:start + AI_BATCH_SIZE]],
+                ai_response_format,
+            ))
+            for start in range(0, len(rows_to_send), AI_BATCH_SIZE)
+        ]
+        stats["estimated_tokens"] = sum(batch_estimates)
+        logger.info(
+            f"Estimated AI usage: ~{stats['estimated_tokens']} tokens"
+            + (f" (budget: {ledger.budget})" if ledger.budget is not None else "")
+        )
+        over_budget = False
+        out_of_time = False
         
         for batch_num in range(num_batches):
             start_idx = batch_num * AI_BATCH_SIZE
-            end_idx = min(start_idx + AI_BATCH_SIZE, len(rows_with_index))
-            batch = rows_with_index[start_idx:end_idx]
+            end_idx = min(start_idx + AI_BATCH_SIZE, len(rows_to_send))
+            batch = rows_to_send[start_idx:end_idx]
             
             logger.info(f"  Batch {batch_num + 1}/{num_batches}: rows {start_idx + 1}-{end_idx}")
             
-            # Prepare batch data: (row_index, description_text)
-            batch_data = [(idx, desc_text) for idx, row, desc_text in batch]
+            # Prepare batch data: (row_index, {column: text})
+            batch_data = [(record.index, record.ai_columns) for record in batch]
             
-            # Call AI batch processing
-            batch_results = ai_batch_anonymize_and_evaluate(ai_client, batch_data)
+            # Call AI batch processing (or reuse a batch of the same rows completed by a previous run)
+            batch_ids = "\n".join(record.get("Id", "") for record in batch)
+            rows_key = hashlib.sha256(batch_ids.encode("utf-8")).hexdigest()[:16]
+            batch_results = checkpoint.ai_batch(batch_num, rows_key) if checkpoint else None
+            answered = batch_results is not None
+            ai_failed = False
+            if answered:
+                logger.info(f"  Batch {batch_num + 1}: restored from checkpoint")
+            if batch_results is None and not over_budget and not ledger.fits(batch_estimates[batch_num]):
+                over_budget = True
+                logger.warning(
+                    f"  Token budget reached ({ledger.total_tokens}/{ledger.budget}): "
+                    f"no more batches are sent, their rows are left out of this run"
+                )
+            if (
+                batch_results is None and not over_budget and not out_of_time
+                and deadline is not None and not deadline.allows(("ai_row", len(batch)))
+            ):
+                out_of_time = True
+                logger.warning(
+                    f"  Time budget: {deadline.remaining():.0f}s left, no more batches are sent "
+                    f"(their rows are left for the next run)"
+                )
+            if batch_results is None and not (over_budget or out_of_time):
+                t0 = time.perf_counter()
+                try:
+                    try:
+                        batch_results = ai_batch_anonymize_and_evaluate(
+                            ai_client, batch_data, profile, raise_errors=True,
+                            response_format=ai_response_format, ledger=ledger,
+                            timeout=deadline.remaining() if deadline is not None else None,
+                        )
+                    except AIBatchError as e:
+                        if ai_response_format != "json" or not json_mode_rejected(e.__cause__):
+                            raise
+                        logger.warning("  The AI endpoint rejected JSON mode: the rest of this run uses the text format")
+                        ai_response_format = "text"
+                        for record in rows_to_send[start_idx:]:
+                            record.ai_columns = ai_columns_for_row(record, record.get("Description", ""), "text")
+                        batch_data = [(record.index, record.ai_columns) for record in batch]
+                        batch_results = ai_batch_anonymize_and_evaluate(
+                            ai_client, batch_data, profile, raise_errors=True,
+                            response_format=ai_response_format, ledger=ledger,
+                            timeout=deadline.remaining() if deadline is not None else None,
+                        )
+                    answered = True
+                    if checkpoint:
+                        checkpoint.save_ai_batch(batch_num, batch_results, rows_key)
+                    if deadline is not None:
+                        deadline.record("ai_row", time.perf_counter() - t0, len(batch))
+                except AIBatchError as e:
+                    if deadline is not None and deadline.remaining() <= 0:
+                        # Cut by the deadline: leave the rows for the next run rather than unchecked
+                        logger.warning(f"  Batch {batch_num + 1}: no answer before the time budget ran out")
+                        out_of_time = True
+                    elif checkpoint:
+                        # Never publish rows the AI did not check: leave them for the next run
+                        logger.error(
+                            f"  Batch {batch_num + 1}: AI failed, its rows are left out of this run and "
+                            f"saved as pending Ids (retried by --resume or the next run)"
+                        )
+                        ai_failed = True
+                    else:
+                        batch_results = e.fallback_results
+            if batch_results is None:
+                for record in batch:
+                    record.ai_keep = False
+                    record.ai_columns = None
+                    deferred_ids.append(record.get("Id", ""))
+                if ai_failed:
+                    stats["deferred_by_ai_error"] += len(batch)
+                else:
+                    stats["not_sent_over_budget" if over_budget else "deferred_by_deadline"] += len(batch)
+                continue
             
             # Process results
-            for idx, row, description_text in batch:
-                row.pop("_description_text", None)
+            for record in batch:
+                columns, record.ai_columns = record.ai_columns, None
                 
-                if idx not in batch_results:
+                if record.index not in batch_results:
                     # Fallback: keep row if AI didn't process it
-                    final_rows.append(row)
+                    record.ai_keep = True
                     continue
                 
-                ai_corrected_text, is_useful = batch_results[idx]
+                ai_corrections, is_useful = batch_results[record.index]
+                record.ai_keep = is_useful
                 
                 if is_useful:
-                    # If AI made corrections, apply them to Description
-                    if ai_corrected_text and ai_corrected_text != description_text:
+                    # If AI made corrections, apply them to the columns it received
+                    changed = [
+                        col for col, text in (ai_corrections or {}).items()
+                        if col in columns and text and text != columns[col]
+                    ]
+                    for col in changed:
+                        record[col] = ai_corrections[col]
+                    if changed:
                         total_ai_corrections += 1
-                        row["Description"] = ai_corrected_text
-                    
-                    final_rows.append(row)
                 else:
                     stats["filtered_by_ai"] += 1
+                if answered:
+                    # KEEP rows are logged with the LLM corrections applied
+                    description = record.get("Description", "") if is_useful else columns[AI_DESCRIPTION_COLUMN]
+                    verdicts_to_log.append(verdict_row(record.get("Id", ""), description, is_useful, "llm"))
         
+        # Same order as the input, whichever way each row was decided
+        final_rows = [record for record in filtered_rows if record.ai_keep]
+        
+        if verdict_log is not None:
+            append_verdicts(verdict_log, verdicts_to_log)
         if total_ai_corrections > 0:
             logger.info(f"AI found additional PII in {total_ai_corrections} rows")
+        if stats["not_sent_over_budget"]:
+            logger.warning(f"{stats['not_sent_over_budget']} rows not sent to the AI (token budget) and left out")
+        if out_of_time:
+            logger.warning("AI batches not sent before the time budget ran out were left out")
+        if stats["deferred_by_ai_error"]:
+            logger.warning(f"{stats['deferred_by_ai_error']} rows of failed AI batches left out (pending for the next run)")
         logger.info(f"Rows after AI filtering: {len(final_rows)}")
     else:
         logger.warning("AI client not available. Skipping AI validation phase.")
-        # Remove _description_text from remaining rows
-        final_rows = []
-        for row in filtered_rows:
-            row.pop("_description_text", None)
-            final_rows.append(row)
+        final_rows = filtered_rows
     
     stats["kept_rows"] = len(final_rows)
+    usage = ledger.summary()
+    stats["ai_requests"] = usage["requests"]
+    stats["prompt_tokens"] = usage["prompt_tokens"]
+    stats["completion_tokens"] = usage["completion_tokens"]
     
-    # Add URL column to each row
+    # Fill the URL column of each row
     CASE_URL_TEMPLATE = "https://padigitale2026.lightning.force.com/lightning/r/Case/{id}/view"
     
-    for row in final_rows:
-        case_id = row.get("Id", "")
-        if case_id:
-            row["url"] = CASE_URL_TEMPLATE.format(id=case_id)
-        else:
-            row["url"] = ""
-    
-    # Add 'url' to fieldnames
-    output_fieldnames = list(fieldnames) + ["url"]
+    for record in final_rows:
+        case_id = record.get("Id", "")
+        record["url"] = CASE_URL_TEMPLATE.format(id=case_id) if case_id else ""
+    if passthrough is not None:
+        passthrough.fill(final_rows)
     
     output_path.parent.mkdir(parents=True, exist_ok=True)
     
@@ -719,46 +1584,31 @@ def process_csv(
     logger.info("=" * 60)
     
     with open(output_path, "w", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=output_fieldnames)
-        writer.writeheader()
-        writer.writerows(final_rows)
+        writer = csv.writer(f)
+        writer.writerow(output_fieldnames)
+        writer.writerows(record.values for record in final_rows)
     
     logger.info(f"Daily output file written successfully: {output_path}")
     
     # Append to master file (output_case.csv) only when not in test mode
     if not skip_master_append:
-        master_path = output_path.parent / "output_case.csv"
-        logger.info("=" * 60)
-        logger.info(f"Appending to master file: {master_path}")
-        logger.info("=" * 60)
-        
-        # Load existing IDs from master file to avoid duplicates
-        existing_ids = set()
-        if master_path.exists():
-            with open(master_path, "r", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    existing_ids.add(row.get("Id", ""))
-            logger.info(f"Master file exists with {len(existing_ids)} existing records")
-        
-        # Filter out rows already in master
-        new_rows = [row for row in final_rows if row.get("Id", "") not in existing_ids]
-        
-        if new_rows:
-            # Append new rows to master file
-            file_exists = master_path.exists()
-            with open(master_path, "a", encoding="utf-8", newline="") as f:
-                writer = csv.DictWriter(f, fieldnames=output_fieldnames)
-                if not file_exists:
-                    writer.writeheader()
-                writer.writerows(new_rows)
-            
-            logger.info(f"Appended {len(new_rows)} new records to master file (skipped {len(final_rows) - len(new_rows)} duplicates)")
-        else:
-            logger.info(f"No new records to append (all {len(final_rows)} already in master)")
+        append_to_master(final_rows, output_fieldnames, output_path.parent / "output_case.csv")
     else:
         logger.info("Test mode: skipping append to output_case.csv")
     
+    if deferred_path is not None:
+        save_pending_ids(deferred_path, deferred_ids)
+        if deferred_ids:
+            logger.warning(f"{len(deferred_ids)} Ids left for the next run in {deferred_path}")
+    elif pending_path is not None:
+        # Left-over Ids not in this input stay pending; those processed now are dropped
+        pending = [case_id for case_id in pending_ids if case_id not in input_ids] + deferred_ids
+        save_pending_ids(pending_path, pending)
+        if pending:
+            logger.warning(f"{len(pending)} Ids left for the next run in {pending_path}")
+    if stats["deferred_by_deadline"]:
+        logger.warning(f"{stats['deferred_by_deadline']} rows not processed within the time budget")
+    
     return stats
 
 
@@ -772,6 +1622,12 @@ Examples:
     python presidio.py              # Process all rows
     python presidio.py --test 50    # Process only first 50 rows
     python presidio.py --test 10    # Quick test with 10 rows
+    python presidio.py --resume     # Continue an interrupted run from its checkpoint
+    python presidio.py --span-store   # Also save the analyzer spans of every cell
+    python presidio.py --reanonymize  # Rebuild output from stored spans (no NLP models)
+    python presidio.py --time-budget 50m  # Stop in time to write a partial output (newest cases first)
+    python presidio.py --shard 1/4  # Process only shard 1 of 4 (one process/job per shard)
+    python presidio.py merge --shards 4  # Combine the 4 shard outputs into the daily file + master
         """,
     )
     parser.add_argument(
@@ -780,50 +1636,357 @@ Examples:
         metavar="N",
         help="Test mode: process only first N rows",
     )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue from the checkpoint of an interrupted run (same input and configuration)",
+    )
+    parser.add_argument(
+        "--ai-format",
+        choices=sorted(AI_RESPONSE_FORMATS),
+        default=AI_RESPONSE_FORMAT,
+        help="AI response format: json (replacements applied locally) or text (legacy full-text echo) "
+             f"(default: {AI_RESPONSE_FORMAT}, env OVH_RESPONSE_FORMAT)",
+    )
+    parser.add_argument(
+        "--reanonymize",
+        action="store_true",
+        help="Re-apply operators and Phase 2 filters from stored spans only (no NLP models, no AI)",
+    )
+    parser.add_argument(
+        "--span-store",
+        type=Path,
+        nargs="?",
+        const=SPAN_STORE_FILE,
+        default=None,
+        metavar="PATH",
+        help=f"Save the analyzer spans of every cell for --reanonymize (opt-in, costs time on a cold run; "
+             f"default path: {SPAN_STORE_FILE}); --reanonymize reads it from there unless given",
+    )
+    parser.add_argument(
+        "--state-file",
+        type=Path,
+        default=STATE_FILE,
+        help=f"Checkpoint database (default: {STATE_FILE}, one per shard with --shard)",
+    )
+    parser.add_argument(
+        "--max-tokens-budget",
+        type=int,
+        metavar="N",
+        help="Stop sending AI batches once the next one would take the run over N tokens "
+             "(prompt + completion); rows not sent are left out of this run",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=parse_duration_arg,
+        metavar="DURATION",
+        help="Wall-clock budget of the run (e.g. 3000, 50m, 1.5h): newest cases first, no new "
+             "Presidio/AI work once it would not finish in time; unprocessed Ids are saved to "
+             f"{PENDING_IDS_FILE.name} and done first by the next run",
+    )
+    parser.add_argument(
+        "--time-margin",
+        type=parse_duration_arg,
+        default=DEFAULT_MARGIN_S,
+        metavar="DURATION",
+        help=f"Part of --time-budget kept to write the outputs (default: {DEFAULT_MARGIN_S:.0f}s)",
+    )
+    parser.add_argument(
+        "--pseudonyms",
+        choices=PSEUDONYM_SCOPES,
+        help="Replace each distinct value with its own tag instead of the generic one: "
+             "case = [FAKE_PERSON_1], [FAKE_PERSON_2]... numbered within each case; "
+             "global = [FAKE_PERSON_<hmac>], stable across cases and runs (needs env PSEUDONYM_HMAC_KEY)",
+    )
+    parser.add_argument(
+        "--nlp-model",
+        default=NLP_MODEL,
+        metavar="NAME",
+        help=f"Italian spaCy model of the analyzer (default: {NLP_MODEL}, env PRESIDIO_NLP_MODEL; "
+             "compare models with evaluate_models.py)",
+    )
+    parser.add_argument(
+        "--keep-classifier",
+        type=Path,
+        nargs="?",
+        const=KEEP_CLASSIFIER_FILE,
+        metavar="PATH",
+        help="Decide confident KEEP/REMOVE verdicts with the local classifier and send only the "
+             f"others to the AI (default model: {KEEP_CLASSIFIER_FILE}, see keep_classifier.py)",
+    )
+    parser.add_argument(
+        "--classifier-threshold",
+        type=float,
+        default=KEEP_CLASSIFIER_THRESHOLD,
+        metavar="P",
+        help="Minimum classifier confidence for a local verdict "
+             f"(default: {KEEP_CLASSIFIER_THRESHOLD})",
+    )
+    parser.add_argument(
+        "--ingest",
+        choices=["csv", "arrow"],
+        default="csv",
+        help="Input parser: csv (stdlib, offset index) or arrow (pyarrow.csv, optional dependency) "
+             "(default: csv)",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard_arg,
+        metavar="I/N",
+        help=f"Process only the cases whose Id hashes to shard I of N; writes a partial output to {SHARDS_DIR}",
+    )
+    
+    subparsers = parser.add_subparsers(dest="command")
+    merge_parser = subparsers.add_parser(
+        "merge",
+        help="Combine shard outputs, dedup by Id and append to output_case.csv",
+    )
+    merge_parser.add_argument(
+        "--shards",
+        type=int,
+        metavar="N",
+        help="Expected number of shards (default: inferred from the partial outputs)",
+    )
+    merge_parser.add_argument(
+        "--test",
+        type=int,
+        metavar="N",
+        help="Merge the shards of a --test N run (no append to output_case.csv)",
+    )
+    merge_parser.add_argument(
+        "--date",
+        default=datetime.now().strftime("%Y_%m_%d"),
+        metavar="YYYY_MM_DD",
+        help="Date of the shard outputs (default: today)",
+    )
     return parser.parse_args()
 
 
+def parse_duration_arg(value: str) -> float:
+    """argparse type for --time-budget/--time-margin."""
+    try:
+        return parse_duration(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def parse_shard_arg(value: str) -> tuple[int, int]:
+    """argparse type for --shard I/N."""
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def merge_shards(args) -> None:
+    """Merge the partial outputs of a sharded run (presidio.py merge)."""
+    stem = f"case_anonymized_{args.date}" + (f"_test{args.test}" if args.test else "")
+    partials = find_partials(SHARDS_DIR, stem)
+    try:
+        num_shards = check_complete(partials, args.shards)
+    except ValueError as e:
+        logger.error(f"Cannot merge {SHARDS_DIR / stem}_shard*: {e}")
+        sys.exit(1)
+    
+    logger.info(f"Merging {num_shards} shard outputs for {stem}")
+    # Restore input order when the input is available (same output as an unsharded run)
+    order = input_order(INPUT_FILE) if INPUT_FILE.exists() else None
+    fieldnames, rows, duplicates = merge_partials(
+        [partials[(i, num_shards)] for i in range(1, num_shards + 1)], order
+    )
+    if duplicates:
+        logger.warning(f"Dropped {duplicates} rows with an Id already seen in another shard")
+    
+    output_file = OUTPUT_DIR / f"{stem}.csv"
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_file, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    logger.info(f"Daily output file written: {output_file} ({len(rows)} rows)")
+    
+    if args.test:
+        logger.info("Test mode: skipping append to output_case.csv")
+    else:
+        append_to_master(rows, fieldnames, OUTPUT_DIR / "output_case.csv")
+    
+    # Ids left unprocessed by the shards replace the left-over Ids this input contained
+    deferred_paths = sorted(SHARDS_DIR.glob(f"{PENDING_IDS_FILE.stem}_shard*.txt"))
+    if deferred_paths and not args.test:
+        input_ids = set(order) if order is not None else {row.get("Id", "") for row in rows}
+        pending = [case_id for case_id in load_pending_ids(PENDING_IDS_FILE) if case_id not in input_ids]
+        for path in deferred_paths:
+            pending.extend(load_pending_ids(path))
+            path.unlink()
+        save_pending_ids(PENDING_IDS_FILE, pending)
+        logger.info(f"{len(pending)} Ids left for the next run in {PENDING_IDS_FILE}")
+    
+    # Verdicts logged by the shards go to the main verdict log
+    for path in sorted(VERDICT_LOG_FILE.parent.glob(f"{VERDICT_LOG_FILE.stem}_shard*.csv")):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            append_verdicts(VERDICT_LOG_FILE, list(csv.DictReader(f)))
+        path.unlink()
+        logger.info(f"Verdicts of {path.name} appended to {VERDICT_LOG_FILE}")
+
+
 def main():
     """Main entry point."""
     args = parse_args()
     
+    if args.command == "merge":
+        merge_shards(args)
+        return
+    
     logger.info("=" * 60)
     logger.info("PRESIDIO ANONYMIZATION SCRIPT")
     if args.test:
         logger.info(f"TEST MODE: Processing only {args.test} rows")
+    if args.shard:
+        logger.info(f"SHARD MODE: shard {args.shard[0]} of {args.shard[1]} (partial output, run 'merge' afterwards)")
+    if args.reanonymize:
+        logger.info("REANONYMIZE MODE: operators + Phase 2 from stored spans (no NLP, no AI)")
     logger.info("=" * 60)
     
+    # The budget counts from here (model loading included)
+    deadline = None
+    if args.time_budget is not None:
+        if args.reanonymize:
+            logger.error("--time-budget cannot be combined with --reanonymize")
+            sys.exit(1)
+        if args.time_margin >= args.time_budget:
+            logger.error("--time-margin must be smaller than --time-budget")
+            sys.exit(1)
+        deadline = RunDeadline(args.time_budget, args.time_margin, RunDeadline.load_throughput(THROUGHPUT_FILE))
+        logger.info(f"TIME BUDGET: {args.time_budget:.0f}s (margin {args.time_margin:.0f}s)")
+    
     # Check input file exists
     if not INPUT_FILE.exists():
         logger.error(f"Input file not found: {INPUT_FILE}")
         sys.exit(1)
     
+    if args.ingest == "arrow" and not arrow_available():
+        logger.error("--ingest arrow requires pyarrow (pip install pyarrow)")
+        sys.exit(1)
+    
+    if not 0.5 < args.classifier_threshold <= 1:
+        logger.error("--classifier-threshold must be in (0.5, 1]")
+        sys.exit(1)
+    
     logger.info(f"Input file: {INPUT_FILE}")
     
     # Generate output filename with current date
     today = datetime.now().strftime("%Y_%m_%d")
     suffix = f"_test{args.test}" if args.test else ""
+    if args.reanonymize:
+        suffix += "_reanonymized"
     output_file = OUTPUT_DIR / f"case_anonymized_{today}{suffix}.csv"
+    state_file = args.state_file
+    # LLM/local verdicts (training data of keep_classifier.py), not for test runs
+    verdict_log = None if args.test else VERDICT_LOG_FILE
+    # Ids left for the next run (deadline, token budget), not for test/reanonymize runs
+    pending_path = None if args.test or args.reanonymize else PENDING_IDS_FILE
+    deferred_path = None
+    if args.shard:
+        output_file = SHARDS_DIR / f"{output_file.stem}{shard_suffix(args.shard)}.csv"
+        state_file = state_file.with_name(f"{state_file.stem}{shard_suffix(args.shard)}{state_file.suffix}")
+        if verdict_log:
+            verdict_log = VERDICT_LOG_FILE.with_name(f"{VERDICT_LOG_FILE.stem}{shard_suffix(args.shard)}.csv")
+        if pending_path:
+            deferred_path = SHARDS_DIR / f"{PENDING_IDS_FILE.stem}{shard_suffix(args.shard)}.txt"
     logger.info(f"Output file: {output_file}")
     
+    # Per-value surrogate tags (optional)
+    vault = None
+    if args.pseudonyms:
+        try:
+            vault = PseudonymVault(TAG_MAPPING, args.pseudonyms, hmac_key_from_env())
+        except ValueError as e:
+            logger.error(str(e))
+            sys.exit(1)
+        logger.info(f"Pseudonyms: {args.pseudonyms} scope")
+    
     # Setup Presidio
-    analyzer = setup_analyzer()
+    profile = build_anonymization_profile(
+        nlp_model=args.nlp_model,
+        pseudonyms=args.pseudonyms,
+        pseudonym_key_id=vault.key_id if vault else "",
+    )
+    logger.info(f"Anonymization profile version: {profile.version} (analysis {profile.analysis_version})")
     anonymizer = setup_anonymizer()
     
-    # Setup AI client (optional)
-    ai_client = setup_ai_client()
+    if args.reanonymize:
+        args.span_store = args.span_store or SPAN_STORE_FILE
+        if not args.span_store.exists():
+            logger.error(f"Span store not found: {args.span_store} (run once with --span-store)")
+            sys.exit(1)
+        analyzer = None
+        ai_client = None
+        checkpoint = None
+        keep_classifier = None
+    else:
+        analyzer = setup_analyzer(args.nlp_model)
+        
+        # Setup AI client (optional); with a deadline a timed-out request is not retried
+        ai_client = setup_ai_client(max_retries=0 if deadline is not None else None)
+        
+        # Local KEEP/REMOVE classifier (optional)
+        keep_classifier = None
+        if args.keep_classifier:
+            if not classifier_available():
+                logger.error("--keep-classifier requires scikit-learn (pip install scikit-learn)")
+                sys.exit(1)
+            if not args.keep_classifier.exists():
+                logger.error(f"Classifier model not found: {args.keep_classifier} (run keep_classifier.py train)")
+                sys.exit(1)
+            keep_classifier = KeepClassifier.load(args.keep_classifier)
+            logger.info(f"Keep classifier: {args.keep_classifier} (version {keep_classifier.version}, "
+                        f"threshold {args.classifier_threshold})")
+        
+        # Checkpoint (phase/batch progress, reused with --resume)
+        routing = f"{keep_classifier.version}@{args.classifier_threshold}" if keep_classifier else None
+        checkpoint = RunCheckpoint(
+            state_file,
+            input_signature(INPUT_FILE, args.test, profile.version, args.shard, routing),
+            resume=args.resume,
+        )
+    
+    # Analyzer spans per cell (opt-in, reused by --reanonymize)
+    span_store = SpanStore(args.span_store, profile.analysis_version) if args.span_store else None
     
     # Process the CSV
     logger.info("Starting CSV processing...")
-    stats = process_csv(
-        INPUT_FILE,
-        output_file,
-        analyzer,
-        anonymizer,
-        ai_client,
-        limit=args.test,
-        skip_master_append=bool(args.test),
-    )
+    try:
+        stats = process_csv(
+            INPUT_FILE,
+            output_file,
+            analyzer,
+            anonymizer,
+            ai_client,
+            limit=args.test,
+            skip_master_append=bool(args.test) or args.reanonymize or bool(args.shard),
+            profile=profile,
+            checkpoint=checkpoint,
+            span_store=span_store,
+            ai_response_format=args.ai_format,
+            shard=args.shard,
+            index_path=CASE_INDEX_FILE,
+            ingest=args.ingest,
+            ledger=TokenLedger(args.max_tokens_budget),
+            keep_classifier=keep_classifier,
+            classifier_threshold=args.classifier_threshold,
+            verdict_log=verdict_log,
+            deadline=deadline,
+            pending_path=pending_path,
+            deferred_path=deferred_path,
+            vault=vault,
+        )
+    finally:
+        if checkpoint:
+            checkpoint.close()
+        if span_store is not None:
+            span_store.close()
+        if deadline is not None:
+            deadline.save_throughput(THROUGHPUT_FILE)
     
     # Print summary
     logger.info("=" * 60)
@@ -835,7 +1998,21 @@ def main():
     logger.info(f"Filtered by tag %:        {stats['filtered_by_tags']}")
     logger.info(f"Filtered by denylist:     {stats['filtered_by_denylist']}")
     logger.info(f"Filtered by AI:           {stats['filtered_by_ai']}")
+    if keep_classifier:
+        logger.info(f"Decided by classifier:    {stats['kept_by_classifier']} KEEP, "
+                    f"{stats['removed_by_classifier']} REMOVE ({stats['ai_calls_saved']} AI calls saved)")
+    if stats["not_sent_over_budget"]:
+        logger.info(f"Not sent (token budget):  {stats['not_sent_over_budget']}")
+    if deadline is not None:
+        logger.info(f"Left for next run (time): {stats['deferred_by_deadline']} "
+                    f"(run took {deadline.elapsed():.0f}s of {deadline.budget_s:.0f}s)")
+    logger.info(f"AI requests:              {stats['ai_requests']}")
+    logger.info(f"AI tokens:                {stats['prompt_tokens']} prompt + {stats['completion_tokens']} completion "
+                f"(estimated before run: {stats['estimated_tokens']})")
+    if stats["missing_spans"]:
+        logger.info(f"Dropped (no stored spans): {stats['missing_spans']}")
     logger.info(f"Final rows kept:          {stats['kept_rows']}")
+    logger.info(f"Profile version:          {stats['profile_version']}")
     logger.info(f"Output file:              {output_file}")
     logger.info("=" * 60)
 
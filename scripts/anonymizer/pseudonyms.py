@@ -0,0 +1,164 @@
+"""
+Consistent pseudonyms for anonymized entities (presidio.py --pseudonyms).
+
+Instead of one generic tag per entity type ([FAKE_PERSON]), each distinct
+value gets its own surrogate tag, so who-said-what survives anonymization:
+  - scope "case":   [FAKE_PERSON_1], [FAKE_PERSON_2], ... numbered in reading
+                    order within a case (its text columns in order), and
+                    stable across the columns of that case
+  - scope "global": [FAKE_PERSON_3fa9c2d1], a keyed HMAC of the value, stable
+                    across cases and runs for the same key (env
+                    PSEUDONYM_HMAC_KEY), not reversible without it
+
+Values are compared case- and whitespace-insensitively. PseudonymVault keeps
+the value -> surrogate map in memory (the values of a case are released once
+the case is done): the spans of a text are prefilled in one pass before the
+Presidio operators run, and the operators only do a dict lookup.
+"""
+
+import hashlib
+import hmac
+import os
+import re
+from collections import Counter
+from typing import Iterable, Optional
+
+from presidio_anonymizer.entities import OperatorConfig
+
+PSEUDONYM_SCOPES = ("case", "global")
+HMAC_KEY_ENV = "PSEUDONYM_HMAC_KEY"
+# Hex digits of the HMAC in a global surrogate
+HMAC_DIGITS = 8
+
+# Generic and pseudonymized tags, e.g. [FAKE_PERSON], [FAKE_PERSON_2], [FAKE_PERSON_3fa9c2d1]
+PSEUDONYM_TAG_REGEX = r"\[FAKE_[A-Z_]+(?:_[0-9a-f]+)?\]"
+
+_SPACES_ONLY = re.compile(r"^ +$")
+
+
+def hmac_key_from_env() -> Optional[bytes]:
+    key = os.getenv(HMAC_KEY_ENV)
+    return key.encode("utf-8") if key else None
+
+
+def _normalize(value: str) -> str:
+    return " ".join(value.split()).casefold()
+
+
+def replaced_spans(text: str, results: list) -> list[tuple[str, int, int]]:
+    """
+    (entity_type, start, end) of the values the Presidio anonymizer will
+    replace, in reading order: overlapping spans of the same type are joined,
+    spans overlapping a kept one are dropped, and same-type spans separated
+    only by spaces are merged (as AnonymizerEngine does).
+    """
+    spans: list[list] = []
+    for r in sorted(results, key=lambda r: (r.start, -r.end)):
+        if spans and r.start < spans[-1][2]:
+            if r.entity_type == spans[-1][0]:
+                spans[-1][2] = max(spans[-1][2], r.end)
+            continue
+        if spans and r.entity_type == spans[-1][0] and _SPACES_ONLY.match(text[spans[-1][2]:r.start]):
+            spans[-1][2] = r.end
+            continue
+        spans.append([r.entity_type, r.start, r.end])
+    return [tuple(span) for span in spans]
+
+
+class PseudonymVault:
+    """In-memory map of (case, tag, value) to surrogate tags."""
+
+    def __init__(self, tag_mapping: dict[str, str], scope: str = "case", key: Optional[bytes] = None):
+        if scope not in PSEUDONYM_SCOPES:
+            raise ValueError(f"Unknown pseudonym scope {scope!r} (expected one of {PSEUDONYM_SCOPES})")
+        if scope == "global" and not key:
+            raise ValueError(f"Global pseudonyms need an HMAC key (env {HMAC_KEY_ENV})")
+        self.tag_mapping = tag_mapping
+        self.scope = scope
+        self.key = key
+        # case Id ("" for global scope) -> {(tag, normalized value): surrogate}
+        self.surrogates: dict[str, dict[tuple[str, str], str]] = {}
+        self.counters: dict[str, Counter] = {}
+        # Case of the text being anonymized (read by the operators, built once per base map)
+        self.current_case = ""
+        self._operators_base: Optional[dict[str, OperatorConfig]] = None
+        self._operators: dict[str, OperatorConfig] = {}
+
+    @property
+    def key_id(self) -> str:
+        """Identifies the HMAC key in the profile version, without revealing it."""
+        if not self.key:
+            return ""
+        return hmac.new(self.key, b"key-id", hashlib.sha256).hexdigest()[:8]
+
+    def _tag(self, entity_type: str) -> str:
+        return self.tag_mapping.get(entity_type, f"FAKE_{entity_type}")
+
+    def _new_surrogate(self, case_id: str, tag: str, normalized: str) -> str:
+        if self.scope == "global":
+            digest = hmac.new(self.key, f"{tag}\0{normalized}".encode("utf-8"), hashlib.sha256)
+            return f"[{tag}_{digest.hexdigest()[:HMAC_DIGITS]}]"
+        counter = self.counters.setdefault(case_id, Counter())
+        counter[tag] += 1
+        return f"[{tag}_{counter[tag]}]"
+
+    def prefill(self, case_id: str, values: Iterable[tuple[str, str]]) -> None:
+        """Assign surrogates to (entity_type, value) pairs not yet seen, in the given order."""
+        case_id = case_id if self.scope == "case" else ""
+        surrogates = self.surrogates.setdefault(case_id, {})
+        for entity_type, value in values:
+            tag = self._tag(entity_type)
+            key = (tag, _normalize(value))
+            if key not in surrogates:
+                surrogates[key] = self._new_surrogate(case_id, tag, key[1])
+
+    def surrogate(self, case_id: str, entity_type: str, value: str) -> str:
+        """Surrogate tag of a value (assigned now if it was not prefilled)."""
+        case_id = case_id if self.scope == "case" else ""
+        tag = self._tag(entity_type)
+        key = (tag, _normalize(value))
+        surrogates = self.surrogates.setdefault(case_id, {})
+        found = surrogates.get(key)
+        if found is None:
+            found = surrogates[key] = self._new_surrogate(case_id, tag, key[1])
+        return found
+
+    def operators(self, base: dict[str, OperatorConfig]) -> dict[str, OperatorConfig]:
+        """
+        Operator map with the tag replacements of `base` turned into surrogate
+        lookups in self.current_case (not shared between threads).
+        """
+        if base is not self._operators_base:
+            self._operators = dict(base)
+            for entity_type, config in base.items():
+                if config.operator_name == "replace":
+                    def lookup(value: str, entity_type: str = entity_type) -> str:
+                        return self.surrogate(self.current_case, entity_type, value)
+                    self._operators[entity_type] = OperatorConfig("custom", {"lambda": lookup})
+            self._operators_base = base
+        return self._operators
+
+    def prepare(
+        self, case_id: str, text: str, results: list, base: dict[str, OperatorConfig]
+    ) -> dict[str, OperatorConfig]:
+        """
+        Operator map for one text of a case, with the surrogates of its values
+        prefilled in reading order (the anonymizer replaces from the end).
+        """
+        operators = self.operators(base)
+        self.current_case = case_id
+        self.prefill(case_id, (
+            (entity_type, text[start:end])
+            for entity_type, start, end in replaced_spans(text, results)
+            if operators.get(entity_type) is not base.get(entity_type)
+        ))
+        return operators
+
+    def release(self, case_id: str) -> None:
+        """Forget the values of a finished case (case scope)."""
+        if self.scope == "case":
+            self.surrogates.pop(case_id, None)
+            self.counters.pop(case_id, None)
+
+    def __len__(self) -> int:
+        return sum(len(surrogates) for surrogates in self.surrogates.values())
@@ -0,0 +1,111 @@
+"""
+Deterministic sharding of case.csv by case Id, and merge of the shard outputs.
+
+`presidio.py --shard i/N` processes only the cases whose Id hashes to shard i
+(1-based) and writes a partial output under data/anonymized/shards/. Running
+the N shards (N CI matrix jobs or N local processes) and then
+`presidio.py merge` gives the same rows as a single run: the partial outputs
+are combined, deduplicated by Id, put back in input order and appended to
+output_case.csv.
+"""
+
+import csv
+import hashlib
+import logging
+import re
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+SHARD_SUFFIX_PATTERN = re.compile(r"_shard(\d+)of(\d+)$")
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse an "i/N" shard spec (1 <= i <= N)."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{value}', expected i/N (e.g. 2/4)")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Invalid shard '{value}', expected 1 <= i <= N")
+    return index, count
+
+
+def shard_of(case_id: str, count: int) -> int:
+    """1-based shard of a case Id (stable across runs, machines and Python versions)."""
+    digest = hashlib.blake2b(case_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count + 1
+
+
+def shard_suffix(shard: tuple[int, int]) -> str:
+    """File name suffix of a shard, e.g. "_shard2of4"."""
+    return f"_shard{shard[0]}of{shard[1]}"
+
+
+def find_partials(shards_dir: Path, stem: str) -> dict[tuple[int, int], Path]:
+    """Return {(i, N): path} of the partial outputs named <stem>_shard<i>of<N>.csv."""
+    partials = {}
+    for path in sorted(shards_dir.glob(f"{stem}_shard*of*.csv")):
+        match = SHARD_SUFFIX_PATTERN.search(path.stem)
+        if match and path.stem[: match.start()] == stem:
+            partials[(int(match.group(1)), int(match.group(2)))] = path
+    return partials
+
+
+def check_complete(partials: dict[tuple[int, int], Path], expected: Optional[int] = None) -> int:
+    """
+    Check that the partial outputs cover shards 1..N of a single N.
+    Returns N; raises ValueError listing what is missing or inconsistent.
+    """
+    counts = {count for _, count in partials}
+    if not partials:
+        raise ValueError("No partial outputs found")
+    if len(counts) > 1:
+        raise ValueError(f"Partial outputs from different shard counts: {sorted(counts)}")
+    count = counts.pop()
+    if expected is not None and count != expected:
+        raise ValueError(f"Partial outputs are for {count} shards, expected {expected}")
+    missing = sorted(set(range(1, count + 1)) - {index for index, _ in partials})
+    if missing:
+        raise ValueError(f"Missing partial outputs for shards {missing} of {count}")
+    return count
+
+
+def input_order(input_path: Path) -> dict[str, int]:
+    """Position of each case Id in the input file."""
+    with open(input_path, "r", encoding="utf-8") as f:
+        return {row.get("Id", ""): i for i, row in enumerate(csv.DictReader(f))}
+
+
+def merge_partials(
+    paths: list[Path],
+    order: Optional[dict[str, int]] = None,
+) -> tuple[list[str], list[dict], int]:
+    """
+    Read partial outputs, drop duplicate Ids (first occurrence wins) and sort
+    the rows by input position when `order` is given.
+    Returns (fieldnames, rows, num_duplicates).
+    """
+    fieldnames: Optional[list[str]] = None
+    rows = []
+    seen = set()
+    duplicates = 0
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            if fieldnames is None:
+                fieldnames = list(reader.fieldnames or [])
+            elif list(reader.fieldnames or []) != fieldnames:
+                raise ValueError(f"{path} has different columns than {paths[0]}")
+            for row in reader:
+                case_id = row.get("Id", "")
+                if case_id and case_id in seen:
+                    duplicates += 1
+                    continue
+                seen.add(case_id)
+                rows.append(row)
+        logger.info(f"Read partial output {path}")
+    if order is not None:
+        rows.sort(key=lambda row: order.get(row.get("Id", ""), len(order)))
+    return fieldnames or [], rows, duplicates
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Delta-compressed store of the daily anonymized snapshots (optional, requires
+zstandard).
+
+data/anonymized/case_anonymized_YYYY_MM_DD.csv files are converted into:
+  - snapshots/manifest.json: days in order, with the sha256 of each original CSV
+  - snapshots/YYYY_MM_DD.full.json.zst: the first day (and any day whose columns
+    changed), as header + rows
+  - snapshots/YYYY_MM_DD.delta.json.zst: the other days, keyed by Id against the
+    previous day: added and changed rows, removed Ids and the row order
+
+Any day is rebuilt by applying the deltas to the last full snapshot before it.
+Conversion checks that every rebuilt CSV is byte-identical to the original
+(sha256). A day that cannot be represented exactly (duplicate or empty Ids,
+CSV that does not round-trip) is stored as raw compressed bytes instead.
+
+Days deleted with --remove-originals stay readable by the tools that take the
+daily files (csv_to_paragraphs.py, keep_classifier.py): daily_sources lists
+them under their original path and open_daily_csv rebuilds them from the
+store next to it.
+
+Usage:
+  python snapshot_store.py convert                      # Add the daily files not yet in the store
+  python snapshot_store.py convert --remove-originals   # ... and delete them once verified
+  python snapshot_store.py list
+  python snapshot_store.py extract 2026_03_04 -o /tmp/case_anonymized_2026_03_04.csv
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import logging
+import re
+import sys
+from pathlib import Path
+from typing import Optional, TextIO
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+SCRIPT_DIR = Path(__file__).parent
+OUTPUT_DIR = SCRIPT_DIR.parent.parent / "data" / "anonymized"
+STORE_DIR = OUTPUT_DIR / "snapshots"
+MANIFEST_NAME = "manifest.json"
+
+# Bumped when the store layout changes
+STORE_VERSION = 1
+ZSTD_LEVEL = 19
+DAILY_FILE_PATTERN = re.compile(r"^case_anonymized_(\d{4}_\d{2}_\d{2})\.csv$")
+LINE_TERMINATORS = ["\r\n", "\n"]
+
+
+def store_available() -> bool:
+    return zstandard is not None
+
+
+def _compress(document) -> bytes:
+    payload = document if isinstance(document, bytes) else json.dumps(document, ensure_ascii=False).encode("utf-8")
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(payload)
+
+
+def _decompress(path: Path, raw: bool = False):
+    data = zstandard.ZstdDecompressor().decompress(path.read_bytes())
+    return data if raw else json.loads(data)
+
+
+def parse_snapshot(data: bytes) -> Optional[tuple[list[str], list[list[str]], str]]:
+    """
+    (fieldnames, rows, line terminator) of a daily CSV, or None if writing them
+    back with csv.writer would not give the same bytes.
+    """
+    text = data.decode("utf-8")
+    records = list(csv.reader(io.StringIO(text, newline="")))
+    if not records:
+        return None
+    for lineterminator in LINE_TERMINATORS:
+        if render_snapshot(records[0], records[1:], lineterminator) == data:
+            return records[0], records[1:], lineterminator
+    return None
+
+
+def render_snapshot(fieldnames: list[str], rows: list[list[str]], lineterminator: str = "\r\n") -> bytes:
+    """CSV bytes of a snapshot (same writer as presidio.py's daily output)."""
+    out = io.StringIO(newline="")
+    writer = csv.writer(out, lineterminator=lineterminator)
+    writer.writerow(fieldnames)
+    writer.writerows(rows)
+    return out.getvalue().encode("utf-8")
+
+
+def diff_snapshots(
+    previous: dict[str, list[str]],
+    fieldnames: list[str],
+    rows: list[list[str]],
+) -> Optional[dict]:
+    """Delta from the previous day's rows by Id, or None if rows are not keyed by a unique Id."""
+    if "Id" not in fieldnames:
+        return None
+    id_pos = fieldnames.index("Id")
+    order = [row[id_pos] if len(row) > id_pos else "" for row in rows]
+    if "" in order or len(set(order)) != len(order):
+        return None
+    current = dict(zip(order, rows))
+    return {
+        "order": order,
+        "added": {case_id: row for case_id, row in current.items() if case_id not in previous},
+        "changed": {
+            case_id: row for case_id, row in current.items()
+            if case_id in previous and previous[case_id] != row
+        },
+        "removed": [case_id for case_id in previous if case_id not in current],
+    }
+
+
+class SnapshotStore:
+    """Manifest + full/delta files of the daily snapshots."""
+
+    def __init__(self, store_dir: Path = STORE_DIR):
+        if not store_available():
+            raise RuntimeError("zstandard is not installed (pip install zstandard)")
+        self.store_dir = store_dir
+        self.manifest_path = store_dir / MANIFEST_NAME
+        if self.manifest_path.exists():
+            self.manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+            if self.manifest.get("version") != STORE_VERSION:
+                raise ValueError(f"Unsupported snapshot store version in {self.manifest_path}")
+        else:
+            self.manifest = {"version": STORE_VERSION, "days": []}
+        # Rows by Id of the last day rebuilt (reused when days are read in order)
+        self._state: Optional[tuple[int, list[str], dict[str, list[str]], list[str]]] = None
+
+    def dates(self) -> list[str]:
+        return [day["date"] for day in self.manifest["days"]]
+
+    def _day_index(self, date: str) -> int:
+        for i, day in enumerate(self.manifest["days"]):
+            if day["date"] == date:
+                return i
+        raise KeyError(f"No snapshot for {date}")
+
+    def _rebuild(self, index: int) -> tuple[list[str], dict[str, list[str]], list[str]]:
+        """(fieldnames, rows by Id, Id order) of day `index` (keyed days only)."""
+        days = self.manifest["days"]
+        start = index
+        if self._state is not None and self._state[0] <= index:
+            start = self._state[0]
+        while days[start]["kind"] != "full" and not (self._state is not None and self._state[0] == start):
+            start -= 1
+        if self._state is not None and self._state[0] == start:
+            _, fieldnames, rows, order = self._state
+            rows = dict(rows)
+        else:
+            document = _decompress(self.store_dir / days[start]["file"])
+            fieldnames = document["fieldnames"]
+            id_pos = fieldnames.index("Id")
+            rows = {row[id_pos]: row for row in document["rows"]}
+            order = [row[id_pos] for row in document["rows"]]
+        for i in range(start + 1, index + 1):
+            day = days[i]
+            if day["kind"] == "raw":
+                # Always followed by a full day (a raw day is never the base of a delta)
+                continue
+            if day["kind"] == "full":
+                document = _decompress(self.store_dir / day["file"])
+                fieldnames = document["fieldnames"]
+                id_pos = fieldnames.index("Id")
+                rows = {row[id_pos]: row for row in document["rows"]}
+                order = [row[id_pos] for row in document["rows"]]
+                continue
+            delta = _decompress(self.store_dir / day["file"])
+            for case_id in delta["removed"]:
+                del rows[case_id]
+            rows.update(delta["added"])
+            rows.update(delta["changed"])
+            order = delta["order"]
+        self._state = (index, fieldnames, rows, order)
+        return fieldnames, rows, order
+
+    def csv_bytes(self, date: str) -> bytes:
+        """The original daily CSV of a date, rebuilt from the store."""
+        index = self._day_index(date)
+        day = self.manifest["days"][index]
+        if day["kind"] == "raw":
+            return _decompress(self.store_dir / day["file"], raw=True)
+        fieldnames, rows, order = self._rebuild(index)
+        return render_snapshot(fieldnames, [rows[case_id] for case_id in order], day["lineterminator"])
+
+    def _last_keyed_state(self) -> Optional[tuple[list[str], dict[str, list[str]]]]:
+        """Rows of the last day, if it can be the base of a delta."""
+        days = self.manifest["days"]
+        if not days or days[-1]["kind"] == "raw":
+            return None
+        fieldnames, rows, _ = self._rebuild(len(days) - 1)
+        return fieldnames, rows
+
+    def add(self, date: str, data: bytes) -> dict:
+        """Append a day (after the last one) and return its manifest entry."""
+        if self.manifest["days"] and date <= self.manifest["days"][-1]["date"]:
+            raise ValueError(f"{date} is not after the last stored day {self.manifest['days'][-1]['date']}")
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        entry = {"date": date, "sha256": hashlib.sha256(data).hexdigest(), "bytes": len(data)}
+        parsed = parse_snapshot(data)
+        previous = self._last_keyed_state() if parsed else None
+        delta = None
+        if parsed and previous and previous[0] == parsed[0]:
+            delta = diff_snapshots(previous[1], parsed[0], parsed[1])
+        if delta is not None:
+            entry.update(kind="delta", file=f"{date}.delta.json.zst", lineterminator=parsed[2],
+                         added=len(delta["added"]), changed=len(delta["changed"]), removed=len(delta["removed"]))
+            payload = _compress(delta)
+        elif parsed and diff_snapshots({}, parsed[0], parsed[1]) is not None:
+            entry.update(kind="full", file=f"{date}.full.json.zst", lineterminator=parsed[2],
+                         added=len(parsed[1]), changed=0, removed=0)
+            payload = _compress({"fieldnames": parsed[0], "rows": parsed[1]})
+        else:
+            entry.update(kind="raw", file=f"{date}.csv.zst")
+            payload = _compress(data)
+        (self.store_dir / entry["file"]).write_bytes(payload)
+        entry["stored_bytes"] = len(payload)
+        self.manifest["days"].append(entry)
+        self._state = None
+        if self.csv_bytes(date) != data:
+            # Never keep a day that does not rebuild exactly
+            self.manifest["days"].pop()
+            (self.store_dir / entry["file"]).unlink()
+            raise ValueError(f"Snapshot {date} does not rebuild byte-identical, not stored")
+        self._save_manifest()
+        return entry
+
+    def _save_manifest(self) -> None:
+        tmp_path = self.manifest_path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(self.manifest, indent=2), encoding="utf-8")
+        tmp_path.replace(self.manifest_path)
+
+
+def daily_files(source_dir: Path) -> list[tuple[str, Path]]:
+    """(date, path) of the daily outputs in date order."""
+    files = []
+    for path in source_dir.glob("case_anonymized_*.csv"):
+        match = DAILY_FILE_PATTERN.match(path.name)
+        if match:
+            files.append((match.group(1), path))
+    return sorted(files)
+
+
+def stored_dates(store_dir: Path) -> list[str]:
+    """Days in the manifest of a store (read without zstandard), [] if there is none."""
+    manifest_path = store_dir / MANIFEST_NAME
+    if not manifest_path.exists():
+        return []
+    return [day["date"] for day in json.loads(manifest_path.read_text(encoding="utf-8"))["days"]]
+
+
+def daily_sources(source_dir: Path) -> list[Path]:
+    """
+    Paths of the daily outputs in date order, including the days only kept in
+    the store of source_dir (their path does not exist: read them with
+    open_daily_csv).
+    """
+    paths = {date: path for date, path in daily_files(source_dir)}
+    for date in stored_dates(source_dir / STORE_DIR.name):
+        paths.setdefault(date, source_dir / f"case_anonymized_{date}.csv")
+    return [paths[date] for date in sorted(paths)]
+
+
+def _stored_date(path: Path) -> Optional[str]:
+    match = DAILY_FILE_PATTERN.match(path.name)
+    if match and match.group(1) in stored_dates(path.parent / STORE_DIR.name):
+        return match.group(1)
+    return None
+
+
+def daily_file_available(path: Path) -> bool:
+    """Whether a daily file exists or can be rebuilt from the store next to it."""
+    return path.exists() or _stored_date(path) is not None
+
+
+# Stores opened by open_daily_csv, kept so that days read in order reuse the last rebuild
+_open_stores: dict[Path, "SnapshotStore"] = {}
+
+
+def open_daily_csv(path: Path, newline: Optional[str] = None) -> TextIO:
+    """
+    Open a daily CSV for reading: the file itself, or the day rebuilt from the
+    store next to it once the original was removed. Raises FileNotFoundError
+    if neither exists, RuntimeError if the store needs zstandard.
+    """
+    if path.exists():
+        return open(path, "r", encoding="utf-8", newline=newline)
+    date = _stored_date(path)
+    if date is None:
+        raise FileNotFoundError(f"Daily file not found and not in the snapshot store: {path}")
+    store_dir = path.parent / STORE_DIR.name
+    if store_dir not in _open_stores:
+        _open_stores[store_dir] = SnapshotStore(store_dir)
+    return io.StringIO(_open_stores[store_dir].csv_bytes(date).decode("utf-8"), newline=newline)
+
+
+def convert(store: SnapshotStore, source_dir: Path, remove_originals: bool = False) -> int:
+    """Add the daily files newer than the last stored day. Returns the number added."""
+    stored = set(store.dates())
+    last = max(stored, default="")
+    added = 0
+    for date, path in daily_files(source_dir):
+        if date in stored:
+            if remove_originals and store.csv_bytes(date) == path.read_bytes():
+                path.unlink()
+                logger.info(f"{path.name}: already stored and identical, removed")
+            continue
+        if date < last:
+            logger.warning(f"{path.name}: older than the last stored day {last}, skipped")
+            continue
+        entry = store.add(date, path.read_bytes())
+        added += 1
+        last = date
+        logger.info(
+            f"{path.name}: {entry['kind']} ({entry.get('added', '-')} added, {entry.get('changed', '-')} changed, "
+            f"{entry.get('removed', '-')} removed), {entry['bytes']} -> {entry['stored_bytes']} bytes"
+        )
+        if remove_originals:
+            path.unlink()
+    return added
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Delta-compressed (zstd) store of the daily case_anonymized_YYYY_MM_DD.csv snapshots",
+    )
+    parser.add_argument("--store", type=Path, default=STORE_DIR, help=f"Store directory (default: {STORE_DIR})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert_parser = subparsers.add_parser("convert", help="Add the daily files not yet in the store")
+    convert_parser.add_argument("--source", type=Path, default=OUTPUT_DIR,
+                                help=f"Directory of the daily files (default: {OUTPUT_DIR})")
+    convert_parser.add_argument("--remove-originals", action="store_true",
+                                help="Delete each daily file once it is stored and verified")
+    subparsers.add_parser("list", help="List the stored days")
+    extract_parser = subparsers.add_parser("extract", help="Rebuild the CSV of a day")
+    extract_parser.add_argument("date", metavar="YYYY_MM_DD")
+    extract_parser.add_argument("--output", "-o", type=Path,
+                                help="Output CSV (default: stdout)")
+    return parser.parse_args()
+
+
+def main() -> int:
+    """Main entry point."""
+    args = parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    if not store_available():
+        logger.error("zstandard is not installed (pip install zstandard)")
+        return 1
+    store = SnapshotStore(args.store)
+
+    if args.command == "convert":
+        try:
+            added = convert(store, args.source, args.remove_originals)
+        except ValueError as e:
+            logger.error(str(e))
+            return 1
+        days = store.manifest["days"]
+        original = sum(day["bytes"] for day in days)
+        stored = sum(day["stored_bytes"] for day in days)
+        logger.info(f"Added {added} days; store holds {len(days)} days, {original} -> {stored} bytes")
+    elif args.command == "list":
+        for day in store.manifest["days"]:
+            print(f"{day['date']}  {day['kind']:<5}  {day['bytes']:>10} -> {day['stored_bytes']:>9} bytes  "
+                  f"+{day.get('added', '-')} ~{day.get('changed', '-')} -{day.get('removed', '-')}")
+    elif args.command == "extract":
+        try:
+            data = store.csv_bytes(args.date)
+        except KeyError as e:
+            logger.error(str(e.args[0]))
+            return 1
+        if args.output:
+            args.output.write_bytes(data)
+            logger.info(f"Wrote {args.output} ({len(data)} bytes)")
+        else:
+            sys.stdout.buffer.write(data)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
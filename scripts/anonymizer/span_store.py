@@ -0,0 +1,123 @@
+"""
+Sidecar store of Presidio analyzer results, keyed by a hash of the cell text.
+
+Every analyzed cell stores its spans as (entity_type, start, end, score,
+recognizer). With the spans on disk, operators (TAG_MAPPING, codice tesoriera
+redaction) and the Phase 2 filters can be re-applied without loading the spaCy
+models (presidio.py --reanonymize). The store is bound to the analysis version
+of the profile (entities, NLP models, recognizer patterns) and is cleared when
+that changes.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Optional
+
+from presidio_analyzer import RecognizerResult
+
+logger = logging.getLogger(__name__)
+
+# Cells written between two SQLite commits
+COMMIT_EVERY = 200
+
+# Seconds to wait for the write lock (shards running in parallel share the store)
+LOCK_TIMEOUT = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS spans (
+    cell_hash BLOB PRIMARY KEY,
+    spans_json TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def cell_hash(text: str) -> bytes:
+    """Key of a cell in the store."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class SpanStoreMissError(KeyError):
+    """The store has no spans for a cell and no analyzer is available."""
+
+
+class SpanStore:
+    """SQLite-backed map from cell hash to analyzer spans."""
+
+    def __init__(self, path: Path, analysis_version: str):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Opened at startup and used by the batch worker thread in anonymize_server.py
+        self.conn = sqlite3.connect(path, timeout=LOCK_TIMEOUT, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._pending = 0
+
+        stored = self.conn.execute(
+            "SELECT value FROM meta WHERE key = 'analysis_version'"
+        ).fetchone()
+        if stored is None or stored[0] != analysis_version:
+            if stored is not None:
+                logger.warning(
+                    f"Span store {path} was built with analysis version {stored[0]}, "
+                    f"current is {analysis_version}: clearing it"
+                )
+            with self.conn:
+                self.conn.execute("DELETE FROM spans")
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('analysis_version', ?)",
+                    (analysis_version,),
+                )
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM spans").fetchone()[0]
+
+    def get(self, text: str) -> Optional[list[RecognizerResult]]:
+        """Return the stored analyzer results for text, or None if not stored."""
+        found = self.conn.execute(
+            "SELECT spans_json FROM spans WHERE cell_hash = ?", (cell_hash(text),)
+        ).fetchone()
+        if found is None:
+            return None
+        return [
+            RecognizerResult(
+                entity_type=entity_type,
+                start=start,
+                end=end,
+                score=score,
+                recognition_metadata={RecognizerResult.RECOGNIZER_NAME_KEY: recognizer},
+            )
+            for entity_type, start, end, score, recognizer in json.loads(found[0])
+        ]
+
+    def put(self, text: str, results: list[RecognizerResult]) -> None:
+        """Store the analyzer results for text."""
+        spans = [
+            [
+                r.entity_type,
+                r.start,
+                r.end,
+                round(r.score, 4),
+                (r.recognition_metadata or {}).get(RecognizerResult.RECOGNIZER_NAME_KEY, ""),
+            ]
+            for r in results
+        ]
+        self.conn.execute(
+            "INSERT OR REPLACE INTO spans (cell_hash, spans_json) VALUES (?, ?)",
+            (cell_hash(text), json.dumps(spans, ensure_ascii=False, separators=(",", ":"))),
+        )
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.flush()
+
+    def flush(self) -> None:
+        self.conn.commit()
+        self._pending = 0
+
+    def close(self) -> None:
+        self.flush()
+        self.conn.close()
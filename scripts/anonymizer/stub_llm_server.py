@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible stub of the chat-completions API for offline runs.
+
+Speaks POST /v1/chat/completions (and /chat/completions) and answers:
+  - anonymizer batches ([RIGA n] ... [/RIGA n]) with the [RISULTATO n] /
+    MANTIENI / TESTO contract of presidio.py, or with its JSON format when
+    the request sets response_format={"type": "json_object"}; with
+    --correction-rate, that fraction of rows also gets a correction (a
+    capitalized word outside tags reported as a missed FAKE_PERSON)
+  - any other prompt (e.g. the langfuse-dataviz.py classifier) with a category
+
+Latency, 5xx errors, 429 rate limits and truncated responses can be injected.
+Every decision is derived from --seed, the request body and the attempt number
+for that body, so runs are reproducible and retries of a failed request behave
+the same way across runs.
+
+Usage:
+  python stub_llm_server.py --port 8089
+  python stub_llm_server.py --latency 0.5 --jitter 0.2 --error-rate 0.05 --rate-limit-rate 0.1
+  python stub_llm_server.py --correction-rate 0.1
+
+  OVH_API_URL=http://127.0.0.1:8089/v1 OVH_API_KEY=stub python presidio.py --test 50
+  OPENAI_API_URL=http://127.0.0.1:8089/v1/chat/completions python ../langfuse-dataviz.py
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)s | %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8089
+DEFAULT_CATEGORIES = [
+    "Migrazione e Cloud",
+    "Asseverazione",
+    "PA Digitale 2026",
+    "Scadenze e Tempistiche",
+    "Altro",
+]
+
+ROW_PATTERN = re.compile(r"\[RIGA\s*(\d+)\]\n?(.*?)\n?\[/RIGA\s*\1\]", re.DOTALL)
+FIELD_PATTERN = re.compile(r"\[CAMPO ([^\]]+)\]\n?(.*?)\n?\[/CAMPO \1\]", re.DOTALL)
+TAG_PATTERN = re.compile(r"\[[A-Z][A-Za-z0-9_]*\]")
+# Capitalized words the stub reports as missed names
+CORRECTION_CANDIDATE_PATTERN = re.compile(
+    r"\b[A-ZÀÈÉÌÒÙ][a-zàèéìòù']{2,}(?:[ \t]+[A-ZÀÈÉÌÒÙ][a-zàèéìòù']{2,})*"
+)
+CORRECTION_TAG = "FAKE_PERSON"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def pick_correction(text: str, rng: random.Random) -> tuple[Optional[str], Optional[str]]:
+    """
+    (field, original) of a capitalized word run outside tags in a row, as a
+    model would report a name Presidio missed; field is None for single-field
+    rows. (None, None) if the row has no candidate.
+    """
+    fields = FIELD_PATTERN.findall(text) or [(None, text)]
+    candidates = [
+        (field, original)
+        for field, field_text in fields
+        for original in CORRECTION_CANDIDATE_PATTERN.findall(TAG_PATTERN.sub("\n", field_text))
+    ]
+    return rng.choice(candidates) if candidates else (None, None)
+
+
+def build_anonymizer_reply(rows: list[tuple[str, str]], rng: random.Random, keep_rate: float,
+                           json_mode: bool = False, correction_rate: float = 0.0) -> str:
+    """
+    Answer (row_id, text) pairs with the [RISULTATO n] contract of presidio.py,
+    or with its JSON span-diff format when json_mode is set. A correction_rate
+    fraction of the rows gets one correction.
+    """
+    results = []
+    for row_id, text in rows:
+        keep = rng.random() < keep_rate
+        field, original = None, None
+        if correction_rate and rng.random() < correction_rate:
+            field, original = pick_correction(text, rng)
+        results.append((row_id, text, keep, field, original))
+
+    if json_mode:
+        entries = []
+        for row_id, _text, keep, field, original in results:
+            replacements = []
+            if original:
+                replacement = {"originale": original, "tag": CORRECTION_TAG}
+                if field:
+                    replacement["campo"] = field
+                replacements.append(replacement)
+            entries.append({"riga": int(row_id), "mantieni": keep, "sostituzioni": replacements})
+        return json.dumps({"risultati": entries})
+    blocks = []
+    for row_id, text, keep, field, original in results:
+        # The text format carries the Description only
+        corrected = text.replace(original, f"[{CORRECTION_TAG}]", 1) if original and not field else "INVARIATO"
+        blocks.append(
+            f"[RISULTATO {row_id}]\nMANTIENI: {'SI' if keep else 'NO'}\nTESTO: {corrected}\n[/RISULTATO {row_id}]"
+        )
+    return "\n\n".join(blocks)
+
+
+def build_reply(messages: list[dict], rng: random.Random, keep_rate: float = 1.0,
+                categories: list[str] = DEFAULT_CATEGORIES, json_mode: bool = False,
+                correction_rate: float = 0.0) -> str:
+    """Build the assistant content for a chat-completions request."""
+    user_content = messages[-1].get("content", "") if messages else ""
+    rows = ROW_PATTERN.findall(user_content)
+    if rows:
+        return build_anonymizer_reply(rows, rng, keep_rate, json_mode, correction_rate)
+    return rng.choice(categories)
+
+
+class StubConfig:
+    """Fault-injection settings and shared counters of the stub server."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.seed = args.seed
+        self.latency = args.latency
+        self.jitter = args.jitter
+        self.error_rate = args.error_rate
+        self.rate_limit_rate = args.rate_limit_rate
+        self.truncate_rate = args.truncate_rate
+        self.keep_rate = args.keep_rate
+        self.correction_rate = args.correction_rate
+        self.retry_after = args.retry_after
+        self.lock = threading.Lock()
+        self.attempts: Counter = Counter()
+        self.stats: Counter = Counter()
+
+    def rng_for(self, body: bytes) -> random.Random:
+        """Deterministic RNG for the n-th attempt of a given request body."""
+        digest = hashlib.sha256(body).hexdigest()
+        with self.lock:
+            self.attempts[digest] += 1
+            attempt = self.attempts[digest]
+        return random.Random(f"{self.seed}:{digest}:{attempt}")
+
+    def count(self, key: str) -> None:
+        with self.lock:
+            self.stats[key] += 1
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """HTTP handler implementing the subset of the OpenAI API used by the scripts."""
+
+    server_version = "StubLLM/1.0"
+    config: StubConfig
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def _send_json(self, status: int, payload: dict, headers: dict | None = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str, error_type: str, headers: dict | None = None) -> None:
+        self._send_json(status, {"error": {"message": message, "type": error_type}}, headers)
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/health", "/v1/health"):
+            self._send_json(200, {"status": "ok"})
+        elif self.path.rstrip("/") in ("/stats", "/v1/stats"):
+            with self.config.lock:
+                self._send_json(200, dict(self.config.stats))
+        elif self.path.rstrip("/") in ("/models", "/v1/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+        else:
+            self._send_error(404, f"Unknown path {self.path}", "not_found")
+
+    def do_POST(self):
+        if self.path.rstrip("/") not in ("/chat/completions", "/v1/chat/completions"):
+            self._send_error(404, f"Unknown path {self.path}", "not_found")
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        try:
+            request = json.loads(body)
+        except json.JSONDecodeError:
+            self._send_error(400, "Invalid JSON body", "invalid_request_error")
+            return
+
+        config = self.config
+        config.count("requests")
+        rng = config.rng_for(body)
+
+        delay = max(0.0, config.latency + rng.uniform(-config.jitter, config.jitter))
+        if delay:
+            time.sleep(delay)
+
+        if rng.random() < config.rate_limit_rate:
+            config.count("rate_limited")
+            self._send_error(
+                429,
+                "Rate limit reached (stub)",
+                "rate_limit_error",
+                headers={"Retry-After": str(config.retry_after)},
+            )
+            return
+        if rng.random() < config.error_rate:
+            config.count("errors")
+            self._send_error(500, "Internal server error (stub)", "server_error")
+            return
+
+        messages = request.get("messages", [])
+        json_mode = (request.get("response_format") or {}).get("type") == "json_object"
+        content = build_reply(
+            messages, rng, keep_rate=config.keep_rate, json_mode=json_mode,
+            correction_rate=config.correction_rate,
+        )
+        finish_reason = "stop"
+        if rng.random() < config.truncate_rate:
+            config.count("truncated")
+            content = content[: max(1, int(len(content) * rng.uniform(0.2, 0.8)))]
+            finish_reason = "length"
+        config.count("completed")
+
+        prompt_tokens = sum(estimate_tokens(m.get("content", "")) for m in messages)
+        completion_tokens = estimate_tokens(content)
+        self._send_json(
+            200,
+            {
+                "id": f"chatcmpl-stub-{rng.getrandbits(32):08x}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": finish_reason,
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            },
+        )
+
+
+def make_server(args: argparse.Namespace) -> ThreadingHTTPServer:
+    """Create (but do not start) the stub server."""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": StubConfig(args)})
+    return ThreadingHTTPServer((args.host, args.port), handler)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Local OpenAI-compatible stub for offline presidio.py / langfuse-dataviz.py runs",
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Bind address (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port (default: {DEFAULT_PORT})")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for all injected behaviour (default: 0)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform latency jitter (+/- seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a 500 response")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Probability of a 429 response")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429 (default: 1)")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="Probability of a truncated response")
+    parser.add_argument("--keep-rate", type=float, default=1.0, help="Probability of MANTIENI: SI per row (default: 1.0)")
+    parser.add_argument("--correction-rate", type=float, default=0.0,
+                        help="Probability that a row gets a correction (missed name) (default: 0.0)")
+    return parser.parse_args(argv)
+
+
+def main() -> int:
+    """Main entry point."""
+    args = parse_args()
+    server = make_server(args)
+    logger.info(f"Stub LLM server listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
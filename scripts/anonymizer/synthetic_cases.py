@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Synthetic Salesforce-like cases with the same schema as input/case.csv.
+
+Texts are built from Italian templates filled with faker (it_IT) PII: names,
+codici fiscali, IBANs, phone numbers, emails, addresses and codici tesoriera.
+Every inserted PII value is recorded as a labelled span, so the same generator
+feeds both the performance benchmarks and the recall evaluation.
+
+Usage:
+  python synthetic_cases.py --rows 1000 --output /tmp/case_1k.csv
+  python synthetic_cases.py --rows 100000 --seed 7 --output /tmp/case_100k.csv
+"""
+
+import argparse
+import csv
+import random
+import sys
+from pathlib import Path
+from typing import Iterator
+
+from faker import Faker
+
+# Same column order as input/case.csv
+CASE_FIELDNAMES = [
+    "_",
+    "Id",
+    "CaseNumber",
+    "Ambito__c",
+    "Categoria__c",
+    "Dettaglio_richiesta__c",
+    "Misura__c",
+    "Subject",
+    "Description",
+    "Risoluzione__c",
+    "Commenti_Ente__c",
+    "Ulteriori_informazioni_a_supporto__c",
+]
+
+AMBITI = [
+    "Processo di adesione e monitoraggio",
+    "Amministrazione",
+    "Malfunzionamenti Piattaforma",
+    "Implementazione e sviluppo progetto",
+]
+DETTAGLI = [
+    "Controlli",
+    "Rendicontazione e documenti giustificativi",
+    "Candidatura",
+    "Variazioni e rinunce",
+    "Contrattualizzazione fornitori",
+]
+MISURE = [
+    "1.2 Abilitazione e facilitazione migrazione al Cloud",
+    "1.4.1 Esperienza dei servizi pubblici",
+    "1.4.3 Adozione appIO",
+    "1.4.4 Estensione dell'utilizzo delle piattaforme nazionali di identità digitale",
+    "",
+]
+COMUNI = [
+    "Roma", "Milano", "Napoli", "Torino", "Bari", "Lecce", "Trento", "Perugia",
+    "Ancona", "Cagliari", "Sassari", "Matera", "Collalto", "Buscoldo", "Savoca",
+]
+SUBJECTS = [
+    "Caricamento documentazione",
+    "Richiesta di erogazione",
+    "Problema accesso piattaforma",
+    "Variazione referente",
+    "Informazioni su asseverazione",
+    "PNRR ABILITAZIONI AL CLOUD PER LE PA LOCALI",
+]
+
+# Entity labels use the Presidio entity types of presidio.ENTITY_TYPES
+DESCRIPTION_TEMPLATES = [
+    "Buongiorno, sono {PERSON} del Comune di {CITY}. Non riesco a caricare il contratto "
+    "allo step 3 della piattaforma, il sistema restituisce un errore generico.",
+    "Salve, in qualità di referente ({PERSON}, tel. {PHONE_NUMBER}) chiediamo lo stato "
+    "della richiesta di erogazione inviata il mese scorso.",
+    "Si comunica che il nuovo IBAN dell'ente è {IBAN_CODE}. Si prega di aggiornare "
+    "l'anagrafica prima della liquidazione del contributo.",
+    "Il responsabile del procedimento {PERSON}, codice fiscale {IT_FISCAL_CODE}, "
+    "chiede come modificare il referente di progetto.\nGrazie, {PERSON}",
+    "Buongiorno,\nabbiamo ricevuto la comunicazione di esito negativo dell'asseverazione. "
+    "Potete ricontattarci all'indirizzo {EMAIL_ADDRESS} o al numero {PHONE_NUMBER}?",
+    "Il conto di tesoreria {CODICE_TESORIERA} risulta chiuso. La sede legale è in "
+    "{LOCATION}. Come possiamo procedere con il pagamento?",
+    "BUONGIORNO, CHIEDIAMO SE CI SONO ULTERIORI PROBLEMATICHE DA RISOLVERE SUL PROGETTO "
+    "VISTO CHE NON ABBIAMO ANCORA RICEVUTO IL FINANZIAMENTO.\n\nF.TO {PERSON}",
+]
+RISOLUZIONE_TEMPLATES = [
+    "<p>Gentile {PERSON}, grazie per averci contattato. Per procedere con il caricamento "
+    "della documentazione ti invitiamo ad accedere allo step 3 di gestione del progetto "
+    "e selezionare il soggetto realizzatore dalla lista.</p>",
+    "<p>Gentile {PERSON}, il contributo concesso è una somma forfettaria (lump sum) "
+    "erogata in un'unica soluzione a seguito del perfezionamento delle attività oggetto "
+    "del finanziamento, come disposto dagli avvisi.</p>",
+    "<p>Gentile utente, la richiesta è in lavorazione. Si prega di attendere.</p>",
+    "<p>Gentile {PERSON}, la tua segnalazione è stata risolta.</p>",
+    "<p>Gentile {PERSON}, per modificare il referente è necessario che il legale "
+    "rappresentante acceda all'area riservata e aggiorni i dati di contatto nella "
+    "sezione Anagrafica ente, allegando l'atto di nomina firmato digitalmente.</p>",
+    "",
+]
+COMMENTI_TEMPLATES = [
+    "",
+    "",
+    "",
+    "Grazie per il supporto. {PERSON}",
+    "Il problema persiste, contattare {EMAIL_ADDRESS}.",
+]
+
+
+class SyntheticCaseGenerator:
+    """Deterministic generator of synthetic cases (same seed, same output)."""
+
+    def __init__(self, seed: int = 42):
+        self.rng = random.Random(seed)
+        self.fake = Faker("it_IT")
+        self.fake.seed_instance(seed)
+
+    def _pii(self, entity_type: str) -> str:
+        """Return a fake value for a Presidio entity type."""
+        fake = self.fake
+        if entity_type == "PERSON":
+            return fake.name()
+        if entity_type == "PHONE_NUMBER":
+            return fake.phone_number()
+        if entity_type == "IBAN_CODE":
+            return fake.iban()
+        if entity_type == "IT_FISCAL_CODE":
+            return fake.ssn()
+        if entity_type == "EMAIL_ADDRESS":
+            return fake.email()
+        if entity_type == "LOCATION":
+            return fake.street_address()
+        if entity_type == "CODICE_TESORIERA":
+            prefix = self.rng.choice(["TU", "TS", "BDI"])
+            return f"{prefix}-{self.rng.randint(1, 999)}-{self.rng.randint(0, 999999):06d}"
+        if entity_type == "CITY":
+            # faker's it_IT city() is not reproducible across PYTHONHASHSEED values
+            return self.rng.choice(COMUNI)
+        raise ValueError(f"Unknown entity type: {entity_type}")
+
+    def fill(self, template: str) -> tuple[str, list[tuple[str, int, int]]]:
+        """
+        Fill a {ENTITY} template with fake values.
+        Returns (text, spans) with spans as (entity_type, start, end).
+        CITY placeholders are filled but not labelled (municipalities are kept).
+        """
+        parts = []
+        spans = []
+        pos = 0
+        rest = template
+        while True:
+            open_idx = rest.find("{")
+            if open_idx < 0:
+                parts.append(rest)
+                break
+            close_idx = rest.index("}", open_idx)
+            literal = rest[:open_idx]
+            parts.append(literal)
+            pos += len(literal)
+            entity_type = rest[open_idx + 1:close_idx]
+            value = self._pii(entity_type)
+            parts.append(value)
+            if entity_type != "CITY":
+                spans.append((entity_type, pos, pos + len(value)))
+            pos += len(value)
+            rest = rest[close_idx + 1:]
+        return "".join(parts), spans
+
+    def labelled_text(self) -> tuple[str, list[tuple[str, int, int]]]:
+        """Return one Description-like text with its PII spans."""
+        return self.fill(self.rng.choice(DESCRIPTION_TEMPLATES + RISOLUZIONE_TEMPLATES[:-1]))
+
+    def case(self, index: int) -> dict[str, str]:
+        """Return one synthetic case row (index only drives Id/CaseNumber)."""
+        rng = self.rng
+        description, _ = self.fill(rng.choice(DESCRIPTION_TEMPLATES))
+        risoluzione, _ = self.fill(rng.choice(RISOLUZIONE_TEMPLATES))
+        commenti, _ = self.fill(rng.choice(COMMENTI_TEMPLATES))
+        return {
+            "_": "[Case]",
+            "Id": f"5007Q{index:013X}",
+            "CaseNumber": f"{1000000 + index:08d}",
+            "Ambito__c": rng.choice(AMBITI),
+            "Categoria__c": "Altro - Servizi Aggiunti",
+            "Dettaglio_richiesta__c": rng.choice(DETTAGLI),
+            "Misura__c": rng.choice(MISURE),
+            "Subject": rng.choice(SUBJECTS),
+            "Description": description,
+            "Risoluzione__c": risoluzione,
+            "Commenti_Ente__c": commenti,
+            "Ulteriori_informazioni_a_supporto__c": "",
+        }
+
+    def cases(self, n: int) -> Iterator[dict[str, str]]:
+        for i in range(n):
+            yield self.case(i)
+
+
+def write_case_csv(path: Path, n: int, seed: int = 42) -> Path:
+    """Write n synthetic cases to path in the input/case.csv format."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    generator = SyntheticCaseGenerator(seed)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CASE_FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(generator.cases(n))
+    return path
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic cases in the input/case.csv format.",
+    )
+    parser.add_argument("--rows", "-n", type=int, default=1000, help="Number of cases (default: 1000)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    parser.add_argument("--output", "-o", type=Path, required=True, help="Output CSV path")
+    args = parser.parse_args()
+
+    write_case_csv(args.output, args.rows, args.seed)
+    print(f"Wrote {args.rows} synthetic cases to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Length-bounded analysis of long cells (email threads pasted in Description or
+Risoluzione__c).
+
+A cell longer than CHUNK_MAX_CHARS is split into windows of at most that
+length, cut at the strongest boundary available (blank line, line break,
+end of sentence, whitespace). Consecutive windows share between
+CHUNK_OVERLAP_CHARS / 2 and CHUNK_OVERLAP_CHARS characters, so an entity
+shorter than that and cut by the edge of one window is whole, and away from
+the edges, in the neighbouring one. The windows go through spaCy in one
+batch, and their spans are shifted back to cell offsets and merged. Spans
+touching a cut edge of their window (ignoring whitespace) are dropped, since
+they may be truncated.
+"""
+
+import re
+
+from presidio_analyzer import AnalyzerEngine, BatchAnalyzerEngine, EntityRecognizer, RecognizerResult
+
+# Cells up to this length are analyzed as a single doc
+CHUNK_MAX_CHARS = 2000
+# Characters shared by consecutive windows (half of it longer than any single entity)
+CHUNK_OVERLAP_CHARS = 200
+
+# Window boundaries, strongest first
+BOUNDARY_PATTERNS = [
+    re.compile(r"\n[ \t]*\n\s*"),  # paragraph
+    re.compile(r"\n\s*"),  # line
+    re.compile(r"[.!?;:]\s+"),  # sentence
+    re.compile(r"\s+"),  # word
+]
+
+
+def _last_boundary(text: str, lo: int, hi: int) -> int:
+    """Position right after the last (strongest) boundary in text[lo:hi], or hi."""
+    for pattern in BOUNDARY_PATTERNS:
+        last = None
+        for last in pattern.finditer(text, lo, hi):
+            pass
+        if last is not None and last.end() <= hi:
+            return last.end()
+    return hi
+
+
+def _first_boundary(text: str, lo: int, hi: int) -> int:
+    """Position right after the first (strongest) boundary in text[lo:hi], or lo."""
+    for pattern in BOUNDARY_PATTERNS:
+        match = pattern.search(text, lo, hi)
+        if match is not None:
+            return match.end()
+    return lo
+
+
+def split_windows(
+    text: str,
+    max_chars: int = CHUNK_MAX_CHARS,
+    overlap: int = CHUNK_OVERLAP_CHARS,
+) -> list[tuple[int, int]]:
+    """(start, end) offsets of the overlapping windows covering text."""
+    if overlap * 2 >= max_chars:
+        raise ValueError("overlap must be less than half of max_chars")
+    if len(text) <= max_chars:
+        return [(0, len(text))]
+    windows = []
+    start = 0
+    while len(text) - start > max_chars:
+        # End in the second half of the window, at the strongest boundary there
+        end = _last_boundary(text, start + max_chars // 2, start + max_chars)
+        windows.append((start, end))
+        # Next window starts in the first half of the overlap, at the strongest boundary there
+        start = _first_boundary(text, end - overlap, end - overlap // 2)
+    windows.append((start, len(text)))
+    return windows
+
+
+def analyze_chunked(
+    text: str,
+    analyzer: AnalyzerEngine,
+    entities: list[str],
+    language: str = "it",
+    max_chars: int = CHUNK_MAX_CHARS,
+    overlap: int = CHUNK_OVERLAP_CHARS,
+) -> list[RecognizerResult]:
+    """Analyzer results for text with cell offsets, analyzing long texts by window."""
+    windows = split_windows(text, max_chars, overlap)
+    if len(windows) == 1:
+        return analyzer.analyze(text=text, entities=entities, language=language)
+
+    window_results = BatchAnalyzerEngine(analyzer_engine=analyzer).analyze_iterator(
+        [text[start:end] for start, end in windows],
+        language=language,
+        batch_size=len(windows),
+        entities=entities,
+    )
+    merged: dict[tuple[str, int, int], RecognizerResult] = {}
+    last = len(windows) - 1
+    for i, ((offset, end), results) in enumerate(zip(windows, window_results)):
+        for r in results:
+            # Possibly truncated by the window: the neighbouring window has it whole
+            if (i > 0 and not text[offset:offset + r.start].strip()) or (
+                i < last and not text[offset + r.end:end].strip()
+            ):
+                continue
+            key = (r.entity_type, offset + r.start, offset + r.end)
+            if key not in merged or r.score > merged[key].score:
+                merged[key] = RecognizerResult(
+                    r.entity_type, key[1], key[2], r.score,
+                    r.analysis_explanation, r.recognition_metadata,
+                )
+    return EntityRecognizer.remove_duplicates(list(merged.values()))
@@ -0,0 +1,81 @@
+"""
+Token accounting and budget for the LLM calls of the anonymizer.
+
+TokenLedger records the prompt/completion tokens of every request (from
+response.usage, or an estimate when the endpoint does not report usage) and
+tells process_csv whether the next batch still fits in --max-tokens-budget.
+"""
+
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Rough characters per token for Italian/English text (used when usage is missing)
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a text."""
+    return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+class TokenLedger:
+    """Per-request and per-run token totals, with an optional budget."""
+
+    def __init__(self, budget: Optional[int] = None):
+        self.budget = budget
+        self.requests: list[dict] = []
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.estimated_requests = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def record(
+        self,
+        label: str,
+        usage,
+        estimated_prompt: int = 0,
+        estimated_completion: int = 0,
+    ) -> tuple[int, int]:
+        """
+        Record one request. `usage` is the response.usage object (or dict);
+        when it is missing the estimates are recorded instead.
+        Returns (prompt_tokens, completion_tokens) as recorded.
+        """
+        if isinstance(usage, dict):
+            prompt = usage.get("prompt_tokens")
+            completion = usage.get("completion_tokens")
+        else:
+            prompt = getattr(usage, "prompt_tokens", None)
+            completion = getattr(usage, "completion_tokens", None)
+        estimated = prompt is None or completion is None
+        if estimated:
+            prompt, completion = estimated_prompt, estimated_completion
+            self.estimated_requests += 1
+        self.requests.append({
+            "label": label,
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "estimated": estimated,
+        })
+        self.prompt_tokens += prompt
+        self.completion_tokens += completion
+        return prompt, completion
+
+    def fits(self, estimated_tokens: int) -> bool:
+        """True if a request estimated at `estimated_tokens` stays within the budget."""
+        return self.budget is None or self.total_tokens + estimated_tokens <= self.budget
+
+    def summary(self) -> dict:
+        return {
+            "requests": len(self.requests),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "estimated_requests": self.estimated_requests,
+            "budget": self.budget,
+        }
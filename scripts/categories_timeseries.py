@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Incremental time-series of the daily category statistics in data/.
+
+Ingests every data/categories_stats_YYYY_MM_DD.csv snapshot (plus the per-day
+counts of data/uncategorized_questions.csv) into a single categories x dates
+table of integer counts, persisted as compact JSON. On each run only the
+snapshots that are new or whose content changed (sha256) are parsed again,
+snapshots deleted from the data directory are dropped, and the uncategorized
+questions file is parsed from the last record boundary seen (recounted when
+the bytes before it no longer hash as before). Content hashes (not
+mtimes) identify a snapshot, since a fresh checkout gives every file a new
+mtime; files with the size and mtime of the last run are not even hashed.
+
+Usage:
+  python categories_timeseries.py update
+  python categories_timeseries.py trend "Migrazione e Cloud"
+  python categories_timeseries.py deltas "Altro" --start 2026_02_01
+  python categories_timeseries.py movers --start 2026_02_01 --end 2026_03_01 --top 5
+  python categories_timeseries.py update --data-dir data/exp --store data/exp/categories_timeseries.json
+"""
+
+import argparse
+import bisect
+import csv
+import hashlib
+import io
+import json
+import re
+import sys
+from pathlib import Path
+from typing import Optional
+
+SCRIPT_DIR = Path(__file__).parent
+DEFAULT_DATA_DIR = SCRIPT_DIR.parent / "data"
+STORE_FILENAME = "categories_timeseries.json"
+UNCATEGORIZED_FILENAME = "uncategorized_questions.csv"
+SNAPSHOT_RE = re.compile(r"^categories_stats_(\d{4}_\d{2}_\d{2})\.csv$")
+STORE_VERSION = 3
+
+
+def _file_signature(path: Path, known: Optional[dict] = None) -> dict:
+    """
+    Return {size, mtime_ns, sha256} of a snapshot file. The hash of `known`
+    (the previous signature) is reused when size and mtime are unchanged.
+    """
+    st = path.stat()
+    signature = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if known and all(known.get(k) == v for k, v in signature.items()) and known.get("sha256"):
+        signature["sha256"] = known["sha256"]
+    else:
+        signature["sha256"] = hashlib.sha256(path.read_bytes()).hexdigest()
+    return signature
+
+
+def read_snapshot(path: Path) -> dict[str, int]:
+    """Read a category,num_questions snapshot into {category: count}."""
+    counts: dict[str, int] = {}
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        for row in reader:
+            if len(row) < 2 or not row[0].strip():
+                continue
+            try:
+                counts[row[0].strip()] = counts.get(row[0].strip(), 0) + int(row[1])
+            except ValueError:
+                continue
+    return counts
+
+
+class CategoryTimeSeries:
+    """
+    Categories x dates table of integer counts.
+
+    Dates are kept sorted (YYYY_MM_DD strings sort chronologically) and every
+    series in `counts` and `uncategorized` is aligned with `dates`.
+    """
+
+    def __init__(self):
+        self.dates: list[str] = []
+        self.counts: dict[str, list[int]] = {}
+        self.uncategorized: list[int] = []
+        self.sources: dict[str, dict] = {}
+        self.uncategorized_offset = 0
+        self.uncategorized_sha256 = ""
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def load(cls, store_path: Path) -> "CategoryTimeSeries":
+        """Load the table from store_path; return an empty table if missing or stale."""
+        ts = cls()
+        if not store_path.exists():
+            return ts
+        try:
+            with open(store_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return ts
+        if data.get("version") != STORE_VERSION:
+            return ts
+        ts.dates = data["dates"]
+        ts.counts = data["counts"]
+        ts.uncategorized = data["uncategorized"]
+        ts.sources = data["sources"]
+        ts.uncategorized_offset = data["uncategorized_offset"]
+        ts.uncategorized_sha256 = data["uncategorized_sha256"]
+        return ts
+
+    def save(self, store_path: Path) -> None:
+        """Write the table to store_path (atomic replace)."""
+        data = {
+            "version": STORE_VERSION,
+            "dates": self.dates,
+            "counts": {cat: self.counts[cat] for cat in sorted(self.counts)},
+            "uncategorized": self.uncategorized,
+            "uncategorized_offset": self.uncategorized_offset,
+            "uncategorized_sha256": self.uncategorized_sha256,
+            "sources": {name: self.sources[name] for name in sorted(self.sources)},
+        }
+        store_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = store_path.with_suffix(store_path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        tmp_path.replace(store_path)
+
+    # ------------------------------------------------------------------
+    # Incremental ingest
+    # ------------------------------------------------------------------
+
+    def _date_index(self, date: str) -> int:
+        """Return the column index for date, inserting an empty column if needed."""
+        i = bisect.bisect_left(self.dates, date)
+        if i < len(self.dates) and self.dates[i] == date:
+            return i
+        self.dates.insert(i, date)
+        for series in self.counts.values():
+            series.insert(i, 0)
+        self.uncategorized.insert(i, 0)
+        return i
+
+    def set_snapshot(self, date: str, snapshot: dict[str, int]) -> None:
+        """Replace the column for date with the given {category: count}."""
+        i = self._date_index(date)
+        for series in self.counts.values():
+            series[i] = 0
+        for category, count in snapshot.items():
+            if category not in self.counts:
+                self.counts[category] = [0] * len(self.dates)
+            self.counts[category][i] = count
+
+    def drop_snapshot(self, date: str) -> None:
+        """Clear the category counts of date, removing the column if nothing else is left in it."""
+        i = bisect.bisect_left(self.dates, date)
+        if i == len(self.dates) or self.dates[i] != date:
+            return
+        if self.uncategorized[i]:
+            for series in self.counts.values():
+                series[i] = 0
+        else:
+            del self.dates[i]
+            del self.uncategorized[i]
+            for series in self.counts.values():
+                del series[i]
+        for category in [cat for cat, series in self.counts.items() if not any(series)]:
+            del self.counts[category]
+
+    def _ingest_uncategorized(self, path: Path) -> int:
+        """
+        Count uncategorized questions per date, parsing only the records
+        appended since the last run. The bytes already consumed must hash as
+        before; any other change recounts the whole file.
+        """
+        with open(path, "rb") as f:
+            consumed = f.read(self.uncategorized_offset)
+            hasher = hashlib.sha256(consumed)
+            recount = self.uncategorized_offset and hasher.hexdigest() != self.uncategorized_sha256
+            if recount:
+                # File was rewritten: recount from scratch
+                self.uncategorized = [0] * len(self.dates)
+                self.uncategorized_offset = 0
+                hasher = hashlib.sha256()
+                f.seek(0)
+            chunk = f.read()
+        # Only complete lines; a partial trailing line is read next time
+        text = chunk[: chunk.rfind(b"\n") + 1].decode("utf-8")
+
+        # Bytes of the lines csv.reader has pulled, i.e. the end of the record it yields
+        pos = 0
+        exhausted = False
+
+        def lines():
+            nonlocal pos, exhausted
+            for line in io.StringIO(text, newline=""):
+                pos += len(line.encode("utf-8"))
+                yield line
+            exhausted = True
+
+        header = self.uncategorized_offset == 0
+        boundary = 0
+        added = 0
+        for row in csv.reader(lines()):
+            if exhausted:
+                break  # quoted field still open at the end: the record is read next time
+            boundary = pos
+            if header:
+                header = False
+                continue
+            if len(row) < 2 or not row[-1].strip():
+                continue
+            i = self._date_index(row[-1].strip())
+            self.uncategorized[i] += 1
+            added += 1
+        hasher.update(chunk[:boundary])
+        self.uncategorized_offset += boundary
+        self.uncategorized_sha256 = hasher.hexdigest()
+        if recount:
+            # Columns that only held questions no longer in the file
+            snapshot_dates = {m.group(1) for m in map(SNAPSHOT_RE.match, self.sources) if m}
+            for date in [d for d, n in zip(self.dates, self.uncategorized) if not n and d not in snapshot_dates]:
+                self.drop_snapshot(date)
+        return added
+
+    def update(self, data_dir: Path) -> int:
+        """
+        Ingest new or changed snapshots from data_dir and drop the ones no
+        longer there. Returns the number of snapshot files (re)parsed.
+        """
+        parsed = 0
+        present = set()
+        for path in sorted(data_dir.glob("categories_stats_*.csv")):
+            m = SNAPSHOT_RE.match(path.name)
+            if not m:
+                continue
+            present.add(path.name)
+            known = self.sources.get(path.name)
+            signature = _file_signature(path, known)
+            if known and known.get("sha256") == signature["sha256"]:
+                self.sources[path.name] = signature  # same content, new mtime
+                continue
+            self.set_snapshot(m.group(1), read_snapshot(path))
+            self.sources[path.name] = signature
+            parsed += 1
+
+        for name in sorted(set(self.sources) - present):
+            del self.sources[name]
+            m = SNAPSHOT_RE.match(name)
+            if m:
+                self.drop_snapshot(m.group(1))
+
+        uncategorized_path = data_dir / UNCATEGORIZED_FILENAME
+        if uncategorized_path.exists():
+            self._ingest_uncategorized(uncategorized_path)
+        return parsed
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _range(self, start: Optional[str], end: Optional[str]) -> tuple[int, int]:
+        """Return [lo, hi) column indexes for an inclusive date range."""
+        lo = bisect.bisect_left(self.dates, start) if start else 0
+        hi = bisect.bisect_right(self.dates, end) if end else len(self.dates)
+        return lo, hi
+
+    def trend(
+        self,
+        category: str,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> list[tuple[str, int]]:
+        """Return [(date, count)] for category within the inclusive date range."""
+        lo, hi = self._range(start, end)
+        series = self.counts.get(category, [0] * len(self.dates))
+        return list(zip(self.dates[lo:hi], series[lo:hi]))
+
+    def deltas(
+        self,
+        category: str,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> list[tuple[str, int]]:
+        """Return [(date, count - previous count)] for category."""
+        points = self.trend(category, start, end)
+        return [
+            (date, count - prev)
+            for (_, prev), (date, count) in zip(points, points[1:])
+        ]
+
+    def totals(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> dict[str, int]:
+        """Return {category: total count} within the date range, largest first."""
+        lo, hi = self._range(start, end)
+        totals = {cat: sum(series[lo:hi]) for cat, series in self.counts.items()}
+        return dict(sorted(totals.items(), key=lambda kv: (-kv[1], kv[0])))
+
+    def top_movers(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        window: int = 7,
+        top: int = 10,
+    ) -> list[tuple[str, int, int, int]]:
+        """
+        Compare the `window` days ending at `start` with the `window` days
+        ending at `end` (defaults: the two most recent windows).
+        Returns [(category, before, after, change)] sorted by |change|.
+        """
+        if not self.dates:
+            return []
+        _, end_hi = self._range(None, end)
+        if start:
+            _, start_hi = self._range(None, start)
+        else:
+            start_hi = max(end_hi - window, 0)
+        before_lo = max(start_hi - window, 0)
+        after_lo = max(end_hi - window, 0)
+
+        movers = []
+        for category, series in self.counts.items():
+            before = sum(series[before_lo:start_hi])
+            after = sum(series[after_lo:end_hi])
+            if before or after:
+                movers.append((category, before, after, after - before))
+        movers.sort(key=lambda m: (-abs(m[3]), m[0]))
+        return movers[:top]
+
+
+def load_and_update(data_dir: Path, store_path: Path) -> tuple[CategoryTimeSeries, int]:
+    """Load the persisted table, ingest new snapshots and save if anything changed."""
+    ts = CategoryTimeSeries.load(store_path)
+    before = (dict(ts.sources), ts.uncategorized_offset, ts.uncategorized_sha256)
+    parsed = ts.update(data_dir)
+    after = (ts.sources, ts.uncategorized_offset, ts.uncategorized_sha256)
+    if parsed or before != after or not store_path.exists():
+        ts.save(store_path)
+    return ts, parsed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Incremental time-series of data/categories_stats_*.csv snapshots.",
+    )
+    parser.add_argument(
+        "--data-dir",
+        type=Path,
+        default=DEFAULT_DATA_DIR,
+        help=f"Directory with categories_stats_*.csv (default: {DEFAULT_DATA_DIR})",
+    )
+    parser.add_argument(
+        "--store",
+        type=Path,
+        default=None,
+        help=f"Persisted table path (default: <data-dir>/{STORE_FILENAME})",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("update", help="Ingest new snapshots and persist the table")
+
+    for name, help_text in (
+        ("trend", "Per-date counts for a category"),
+        ("deltas", "Day-over-day change for a category"),
+    ):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("category")
+        p.add_argument("--start", help="First date (YYYY_MM_DD)")
+        p.add_argument("--end", help="Last date (YYYY_MM_DD)")
+
+    p = sub.add_parser("totals", help="Total questions per category")
+    p.add_argument("--start", help="First date (YYYY_MM_DD)")
+    p.add_argument("--end", help="Last date (YYYY_MM_DD)")
+
+    p = sub.add_parser("movers", help="Categories with the largest change between two windows")
+    p.add_argument("--start", help="End date of the 'before' window (YYYY_MM_DD)")
+    p.add_argument("--end", help="End date of the 'after' window (YYYY_MM_DD)")
+    p.add_argument("--window", type=int, default=7, help="Window size in snapshots (default: 7)")
+    p.add_argument("--top", type=int, default=10, help="Number of categories to show (default: 10)")
+
+    args = parser.parse_args()
+
+    if not args.data_dir.is_dir():
+        print(f"Error: data directory not found: {args.data_dir}", file=sys.stderr)
+        return 1
+    store_path = args.store or args.data_dir / STORE_FILENAME
+
+    ts, parsed = load_and_update(args.data_dir, store_path)
+
+    if args.command == "update":
+        print(
+            f"Parsed {parsed} snapshots; table has {len(ts.counts)} categories "
+            f"x {len(ts.dates)} dates ({store_path})"
+        )
+    elif args.command == "trend":
+        for date, count in ts.trend(args.category, args.start, args.end):
+            print(f"{date},{count}")
+    elif args.command == "deltas":
+        for date, delta in ts.deltas(args.category, args.start, args.end):
+            print(f"{date},{delta:+d}")
+    elif args.command == "totals":
+        for category, total in ts.totals(args.start, args.end).items():
+            print(f"{category},{total}")
+    elif args.command == "movers":
+        print("category,before,after,change")
+        for category, before, after, change in ts.top_movers(
+            args.start, args.end, window=args.window, top=args.top
+        ):
+            print(f"{category},{before},{after},{change:+d}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
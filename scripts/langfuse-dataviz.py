@@ -1,8 +1,11 @@
 import os
 import time
+import json
+import hashlib
 import requests
 import csv
 from collections import Counter
+from datetime import datetime
 
 # ==========================
 # CONFIG LANGFUSE
@@ -21,9 +24,22 @@ DEFAULT_LIMIT = 100
 # ==========================
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "sk-...")
-OPENAI_API_URL = os.getenv(OPENAI_API_URL,"https://api.openai.com/v1/chat/completions")
-OPENAI_MODEL = os.getenv(OPENAI_MODEL,"gpt-4o")
+OPENAI_API_URL = os.getenv("OPENAI_API_URL", "https://api.openai.com/v1/chat/completions")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")
 SLEEP_BETWEEN_CALLS = 0.2  # secondi
+# Token massimi (prompt + completion) per run; 0 = nessun limite
+MAX_TOKENS_BUDGET = int(os.getenv("OPENAI_MAX_TOKENS_BUDGET", "0"))
+
+# Token consumati nel run (da response.usage)
+TOKEN_USAGE = Counter()
+
+# ==========================
+# CONFIG OUTPUT
+# ==========================
+
+OUTPUT_PREFIX = "classificazione_output"
+CHECKPOINT_FILE = "classificazione_checkpoint.json"
+CHECKPOINT_EVERY = 10  # classificazioni tra un checkpoint e il successivo
 
 def perform_request(method, url, headers=None, auth=None, params=None,
                     timeout=30, allow_redirects=False):
@@ -122,9 +138,16 @@ def langfuse_questions():
         if isinstance(t, dict):
             q = extract_trace_fields(t)
             if isinstance(q, str) and q.strip():
-                questions.append(q.strip())
+                questions.append((question_key(t, q.strip()), q.strip()))
     return questions[:20]  # solo prime 20 domande
 
+def question_key(trace, question):
+    """Id della trace, o hash del testo se la trace non ha id (chiave del checkpoint)."""
+    trace_id = trace.get("id")
+    if trace_id:
+        return str(trace_id)
+    return "sha1:" + hashlib.sha1(question.encode("utf-8")).hexdigest()
+
 def classify_with_chatgpt4(question: str) -> str:
     if not OPENAI_API_KEY:
         raise RuntimeError(
@@ -163,26 +186,129 @@ def classify_with_chatgpt4(question: str) -> str:
     response = requests.post(OPENAI_API_URL, headers=headers, json=payload)
     response.raise_for_status()
     data = response.json()
+    usage = data.get("usage") or {}
+    TOKEN_USAGE["requests"] += 1
+    TOKEN_USAGE["prompt_tokens"] += usage.get("prompt_tokens", 0)
+    TOKEN_USAGE["completion_tokens"] += usage.get("completion_tokens", 0)
     content = data["choices"][0]["message"]["content"].strip()
     return content
 
-def export_classification_to_csv(labels, outfile="classificazione_output.csv"):
-    counts = Counter(labels)
-    with open(outfile, "w", newline="", encoding="utf-8") as f:
+
+def token_budget_reached():
+    """True se il run ha gia' consumato MAX_TOKENS_BUDGET token."""
+    used = TOKEN_USAGE["prompt_tokens"] + TOKEN_USAGE["completion_tokens"]
+    return MAX_TOKENS_BUDGET > 0 and used >= MAX_TOKENS_BUDGET
+
+class StreamingClassificationCounter:
+    """
+    Conta le classificazioni man mano che arrivano.
+
+    Ogni CHECKPOINT_EVERY classificazioni salva i conteggi parziali (e le chiavi
+    delle domande gia' processate) in un file JSON e riscrive il CSV di output,
+    cosi' un run interrotto puo' riprendere e l'output e' sempre aggiornato.
+    La ripresa salta le domande per chiave e non per posizione, perche' l'elenco
+    riletto da Langfuse puo' cambiare tra un run e l'altro.
+    """
+
+    def __init__(self, outfile, checkpoint_file=CHECKPOINT_FILE,
+                 checkpoint_every=CHECKPOINT_EVERY):
+        self.outfile = outfile
+        self.checkpoint_file = checkpoint_file
+        self.checkpoint_every = checkpoint_every
+        self.counts = Counter()
+        self.done = set()
+        self._since_checkpoint = 0
+
+    @property
+    def processed(self):
+        return len(self.done)
+
+    def resume(self):
+        """
+        Carica conteggi e chiavi processate dal checkpoint, se esiste, e ne
+        riprende il file di output (anche se il run e' iniziato il giorno prima).
+        Ritorna le domande gia' processate.
+        """
+        if not os.path.exists(self.checkpoint_file):
+            return 0
+        with open(self.checkpoint_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if "done" not in state:
+            return 0  # checkpoint senza chiavi: non si sa quali domande salta
+        self.outfile = state.get("outfile", self.outfile)
+        self.counts = Counter(state.get("counts", {}))
+        self.done = set(state["done"])
+        return self.processed
+
+    def add(self, key, label):
+        if key in self.done:
+            return
+        self.counts[label] += 1
+        self.done.add(key)
+        self._since_checkpoint += 1
+        if self._since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        state = {
+            "outfile": self.outfile,
+            "processed": self.processed,
+            "counts": dict(self.counts),
+            "done": sorted(self.done),
+        }
+        tmp = self.checkpoint_file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, self.checkpoint_file)
+        export_classification_to_csv(self.counts, self.outfile)
+        self._since_checkpoint = 0
+
+    def finish(self):
+        """Scrive l'output finale e rimuove il checkpoint."""
+        export_classification_to_csv(self.counts, self.outfile)
+        if os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+
+
+def export_classification_to_csv(counts, outfile):
+    """
+    Scrive i conteggi nello stesso schema di data/categories_stats.csv
+    (category,num_questions), ordinati per numero di domande decrescente.
+    """
+    rows = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))
+    tmp = outfile + ".tmp"
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
-        writer.writerow(["Classe", "Numero di domande"])
-        for classe, numero in counts.items():
-            writer.writerow([classe, numero])
+        writer.writerow(["category", "num_questions"])
+        for category, num_questions in rows:
+            writer.writerow([category, num_questions])
+    os.replace(tmp, outfile)
 
 def main():
     questions = langfuse_questions()
-    labels = []
-    for q in questions:
+    outfile = f"{OUTPUT_PREFIX}_{datetime.now().strftime('%Y_%m_%d')}.csv"
+    counter = StreamingClassificationCounter(outfile)
+    already_done = counter.resume()
+    if already_done:
+        print(f"Ripresa dal checkpoint: {already_done} domande gia' classificate (output {counter.outfile})")
+
+    pending = [(key, q) for key, q in questions if key not in counter.done]
+    for i, (key, q) in enumerate(pending):
+        if token_budget_reached():
+            # Le domande rimanenti restano nel checkpoint per il prossimo run
+            counter.checkpoint()
+            print(f"Budget di {MAX_TOKENS_BUDGET} token raggiunto: "
+                  f"{counter.processed} domande classificate, {len(pending) - i} da classificare al prossimo run")
+            break
         label = classify_with_chatgpt4(q)
-        labels.append(label)
+        counter.add(key, label)
         time.sleep(SLEEP_BETWEEN_CALLS)
+    else:
+        counter.finish()
+        print(f"Salvato {counter.outfile} ({counter.processed} domande)")
 
-    export_classification_to_csv(labels, "classificazione_output.csv")
+    print(f"Token: {TOKEN_USAGE['prompt_tokens']} prompt + {TOKEN_USAGE['completion_tokens']} completion "
+          f"in {TOKEN_USAGE['requests']} richieste")
 
 if __name__ == "__main__":
     main()